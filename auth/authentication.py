@@ -0,0 +1,226 @@
+"""
+JWT authentication without per-request database queries.
+
+``CachedJWTAuthentication`` behaves like simplejwt's ``JWTAuthentication`` but looks
+the user up in a short-lived in-process LRU first and a shared cache second, and only
+then in the primary database. It also rejects access tokens whose JTI is in the token
+blacklist, of which every process keeps an in-memory copy that is topped up with the
+newly blacklisted tokens every ``VLOG_JWT_BLACKLIST_REFRESH_SECONDS``.
+
+Only the fields authentication and permission checks read are cached, plus the md5 of
+the password hash that ``CHECK_REVOKE_TOKEN`` compares against; the password hash itself
+never leaves the database. Requests get a ``User`` with those fields loaded and the rest
+deferred, so touching another field reads it from the database.
+
+Cached users are dropped when the user row is saved or deleted (auth/signals.py); other
+processes' in-process copies expire within ``VLOG_AUTH_USER_LOCAL_SECONDS``, which
+bounds how long a deactivated user or changed password goes unnoticed there. Writes that
+skip the signals, such as ``QuerySet.update()``, go unnoticed for up to
+``VLOG_AUTH_USER_CACHE_TIMEOUT``; call :func:`forget_user` after them. A logout takes
+effect at once in the process that handled it and within the refresh interval everywhere
+else.
+"""
+import threading
+import time
+from collections import OrderedDict
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.db import router
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+from rest_framework_simplejwt.utils import datetime_from_epoch, get_md5_hash_password
+
+# Blacklist rows are re-read this far back, so a logout whose transaction commits
+# after a refresh already passed its blacklisted_at is still picked up.
+BLACKLIST_OVERLAP = timedelta(seconds=60)
+
+# The user fields cached for authentication and permission checks.
+CACHED_FIELDS = ('id', 'username', 'is_active', 'is_staff', 'is_superuser')
+
+
+def local_seconds():
+    return getattr(settings, 'VLOG_AUTH_USER_LOCAL_SECONDS', 10)
+
+
+def local_size():
+    return getattr(settings, 'VLOG_AUTH_USER_LOCAL_SIZE', 1024)
+
+
+def shared_timeout():
+    return getattr(settings, 'VLOG_AUTH_USER_CACHE_TIMEOUT', 60)
+
+
+def shared_cache():
+    return caches[getattr(settings, 'VLOG_AUTH_CACHE', 'default')]
+
+
+def blacklist_refresh_seconds():
+    return getattr(settings, 'VLOG_JWT_BLACKLIST_REFRESH_SECONDS', 5)
+
+
+class LRUCache:
+    """A thread-safe LRU mapping whose entries also expire after ``ttl`` seconds."""
+
+    def __init__(self, size, ttl):
+        self.size = size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.size():
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+local_users = LRUCache(size=local_size, ttl=local_seconds)
+
+
+def user_key(user_id):
+    return f'auth:user:{user_id}'
+
+
+def cached_user(user_id):
+    """The cached fields of user ``user_id`` as a dict, with ``password_md5``; None on a miss."""
+    entry = local_users.get(user_id)
+    if entry is None:
+        entry = shared_cache().get(user_key(user_id))
+        if entry is not None:
+            local_users.set(user_id, entry)
+    return entry
+
+
+def user_from_entry(entry):
+    # Every request gets its own instance, so one request changing it cannot leak into another.
+    User = get_user_model()
+    return User.from_db(router.db_for_read(User), CACHED_FIELDS, [entry[name] for name in CACHED_FIELDS])
+
+
+def remember_user(user):
+    entry = {name: getattr(user, name) for name in CACHED_FIELDS}
+    entry['password_md5'] = get_md5_hash_password(user.password)
+    local_users.set(user.pk, entry)
+    shared_cache().set(user_key(user.pk), entry, shared_timeout())
+
+
+def forget_user(user_id):
+    local_users.delete(user_id)
+    shared_cache().delete(user_key(user_id))
+
+
+class Blacklist:
+    """
+    The JTIs of the blacklisted tokens that have not expired yet. Refreshed from
+    simplejwt's ``BlacklistedToken`` table incrementally: only rows blacklisted since
+    the previous refresh (less ``BLACKLIST_OVERLAP``) are read.
+    """
+
+    def __init__(self):
+        self._jtis = {}
+        self._since = None
+        self._refreshed = None
+        self._lock = threading.Lock()
+
+    def __contains__(self, jti):
+        if self._refreshed is None or time.monotonic() - self._refreshed >= blacklist_refresh_seconds():
+            self.refresh()
+        return jti in self._jtis
+
+    def refresh(self):
+        # One thread refreshes at a time; the others go on with what is already loaded.
+        if not self._lock.acquire(blocking=self._refreshed is None):
+            return
+        try:
+            now = timezone.now()
+            rows = BlacklistedToken.objects.filter(token__expires_at__gt=now)
+            if self._since is not None:
+                rows = rows.filter(blacklisted_at__gte=self._since - BLACKLIST_OVERLAP)
+            jtis = {jti: expires for jti, expires in self._jtis.items() if expires > now}
+            jtis.update(rows.values_list('token__jti', 'token__expires_at'))
+            self._jtis, self._since, self._refreshed = jtis, now, time.monotonic()
+        finally:
+            self._lock.release()
+
+    def add(self, token):
+        """Blacklist ``token``, of any type, and stop accepting it in this process right away."""
+        jti, expires = token[api_settings.JTI_CLAIM], datetime_from_epoch(token['exp'])
+        outstanding, _ = OutstandingToken.objects.get_or_create(jti=jti, defaults={
+            'token': str(token),
+            'expires_at': expires,
+            'user_id': token.get(api_settings.USER_ID_CLAIM),
+        })
+        BlacklistedToken.objects.get_or_create(token=outstanding)
+        self._jtis = {**self._jtis, jti: expires}
+
+    def clear(self):
+        self._jtis, self._since, self._refreshed = {}, None, None
+
+
+blacklist = Blacklist()
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    def get_validated_token(self, raw_token):
+        token = super().get_validated_token(raw_token)
+        if token.get(api_settings.JTI_CLAIM) in blacklist:
+            raise InvalidToken({'detail': 'Token is blacklisted', 'code': 'token_not_valid'})
+        return token
+
+    def get_user(self, validated_token):
+        user_id = validated_token.get(api_settings.USER_ID_CLAIM)
+        if user_id is None:
+            raise InvalidToken(_("Token contained no recognizable user identification"))
+        entry = cached_user(user_id)
+        if entry is None:
+            user = self.load_user(user_id)
+            self.check_user(validated_token, user.is_active, get_md5_hash_password(user.password))
+            # Only active users get here, so only active users are cached.
+            remember_user(user)
+            return user
+        self.check_user(validated_token, entry['is_active'], entry['password_md5'])
+        return user_from_entry(entry)
+
+    def load_user(self, user_id):
+        # From the primary: a lagging replica could still have the user active or the old password,
+        # and the cache would then keep serving that for the whole timeout.
+        users = self.user_model.objects.using(router.db_for_write(self.user_model))
+        try:
+            return users.get(**{api_settings.USER_ID_FIELD: user_id})
+        except self.user_model.DoesNotExist:
+            raise AuthenticationFailed(_("User not found"), code="user_not_found")
+
+    def check_user(self, validated_token, is_active, password_md5):
+        if not is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+        if api_settings.CHECK_REVOKE_TOKEN and validated_token.get(api_settings.REVOKE_TOKEN_CLAIM) != password_md5:
+            raise AuthenticationFailed(_("The user's password has been changed."), code='password_changed')
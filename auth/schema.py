@@ -0,0 +1,6 @@
+from drf_spectacular.contrib.rest_framework_simplejwt import SimpleJWTScheme
+
+
+class CachedJWTScheme(SimpleJWTScheme):
+    # drf-spectacular matches authentication classes exactly, not their subclasses.
+    target_class = 'auth.authentication.CachedJWTAuthentication'
@@ -1,3 +1,119 @@
-from django.test import TestCase
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+from rest_framework_simplejwt.tokens import AccessToken
+from rest_framework_simplejwt.utils import datetime_from_epoch
+
+from main.models import Vlogs
+
+from . import authentication
+from .authentication import blacklist, local_users, shared_cache, user_key
+
+AUTH_TABLES = ('auth_user', 'token_blacklist_')
+
+
+class CachedJWTAuthenticationTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        local_users.clear()
+        blacklist.clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(username="reader", password="Password1")
+        self.vlog = Vlogs.objects.create(title="vlog", description="description", user=self.user)
+        self.token = AccessToken.for_user(self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {self.token}")
+
+    def auth_queries(self, method, url, data=None):
+        with CaptureQueriesContext(connection) as queries:
+            response = getattr(self.client, method)(url, data, format="json")
+        return response, [query['sql'] for query in queries if any(table in query['sql'] for table in AUTH_TABLES)]
+
+    def test_like_and_comment_skip_auth_queries_once_warm(self):
+        self.client.post(f"/api/vlogs/{self.vlog.pk}/like/")
+
+        response, queries = self.auth_queries("put", f"/api/vlogs/{self.vlog.pk}/drop-like/")
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(queries, [])
+
+        response, queries = self.auth_queries("post", f"/api/vlogs/{self.vlog.pk}/post-comment/", {"comment": "hi"})
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(queries, [])
+
+    def test_user_is_loaded_from_the_shared_cache(self):
+        self.client.post(f"/api/vlogs/{self.vlog.pk}/like/")
+        local_users.clear()
+
+        response, queries = self.auth_queries("put", f"/api/vlogs/{self.vlog.pk}/drop-like/")
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(queries, [])
+
+    def test_deactivated_user_is_rejected(self):
+        self.client.post(f"/api/vlogs/{self.vlog.pk}/like/")
+        self.user.is_active = False
+        self.user.save()
+
+        response = self.client.post(f"/api/vlogs/{self.vlog.pk}/post-comment/", {"comment": "hi"}, format="json")
+        self.assertEqual(response.status_code, 401)
+
+    def test_password_hashes_are_not_cached(self):
+        self.client.post(f"/api/vlogs/{self.vlog.pk}/like/")
+        entry = shared_cache().get(user_key(self.user.pk))
+        self.assertEqual(entry["username"], "reader")
+        self.assertNotIn(self.user.password, entry.values())
+
+        user = authentication.CachedJWTAuthentication().get_user(self.token)
+        self.assertEqual(user.get_deferred_fields(), {field.attname for field in User._meta.concrete_fields} -
+                         set(authentication.CACHED_FIELDS))
+
+    def test_cached_copy_is_checked(self):
+        self.client.post(f"/api/vlogs/{self.vlog.pk}/like/")
+        with mock.patch.object(authentication.api_settings, "CHECK_REVOKE_TOKEN", True):
+            with self.assertRaisesMessage(AuthenticationFailed, "password has been changed"):
+                authentication.CachedJWTAuthentication().get_user(self.token)
+
+        entry = shared_cache().get(user_key(self.user.pk))
+        local_users.set(self.user.pk, {**entry, "is_active": False})
+        response = self.client.post(f"/api/vlogs/{self.vlog.pk}/post-comment/", {"comment": "hi"}, format="json")
+        self.assertEqual(response.status_code, 401)
+
+    def test_cache_miss_reads_the_primary(self):
+        with mock.patch.object(authentication, "router") as router:
+            router.db_for_write.return_value = "default"
+            user = authentication.CachedJWTAuthentication().get_user(self.token)
+        self.assertEqual(user, self.user)
+        router.db_for_write.assert_called_once_with(User)
+        router.db_for_read.assert_not_called()
+
+    def test_logout_blacklists_the_access_token(self):
+        client = APIClient()
+        tokens = client.post("/api/auth/login/", {"username": "reader", "password": "Password1"}).json()
+        client.credentials(HTTP_AUTHORIZATION=f"Bearer {tokens['access_token']}")
+        self.assertEqual(client.post(f"/api/vlogs/{self.vlog.pk}/like/").status_code, 201)
+
+        response = client.post("/api/auth/logout/", {"refresh_token": tokens["refresh_token"]}, format="json")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(client.put(f"/api/vlogs/{self.vlog.pk}/drop-like/").status_code, 401)
+        self.assertEqual(self.client.put(f"/api/vlogs/{self.vlog.pk}/drop-like/").status_code, 204)
+
+    @override_settings(VLOG_JWT_BLACKLIST_REFRESH_SECONDS=0)
+    def test_blacklist_is_refreshed_incrementally(self):
+        self.assertEqual(self.client.post(f"/api/vlogs/{self.vlog.pk}/like/").status_code, 201)
+
+        # Blacklisted by another process.
+        outstanding = OutstandingToken.objects.create(
+            user=self.user, jti=self.token['jti'], token=str(self.token),
+            expires_at=datetime_from_epoch(self.token['exp']),
+        )
+        BlacklistedToken.objects.create(token=outstanding)
+
+        with CaptureQueriesContext(connection) as queries:
+            self.assertIn(self.token['jti'], blacklist)
+        self.assertIn('blacklisted_at', queries[0]['sql'])
+        self.assertEqual(self.client.put(f"/api/vlogs/{self.vlog.pk}/drop-like/").status_code, 401)
@@ -8,6 +8,7 @@ from . import serializer
 from django.contrib.auth.models import User
 from django.contrib.auth import login, logout
 
+from .authentication import blacklist
 from .tokens import create_jwt_pair_for_user
 
 
@@ -42,6 +43,9 @@ class LogoutView(APIView):
                 token = RefreshToken(refresh_token)
                 logout(request)
                 token.blacklist()
+            # simplejwt only checks refresh tokens against the blacklist; ours checks access tokens too.
+            if isinstance(request.auth, AccessToken):
+                blacklist.add(request.auth)
             return Response("Logout Successful", status=status.HTTP_200_OK)
         except TokenError:
             raise AuthenticationFailed("Invalid Token")
@@ -0,0 +1,161 @@
+"""
+Native async read endpoints for the feed, vlog detail and comment listing.
+
+They return the same payloads as the DRF views in main/views.py, but fetch rows with
+the async ORM and talk to the response cache with its async methods, so under ASGI a
+slow client holds a coroutine instead of a worker thread. ``prefetch_related`` cannot
+be combined with ``aiterator()``, so relations are loaded with one ``aiterator()``
+query each and attached the way ``prefetch_related`` would.
+"""
+import hashlib
+from collections import defaultdict
+from functools import wraps
+
+from django.conf import settings
+from django.http import Http404, HttpResponseNotAllowed, JsonResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+from rest_framework.utils.encoders import JSONEncoder
+
+from . import cache as response_cache
+from . import models
+from . import serializers
+from .instrumentation import query_budget, timed_serialization
+from .likes import apending_like_deltas
+from .pagination import AsyncKeysetPagination
+
+
+def require_safe(view):
+    """``django.views.decorators.http.require_safe`` for coroutine views, which it does not support before 5.0."""
+    @wraps(view)
+    async def inner(request, *args, **kwargs):
+        if request.method not in ('GET', 'HEAD'):
+            return HttpResponseNotAllowed(['GET', 'HEAD'])
+        return await view(request, *args, **kwargs)
+    return inner
+
+
+def json_response(data, **kwargs):
+    with timed_serialization():
+        return JsonResponse(data, encoder=JSONEncoder, **kwargs)
+
+
+def with_validators(response, etag, last_modified=None):
+    response.headers['ETag'] = quote_etag(etag)
+    if last_modified is not None:
+        response.headers['Last-Modified'] = http_date(last_modified.timestamp())
+    return response
+
+
+async def attach(instances, name, queryset, fk):
+    """
+    Load the reverse relation ``name`` for ``instances`` with one query and cache it
+    on each instance, so ``instance.<name>.all()`` does not hit the database again.
+    Returns the loaded rows.
+    """
+    if not instances:
+        return []
+    rows = [row async for row in queryset.filter(**{f'{fk}__in': [i.pk for i in instances]}).aiterator()]
+    grouped = defaultdict(list)
+    for row in rows:
+        grouped[getattr(row, fk)].append(row)
+    for instance in instances:
+        related = getattr(instance, name).all()
+        related._result_cache = grouped[instance.pk]
+        related._prefetch_done = True
+        if not hasattr(instance, '_prefetched_objects_cache'):
+            instance._prefetched_objects_cache = {}
+        instance._prefetched_objects_cache[name] = related
+    return rows
+
+
+def derivatives():
+    return models.ImageDerivatives.objects.only(*models.DERIVATIVE_FIELDS)
+
+
+def page(next_url, previous_url, serializer):
+    return {'next': next_url, 'previous': previous_url, 'results': serializer.data}
+
+
+@query_budget(2)
+@require_safe
+async def vlogs_list(request):
+    """Async ``GET /api/vlogs/async/``: the cursor-paginated feed."""
+    uri = request.build_absolute_uri()
+    etag = f"feed-{await response_cache.afeed_generation()}-{hashlib.md5(uri.encode()).hexdigest()}"
+    not_modified = get_conditional_response(request, etag=quote_etag(etag))
+    if not_modified is not None:
+        return with_validators(not_modified, etag)
+
+    async def build():
+        queryset = models.Vlogs.objects.list_rows()
+        if 'title' in request.GET:
+            queryset = queryset.filter(title=request.GET['title'])
+        rows, next_url, previous_url = await AsyncKeysetPagination(request).paginate(queryset)
+        await attach(rows, 'cover_derivatives', derivatives(), 'vlog_id')
+        context = {'request': request, 'pending_likes': await apending_like_deltas([row.pk for row in rows])}
+        serializer = serializers.VlogsListSerializer(rows, many=True, context=context)
+        return page(next_url, previous_url, serializer)
+
+    try:
+        data = await response_cache.aget_or_build(await response_cache.afeed_key(uri), build)
+    except AsyncKeysetPagination.InvalidCursor:
+        return json_response({'detail': 'Invalid cursor'}, status=404)
+    return with_validators(json_response(data), etag)
+
+
+@query_budget(8)
+@require_safe
+async def vlog_detail(request, pk):
+    """Async ``GET /api/vlogs/async/<pk>/``: a vlog with its media and newest comments."""
+    version = await models.Vlogs.objects.filter(pk=pk).order_by().values_list('updated_date', 'likes').afirst()
+    if version is None:
+        raise Http404
+    updated_date, likes = version
+    pending = (await apending_like_deltas([pk])).get(pk, 0)
+    etag = f"vlog-{pk}-{updated_date.timestamp()}-{likes + pending}"
+    # As in the sync view, buffered likes leave updated_date behind until they are flushed.
+    last_modified = None if pending else updated_date
+    not_modified = get_conditional_response(
+        request, etag=quote_etag(etag), last_modified=int(last_modified.timestamp()) if last_modified else None
+    )
+    if not_modified is not None:
+        return with_validators(not_modified, etag, last_modified)
+
+    async def build():
+        try:
+            vlog = await models.Vlogs.objects.list_rows().aget(pk=pk)
+        except models.Vlogs.DoesNotExist:
+            raise Http404
+        await attach([vlog], 'cover_derivatives', derivatives(), 'vlog_id')
+        images = await attach([vlog], 'images', models.Images.objects.only('id', 'image', 'vlog_id'), 'vlog_id')
+        await attach(images, 'derivatives', derivatives(), 'image_id')
+        await attach([vlog], 'videos', models.Videos.objects.select_related('transcode').only(
+            'id', 'video', 'vlog_id', 'transcode__status', 'transcode__manifest'
+        ), 'vlog_id')
+        await attach([vlog], 'documents', models.Documents.objects.only('id', 'document', 'vlog_id'), 'vlog_id')
+        comments = models.Comments.objects.filter(vlog_id=pk).order_by('-posted_date', '-id').only(
+            'id', 'comment', 'user_id', 'vlog_id', 'posted_date', 'updated_date'
+        )[:getattr(settings, 'VLOG_DETAIL_COMMENTS', 10)]
+        vlog.recent_comments = [comment async for comment in comments.aiterator()]
+        context = {'request': request, 'pending_likes': {pk: pending}}
+        return serializers.VlogsSerializer(vlog, context=context).data
+
+    key = await response_cache.adetail_key(pk, request.build_absolute_uri('/'))
+    data = await response_cache.aget_or_build(key, build)
+    return with_validators(json_response(data), etag, last_modified)
+
+
+@query_budget(2)
+@require_safe
+async def comments_list(request, vlog_id):
+    """Async ``GET /api/vlogs/async/<vlog_id>/comments/``: a vlog's comments, newest first."""
+    if not await models.Vlogs.objects.filter(pk=vlog_id).aexists():
+        raise Http404
+    queryset = models.Comments.objects.filter(vlog_id=vlog_id)
+    try:
+        rows, next_url, previous_url = await AsyncKeysetPagination(request).paginate(queryset)
+    except AsyncKeysetPagination.InvalidCursor:
+        return json_response({'detail': 'Invalid cursor'}, status=404)
+    serializer = serializers.CommentsSerializer(rows, many=True, context={'request': request})
+    return json_response(page(next_url, previous_url, serializer))
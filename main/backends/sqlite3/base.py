@@ -0,0 +1,42 @@
+"""
+SQLite backend tuned for a web server with concurrent readers and writers.
+
+Two extra ``OPTIONS`` are understood on top of those ``sqlite3.connect`` takes:
+
+``pragmas``
+    A mapping of PRAGMAs run on every new connection, e.g. ``journal_mode: 'WAL'``
+    so readers no longer block on a writer, ``synchronous: 'NORMAL'`` (safe with
+    WAL), ``busy_timeout`` in milliseconds and ``mmap_size`` in bytes.
+
+``transaction_mode``
+    ``'DEFERRED'`` (SQLite's default), ``'IMMEDIATE'`` or ``'EXCLUSIVE'``, as in Django
+    5.1. A deferred transaction that reads before it writes cannot upgrade its lock
+    while another connection is writing, and SQLite fails it with "database is
+    locked" at once instead of waiting out ``busy_timeout``. ``'IMMEDIATE'`` takes
+    the write lock at ``BEGIN``, so concurrent writers queue instead.
+"""
+from django.core.exceptions import ImproperlyConfigured
+from django.db.backends.sqlite3 import base
+
+TRANSACTION_MODES = ('DEFERRED', 'IMMEDIATE', 'EXCLUSIVE')
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    def get_connection_params(self):
+        kwargs = super().get_connection_params()
+        self.pragmas = kwargs.pop('pragmas', {})
+        self.transaction_mode = (kwargs.pop('transaction_mode', None) or 'DEFERRED').upper()
+        if self.transaction_mode not in TRANSACTION_MODES:
+            raise ImproperlyConfigured(
+                f"settings.DATABASES transaction_mode must be one of {', '.join(TRANSACTION_MODES)}."
+            )
+        return kwargs
+
+    def get_new_connection(self, conn_params):
+        conn = super().get_new_connection(conn_params)
+        for name, value in self.pragmas.items():
+            conn.execute(f'PRAGMA {name} = {value}')
+        return conn
+
+    def _start_transaction_under_autocommit(self):
+        self.cursor().execute(f'BEGIN {self.transaction_mode}')
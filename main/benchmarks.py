@@ -0,0 +1,239 @@
+"""
+Benchmark suite for the API hot paths.
+
+:func:`seed` fills the database with a synthetic dataset of bench users, vlogs, media
+rows, comments and likes. The scenarios in ``SCENARIOS`` are then driven either
+in-process through the Django test client (:func:`run_inprocess`) or over HTTP
+against a running server with main/loadgen.py (:func:`run_live`). Both return the
+same ``LoadResult`` summaries, which ``manage.py benchmark`` writes out as JSON so
+two runs can be diffed.
+
+Each scenario is played by a number of clients, each signed in as its own bench user.
+A request is described by ``(method, path, body, user)``; ``user`` indexes
+``Dataset.users`` and is ``None`` for anonymous requests.
+"""
+import asyncio
+import json
+import random
+import time
+from dataclasses import dataclass, field
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import transaction
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from . import search
+from .loadgen import LoadResult, build_request, run_scripts
+from .models import Comments, Images, Like, Vlogs
+
+USERNAME_PREFIX = 'bench-'
+# Marks the users seed() creates, so remove() never touches a real account named bench-*.
+EMAIL_DOMAIN = 'bench.invalid'
+PASSWORD = 'bench-password'
+BATCH_SIZE = 1000
+
+
+class BenchmarkError(Exception):
+    pass
+
+
+@dataclass
+class Dataset:
+    users: list
+    vlogs: list
+    sizes: dict
+    tokens: dict = field(default_factory=dict)
+
+    def token(self, user):
+        if user not in self.tokens:
+            self.tokens[user] = str(AccessToken.for_user(User(pk=self.users[user][0])))
+        return self.tokens[user]
+
+    def username(self, user):
+        return self.users[user][1]
+
+
+def seed(users=50, vlogs=200, images=2, comments=5, likes=10, random_seed=0):
+    """
+    Insert a synthetic dataset with ``bulk_create`` and return it as a ``Dataset``.
+    ``images``, ``comments`` and ``likes`` are per vlog; counters and the search index
+    are kept consistent with the inserted rows. Bench user ``i`` never likes vlog ``i``,
+    which the like scenario relies on. Bench data left by an earlier run is removed first;
+    raises :class:`BenchmarkError` if a ``bench-*`` user exists that seed() did not create.
+    """
+    foreign = bench_users(seeded=False).count()
+    if foreign:
+        raise BenchmarkError(f"Refusing to seed: {foreign} existing user(s) named {USERNAME_PREFIX}* "
+                             "were not created by the benchmark.")
+    remove()
+    rng = random.Random(random_seed)
+    likes = min(likes, users - 1)
+    password = make_password(PASSWORD)
+    with transaction.atomic():
+        User.objects.bulk_create([
+            User(username=f'{USERNAME_PREFIX}{index}', email=f'{USERNAME_PREFIX}{index}@{EMAIL_DOMAIN}',
+                 password=password)
+            for index in range(users)
+        ], batch_size=BATCH_SIZE)
+        user_rows = list(bench_users().order_by('pk').values_list('pk', 'username'))
+        user_ids = [pk for pk, _ in user_rows]
+        Vlogs.objects.bulk_create([
+            Vlogs(title=f'Bench vlog {index}', description=f'Synthetic vlog number {index} for benchmarking.',
+                  content='bench', user_id=user_ids[index % users], likes=likes, comments_count=comments)
+            for index in range(vlogs)
+        ], batch_size=BATCH_SIZE)
+        vlog_ids = list(Vlogs.objects.filter(user_id__in=user_ids).order_by('pk').values_list('pk', flat=True))
+        Images.objects.bulk_create([
+            Images(vlog_id=vlog_id, image=f'uploads/images/bench/{vlog_id}-{index}.png')
+            for vlog_id in vlog_ids for index in range(images)
+        ], batch_size=BATCH_SIZE)
+        Comments.objects.bulk_create([
+            Comments(vlog_id=vlog_id, user_id=rng.choice(user_ids), comment=f'Bench comment {index}')
+            for vlog_id in vlog_ids for index in range(comments)
+        ], batch_size=BATCH_SIZE)
+        Like.objects.bulk_create([
+            Like(vlog_id=vlog_id, user_id=user_ids[liker])
+            for position, vlog_id in enumerate(vlog_ids)
+            for liker in skip(rng.sample(range(users - 1), likes), position % users)
+        ], batch_size=BATCH_SIZE)
+        # bulk_create skips the signals that keep the index up to date.
+        search.index_vlogs(vlog_ids)
+    sizes = {'users': users, 'vlogs': vlogs, 'images': images, 'comments': comments, 'likes': likes}
+    return Dataset(users=user_rows, vlogs=vlog_ids, sizes=sizes)
+
+
+def skip(indexes, excluded):
+    """Map indexes drawn from ``range(n - 1)`` onto ``range(n)`` without ``excluded``."""
+    return [index + (index >= excluded) for index in indexes]
+
+
+def bench_users(seeded=True):
+    """Users named ``bench-*`` that seed() created, or with ``seeded=False`` the ones it did not."""
+    users = User.objects.filter(username__startswith=USERNAME_PREFIX)
+    marker = {'email__endswith': f'@{EMAIL_DOMAIN}'}
+    return users.filter(**marker) if seeded else users.exclude(**marker)
+
+
+def remove(dataset=None):
+    """
+    Delete the bench users seeded for ``dataset``, or every seeded bench user, and
+    through them everything seeded for them.
+    """
+    users = bench_users()
+    if dataset is not None:
+        users = users.filter(pk__in=[pk for pk, _ in dataset.users])
+    users.delete()
+
+
+def feed(dataset, client, step):
+    return 'GET', '/api/vlogs/', None, None
+
+
+def detail(dataset, client, step):
+    vlog = dataset.vlogs[(client + step) % len(dataset.vlogs)]
+    return 'GET', f'/api/vlogs/{vlog}/', None, None
+
+
+def like(dataset, client, step):
+    """Client ``i`` likes vlog ``i`` and takes the like back again, alternately."""
+    vlog = dataset.vlogs[client]
+    if step % 2:
+        return 'PUT', f'/api/vlogs/{vlog}/drop-like/', None, client
+    return 'POST', f'/api/vlogs/{vlog}/like/', None, client
+
+
+def comment(dataset, client, step):
+    vlog = dataset.vlogs[(client + step) % len(dataset.vlogs)]
+    return 'POST', f'/api/vlogs/{vlog}/post-comment/', {'comment': f'Benchmark comment {step}'}, client
+
+
+def login(dataset, client, step):
+    return 'POST', '/api/auth/login/', {'username': dataset.username(client), 'password': PASSWORD}, None
+
+
+def mixed(dataset, client, step):
+    """Concurrent reads and writes: odd clients like and unlike, even clients read vlogs."""
+    if client % 2:
+        return like(dataset, client, step)
+    return detail(dataset, client, step)
+
+
+SCENARIOS = {
+    'feed': feed,
+    'detail': detail,
+    'like': like,
+    'comment': comment,
+    'login': login,
+    'mixed': mixed,
+}
+
+
+def max_clients(dataset):
+    """Clients that can run at once without two of them acting as the same user on the same vlog."""
+    return min(len(dataset.users), len(dataset.vlogs))
+
+
+def plan(dataset, scenario, requests, clients, after=None):
+    """
+    The requests of each client, as lists of ``(method, path, body, user)``. ``after``
+    is a previous plan (the warm-up) whose steps this one continues.
+    """
+    make = SCENARIOS[scenario]
+    scripts = []
+    for client in range(clients):
+        first = len(after[client]) if after else 0
+        count = requests // clients + (client < requests % clients)
+        scripts.append([make(dataset, client, step) for step in range(first, first + count)])
+    return scripts
+
+
+def run_inprocess(dataset, scenario, requests, clients=1, warmup=0):
+    """
+    Play ``scenario`` through the Django test client. Requests run one at a time,
+    taking turns between ``clients`` so per-user sequences stay in order.
+    """
+    clients = min(clients, max_clients(dataset))
+    http = APIClient()
+
+    def play(scripts, result):
+        for step in range(max(map(len, scripts), default=0)):
+            for script in scripts:
+                if step >= len(script):
+                    continue
+                method, path, body, user = script[step]
+                headers = {'HTTP_AUTHORIZATION': f'Bearer {dataset.token(user)}'} if user is not None else {}
+                data = json.dumps(body) if body is not None else ''
+                started = time.perf_counter()
+                response = http.generic(method, path, data, content_type='application/json', **headers)
+                result.latencies.append(time.perf_counter() - started)
+                result.statuses[response.status_code] = result.statuses.get(response.status_code, 0) + 1
+
+    warmup = plan(dataset, scenario, warmup, clients)
+    play(warmup, LoadResult())
+    result = LoadResult()
+    started = time.perf_counter()
+    play(plan(dataset, scenario, requests, clients, after=warmup), result)
+    result.elapsed = time.perf_counter() - started
+    return result
+
+
+def run_live(url, dataset, scenario, requests, clients=1, warmup=0):
+    """Play ``scenario`` against the server at ``url``, one connection per client."""
+    clients = min(clients, max_clients(dataset))
+
+    def encode(scripts):
+        return [[encode_one(*request) for request in script] for script in scripts]
+
+    def encode_one(method, path, body, user):
+        headers = {'Content-Type': 'application/json'}
+        if user is not None:
+            headers['Authorization'] = f'Bearer {dataset.token(user)}'
+        payload = json.dumps(body).encode() if body is not None else b''
+        return build_request(method, url + path, headers, payload)
+
+    warmup = plan(dataset, scenario, warmup, clients)
+    if any(warmup):
+        asyncio.run(run_scripts(url, encode(warmup)))
+    return asyncio.run(run_scripts(url, encode(plan(dataset, scenario, requests, clients, after=warmup))))
@@ -0,0 +1,208 @@
+"""
+Bulk vlog import from an NDJSON manifest.
+
+Each manifest line describes one vlog::
+
+    {"title": "...", "description": "...", "content": "...", "cover": "covers/a.jpg",
+     "images": ["img/1.jpg"], "videos": ["clips/1.mp4"], "documents": ["notes.pdf"]}
+
+Media paths are resolved inside a zip archive or relative to the manifest's directory.
+Vlogs are imported in batches: the batch's files are written to storage concurrently,
+then its rows are inserted with ``bulk_create`` in one transaction. If the transaction
+fails, the files written for that batch are deleted again.
+"""
+import json
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from django.conf import settings
+from django.db import transaction
+
+from . import cache, changes, derivatives, search, storage, timelines, transcoding
+from .models import Changes, Documents, Images, Videos, Vlogs
+from .serializers import VlogsImportEntrySerializer
+from .storage_writes import store
+
+MANIFEST_NAME = 'manifest.ndjson'
+
+MEDIA = (
+    # (manifest key, model, field name)
+    ('images', Images, 'image'),
+    ('videos', Videos, 'video'),
+    ('documents', Documents, 'document'),
+)
+
+
+class ZipSource:
+    def __init__(self, archive):
+        self.archive = zipfile.ZipFile(archive)
+
+    def manifest(self):
+        with self.archive.open(MANIFEST_NAME) as f:
+            for line in f:
+                yield line.decode('utf-8')
+
+    def open(self, name):
+        return self.archive.open(name)
+
+
+class DirectorySource:
+    def __init__(self, manifest_path):
+        self.manifest_path = Path(manifest_path)
+        self.base_dir = self.manifest_path.parent.resolve()
+
+    def manifest(self):
+        with open(self.manifest_path, encoding='utf-8') as f:
+            yield from f
+
+    def open(self, name):
+        path = (self.base_dir / name).resolve()
+        if self.base_dir not in path.parents:
+            raise FileNotFoundError(name)
+        return open(path, 'rb')
+
+
+def iter_entries(source):
+    """Yield ``(line number, validated entry or None, errors)`` for every non-blank manifest line."""
+    for number, line in enumerate(source.manifest(), start=1):
+        if not line.strip():
+            continue
+        try:
+            data = json.loads(line)
+        except ValueError as exc:
+            yield number, None, {'line': str(exc)}
+            continue
+        serializer = VlogsImportEntrySerializer(data=data)
+        if serializer.is_valid():
+            yield number, serializer.validated_data, None
+        else:
+            yield number, None, serializer.errors
+
+
+def _write(source, instance, field_name, name):
+    with source.open(name) as f:
+        return store(instance, field_name, f, name)
+
+
+class Importer:
+    def __init__(self, source, user, batch_size=500, workers=None, media_jobs=True):
+        self.source = source
+        self.user = user
+        self.batch_size = batch_size
+        self.workers = workers or getattr(settings, 'VLOG_IMPORT_WORKERS', 8)
+        self.media_jobs = media_jobs
+        self.created = 0
+        self.errors = []
+
+    def run(self, progress=None):
+        batch = []
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='import') as executor:
+            for number, entry, errors in iter_entries(self.source):
+                if errors:
+                    self.errors.append({'line': number, 'errors': errors})
+                    continue
+                batch.append((number, entry))
+                if len(batch) >= self.batch_size:
+                    self.import_batch(executor, batch)
+                    batch = []
+                    if progress:
+                        progress(self)
+            if batch:
+                self.import_batch(executor, batch)
+                if progress:
+                    progress(self)
+        return self
+
+    def import_batch(self, executor, batch):
+        plans = []
+        for number, entry in batch:
+            vlog = Vlogs(user=self.user, title=entry['title'], content=entry.get('content'),
+                         description=entry['description'])
+            files, rows = [], []
+            if entry.get('cover'):
+                files.append((vlog, 'cover', entry['cover']))
+            for key, model, field_name in MEDIA:
+                for name in entry.get(key, []):
+                    row = model()
+                    rows.append(row)
+                    files.append((row, field_name, name))
+            futures = [(instance, field_name, name, executor.submit(_write, self.source, instance, field_name, name))
+                       for instance, field_name, name in files]
+            plans.append((number, vlog, rows, futures))
+
+        written, accepted = [], []
+        try:
+            for number, vlog, rows, futures in plans:
+                stored, errors = [], {}
+                for instance, field_name, name, future in futures:
+                    try:
+                        stored_name = future.result()
+                    except (OSError, KeyError) as exc:
+                        errors[name] = 'File not found in the import.' if isinstance(exc, KeyError) else str(exc)
+                        continue
+                    stored.append(stored_name)
+                    setattr(instance, field_name, stored_name)
+                if errors:
+                    self._delete_files(stored)
+                    self.errors.append({'line': number, 'errors': errors})
+                    continue
+                written.extend(stored)
+                accepted.append((vlog, rows))
+        except BaseException:
+            # Any other failure aborts the batch; remove whatever its writes stored.
+            self._discard(plans)
+            raise
+
+        vlogs = [vlog for vlog, _ in accepted]
+        media = []
+        try:
+            with transaction.atomic():
+                Vlogs.objects.bulk_create(vlogs)
+                changes.record_many(vlogs, Changes.CREATED)
+                for vlog, rows in accepted:
+                    for row in rows:
+                        row.vlog = vlog
+                        media.append(row)
+                for _, model, _ in MEDIA:
+                    model.objects.bulk_create([row for row in media if type(row) is model])
+                # bulk_create skips the signals that count blob references.
+                storage.retain([vlog.cover.name for vlog in vlogs if vlog.cover] +
+                               [getattr(row, field_name).name for row in media
+                                for _, model, field_name in MEDIA if type(row) is model])
+        except Exception:
+            self._delete_files(written)
+            raise
+
+        self.created += len(vlogs)
+        self._after_commit(vlogs, media)
+
+    def _delete_files(self, names):
+        for name in names:
+            storage.media_storage.delete(name)
+
+    def _discard(self, plans):
+        """Delete every file stored by the writes of ``plans``, waiting for those still running."""
+        for _, _, _, futures in plans:
+            for _, _, _, future in futures:
+                try:
+                    self._delete_files([future.result()])
+                except Exception:
+                    continue
+
+    def _after_commit(self, vlogs, media):
+        # bulk_create skips the signals that keep these up to date.
+        search.index_vlogs([vlog.pk for vlog in vlogs])
+        cache.invalidate_feed()
+        for vlog in vlogs:
+            timelines.pool.schedule(timelines.fan_out, vlog.pk)
+        if not self.media_jobs:
+            return
+        for vlog in vlogs:
+            if vlog.cover:
+                derivatives.pool.schedule(derivatives.generate_for_cover, vlog.pk)
+        for row in media:
+            if isinstance(row, Images):
+                derivatives.pool.schedule(derivatives.generate_for_image, row.pk)
+            elif isinstance(row, Videos):
+                transcoding.enqueue(row)
@@ -0,0 +1,137 @@
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS, transaction
+
+from . import replicas
+
+FEED_GENERATION_KEY = 'feed:generation'
+
+
+def get_response_cache():
+    return caches[getattr(settings, 'VLOG_RESPONSE_CACHE', 'default')]
+
+
+def get_timeout():
+    return getattr(settings, 'VLOG_RESPONSE_CACHE_TIMEOUT', 60)
+
+
+def generation(key):
+    """
+    Current value of the generation counter ``key``. Cached entries keyed by it are all
+    invalidated at once by :func:`bump`. The initial value is time based so a generation
+    lost to eviction never collides with an older one.
+    """
+    cache = get_response_cache()
+    value = cache.get(key)
+    if value is None:
+        cache.add(key, time.time_ns(), timeout=None)
+        value = cache.get(key)
+    return value
+
+
+async def ageneration(key):
+    """Async counterpart of :func:`generation`."""
+    cache = get_response_cache()
+    value = await cache.aget(key)
+    if value is None:
+        await cache.aadd(key, time.time_ns(), timeout=None)
+        value = await cache.aget(key)
+    return value
+
+
+def bump(key):
+    cache = get_response_cache()
+    cache.add(key, time.time_ns(), timeout=None)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, time.time_ns(), timeout=None)
+
+
+def feed_generation():
+    """Current generation of the feed; every cached feed page is keyed by it."""
+    return generation(FEED_GENERATION_KEY)
+
+
+async def afeed_generation():
+    return await ageneration(FEED_GENERATION_KEY)
+
+
+def feed_key(full_path):
+    digest = hashlib.md5(full_path.encode()).hexdigest()
+    return f'feed:{feed_generation()}:{digest}'
+
+
+async def afeed_key(full_path):
+    digest = hashlib.md5(full_path.encode()).hexdigest()
+    return f'feed:{await afeed_generation()}:{digest}'
+
+
+def vlog_generation_key(vlog_id):
+    return f'vlog:generation:{vlog_id}'
+
+
+def detail_key(vlog_id, origin):
+    """
+    Key of a vlog's detail payload as served at ``origin`` (scheme and host): the payload
+    holds absolute media URLs. Keyed by the vlog's generation, so one bump drops it for
+    every origin.
+    """
+    digest = hashlib.md5(origin.encode()).hexdigest()
+    return f'vlog:detail:{vlog_id}:{generation(vlog_generation_key(vlog_id))}:{digest}'
+
+
+async def adetail_key(vlog_id, origin):
+    digest = hashlib.md5(origin.encode()).hexdigest()
+    return f'vlog:detail:{vlog_id}:{await ageneration(vlog_generation_key(vlog_id))}:{digest}'
+
+
+def scoped(key):
+    """
+    ``key`` for the database the current request reads from. Payloads built from a
+    replica are cached apart from the primary's, so a lagging replica cannot refill a
+    just-invalidated entry that a user pinned to the primary then reads back.
+    """
+    alias = replicas.read_alias.get()
+    return key if alias in (None, DEFAULT_DB_ALIAS) else f'{key}@{alias}'
+
+
+def get_or_build(key, build):
+    cache = get_response_cache()
+    key = scoped(key)
+    data = cache.get(key)
+    if data is None:
+        data = build()
+        cache.set(key, data, timeout=get_timeout())
+    return data
+
+
+async def aget_or_build(key, build):
+    """Like :func:`get_or_build`, with ``build`` a coroutine function."""
+    cache = get_response_cache()
+    key = scoped(key)
+    data = await cache.aget(key)
+    if data is None:
+        data = await build()
+        await cache.aset(key, data, timeout=get_timeout())
+    return data
+
+
+def invalidate_feed():
+    bump(FEED_GENERATION_KEY)
+
+
+def invalidate_vlog(vlog_id):
+    bump(vlog_generation_key(vlog_id))
+    invalidate_feed()
+
+
+def invalidate_vlog_on_commit(vlog_id):
+    """
+    :func:`invalidate_vlog` once the current transaction commits. Invalidating earlier
+    lets a concurrent read re-cache the pre-commit rows, which then outlive the write.
+    """
+    transaction.on_commit(lambda: invalidate_vlog(vlog_id))
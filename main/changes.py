@@ -0,0 +1,153 @@
+"""
+Change feed for vlogs, comments and likes.
+
+Every create, update and delete of a ``Vlogs``, ``Comments`` or ``Like`` row appends a
+``Changes`` row in the same transaction (the receivers live in main/signals.py; bulk
+writes call :func:`record_many` themselves). Consumers read the log in sequence order
+and resume from the last sequence number they processed, see ``ChangesView``.
+
+Sequence numbers are handed out at insert time, not at commit, so on databases with
+concurrent writers a lower number can become visible after a higher one. :func:`read`
+therefore stops before a gap in the sequence until the rows after it are older than
+``VLOG_CHANGES_SETTLE_SECONDS``; gaps left by rolled-back transactions are skipped
+once they have settled.
+
+Long-polls and event streams sleep between polls inside a sync view, so each one holds
+a worker thread for its whole duration. :data:`streams` caps how many a process serves
+at once (``VLOG_CHANGES_MAX_STREAMS``); keep it below the worker's thread count so other
+requests still get a thread. The log is pruned with ``manage.py prune_changes``.
+"""
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from .models import Changes, Comments, Like, Vlogs
+
+KINDS = {Vlogs: Changes.VLOG, Comments: Changes.COMMENT, Like: Changes.LIKE}
+
+
+def settle_seconds():
+    return getattr(settings, 'VLOG_CHANGES_SETTLE_SECONDS', 5)
+
+
+def poll_interval():
+    return getattr(settings, 'VLOG_CHANGES_POLL_INTERVAL', 1.0)
+
+
+def max_streams():
+    return getattr(settings, 'VLOG_CHANGES_MAX_STREAMS', 8)
+
+
+class StreamSlots:
+    """Per-process count of requests parked in a long-poll or an event stream."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.active = 0
+
+    def acquire(self):
+        with self.lock:
+            if self.active >= max_streams():
+                return False
+            self.active += 1
+            return True
+
+    def release(self):
+        with self.lock:
+            self.active -= 1
+
+
+streams = StreamSlots()
+
+
+class HeldStream:
+    """
+    Iterates ``events`` and gives its slot in :data:`streams` back once, when the events
+    run out or the response is closed, even if the client left before the first event.
+    """
+
+    def __init__(self, events):
+        self.events = events
+        self.held = True
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        try:
+            return next(self.events)
+        except BaseException:
+            self.close()
+            raise
+
+    def close(self):
+        self.events.close()
+        if self.held:
+            self.held = False
+            streams.release()
+
+
+def change_for(instance, action):
+    if isinstance(instance, Vlogs):
+        vlog_id, user_id = instance.pk, instance.user_id
+    else:
+        vlog_id, user_id = instance.vlog_id, instance.user_id
+    return Changes(kind=KINDS[type(instance)], action=action, object_id=instance.pk, vlog_id=vlog_id,
+                   user_id=user_id)
+
+
+def record(instance, action):
+    change_for(instance, action).save()
+
+
+def record_many(instances, action):
+    """Log ``action`` for rows written with ``bulk_create`` or other signal-less paths."""
+    Changes.objects.bulk_create([change_for(instance, action) for instance in instances])
+
+
+def as_dict(change):
+    return {
+        'seq': change.id,
+        'kind': change.kind,
+        'action': change.action,
+        'id': change.object_id,
+        'vlog': change.vlog_id,
+        'user': change.user_id,
+        'at': change.created_at.isoformat(),
+    }
+
+
+def read(since, limit):
+    """Changes after sequence number ``since``, oldest first, up to the first unsettled gap."""
+    rows = list(Changes.objects.filter(id__gt=since).order_by('id')[:limit])
+    settled = timezone.now() - timedelta(seconds=settle_seconds())
+    expected = since + 1
+    for index, change in enumerate(rows):
+        if change.id != expected and change.created_at > settled:
+            return rows[:index]
+        expected = change.id + 1
+    return rows
+
+
+def wait(since, limit, timeout):
+    """Like :func:`read`, but poll for up to ``timeout`` seconds while there is nothing new."""
+    deadline = time.monotonic() + timeout
+    while True:
+        rows = read(since, limit)
+        if rows or time.monotonic() >= deadline:
+            return rows
+        time.sleep(min(poll_interval(), max(0.0, deadline - time.monotonic())))
+
+
+def prune(before, batch_size=10000):
+    """Delete changes logged before ``before``, oldest first, in batches. Returns how many were deleted."""
+    deleted = 0
+    while True:
+        old = Changes.objects.filter(created_at__lt=before).order_by('id')
+        ids = list(old.values_list('id', flat=True)[:batch_size])
+        if not ids:
+            return deleted
+        deleted += Changes.objects.filter(id__in=ids).delete()[0]
@@ -0,0 +1,80 @@
+from io import BytesIO
+from pathlib import PurePath
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import transaction
+from PIL import Image, ImageOps
+
+from .cache import invalidate_vlog
+from .models import ImageDerivatives, Images, Vlogs
+from .workers import WorkerPool
+
+PIL_FORMATS = {'webp': 'WEBP', 'jpeg': 'JPEG'}
+
+pool = WorkerPool('derivatives', 'VLOG_DERIVATIVE_WORKERS', 'VLOG_DERIVATIVES_ASYNC')
+
+
+def render(field_file):
+    """Yield ``(width, height, format, ContentFile)`` for every configured derivative of ``field_file``."""
+    widths = getattr(settings, 'VLOG_DERIVATIVE_WIDTHS', (320, 640, 1280))
+    formats = getattr(settings, 'VLOG_DERIVATIVE_FORMATS', ('webp', 'jpeg'))
+    stem = PurePath(field_file.name).stem
+
+    with field_file.open('rb') as f, Image.open(f) as original:
+        original = ImageOps.exif_transpose(original)
+        if original.mode not in ('RGB', 'RGBA'):
+            original = original.convert('RGBA' if 'transparency' in original.info else 'RGB')
+        # Never upscale; an upload narrower than every target still gets one re-encoded copy.
+        targets = [width for width in sorted(widths) if width < original.width] or [original.width]
+        for width in targets:
+            resized = original.copy()
+            resized.thumbnail((width, original.height), Image.LANCZOS)
+            for fmt in formats:
+                frame = resized.convert('RGB') if fmt == 'jpeg' else resized
+                buffer = BytesIO()
+                frame.save(buffer, PIL_FORMATS[fmt], quality=80)
+                content = ContentFile(buffer.getvalue(), name=f"{stem}-{resized.width}w.{fmt}")
+                yield resized.width, resized.height, fmt, content
+
+
+def _regenerate(field_file, owner):
+    """Replace ``owner``'s derivatives (image=... or vlog=...) unless they already match ``field_file``."""
+    existing = ImageDerivatives.objects.filter(**owner)
+    if not field_file:
+        _delete(existing)
+        return
+    if existing.exists() and not existing.exclude(source=field_file.name).exists():
+        return
+
+    derivatives = []
+    for width, height, fmt, content in render(field_file):
+        derivative = ImageDerivatives(source=field_file.name, width=width, height=height, format=fmt, **owner)
+        derivative.file.save(content.name, content, save=False)
+        derivatives.append(derivative)
+
+    with transaction.atomic():
+        _delete(existing)
+        ImageDerivatives.objects.bulk_create(derivatives)
+
+
+def _delete(derivatives):
+    # main.signals.derivative_deleted removes the files.
+    derivatives.delete()
+
+
+def generate_for_image(image_id):
+    image = Images.objects.filter(pk=image_id).only('id', 'image', 'vlog_id').first()
+    if image is None:
+        return
+    _regenerate(image.image, {'image': image})
+    if image.vlog_id:
+        invalidate_vlog(image.vlog_id)
+
+
+def generate_for_cover(vlog_id):
+    vlog = Vlogs.objects.filter(pk=vlog_id).only('id', 'cover').first()
+    if vlog is None:
+        return
+    _regenerate(vlog.cover, {'vlog': vlog})
+    invalidate_vlog(vlog_id)
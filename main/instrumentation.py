@@ -0,0 +1,193 @@
+"""
+Per-request performance instrumentation.
+
+``InstrumentationMiddleware`` records each request's wall time, database query count
+and time, time spent rendering the response body and the response size. They are
+returned in a ``Server-Timing`` header and fed to the histograms in main/metrics.py,
+which ``/metrics`` exposes to Prometheus labelled by URL name.
+
+Queries are counted by an ``execute_wrapper`` installed on every database connection
+as it is opened. The wrapper records into the metrics of the request running in the
+current context, which asgiref carries across ``sync_to_async`` so queries run by the
+async views are counted as well. The body of a streaming response (exports, the changes
+feed) is produced after the middleware returns; its iteration is run with the request's
+metrics current, so those queries count too. They land in the histograms and the budget
+check once the stream ends, but are missing from ``Server-Timing``, which is sent first.
+
+Views declare how many queries they may run with a ``query_budget`` class attribute
+(or the :func:`query_budget` decorator for function views). A request over budget is
+logged and counted; with ``VLOG_QUERY_BUDGET_STRICT`` on, as under the test runner in
+main/test_runner.py, it raises :class:`QueryBudgetExceeded` so the test fails.
+"""
+import logging
+import time
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+current = ContextVar('vlog_request_metrics', default=None)
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+class RequestMetrics:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.serialize_seconds = 0.0
+        self.view = None
+        self.budget = None
+
+
+def record_query(execute, sql, params, many, context):
+    request_metrics = current.get()
+    if request_metrics is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        request_metrics.db_seconds += time.perf_counter() - started
+        request_metrics.queries += 1
+
+
+def install_query_recorder(connection, **kwargs):
+    """``connection_created`` receiver; safe to call more than once per connection."""
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+class timed_serialization:
+    """Context manager adding the time spent in its block to the current request's serialization time."""
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+
+    def __exit__(self, *exc_info):
+        request_metrics = current.get()
+        if request_metrics is not None:
+            request_metrics.serialize_seconds += time.perf_counter() - self.started
+
+
+def query_budget(queries):
+    """Declare the query budget of a function view."""
+    def decorator(view):
+        view.query_budget = queries
+        return view
+    return decorator
+
+
+def budget_for(view_func):
+    view_class = getattr(view_func, 'view_class', None) or getattr(view_func, 'cls', None)
+    budget = getattr(view_class, 'query_budget', None)
+    return budget if budget is not None else getattr(view_func, 'query_budget', None)
+
+
+class InstrumentationMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        request_metrics = RequestMetrics()
+        token = current.set(request_metrics)
+        try:
+            response = self.get_response(request)
+        finally:
+            current.reset(token)
+        return self.finish(request, response, request_metrics)
+
+    async def __acall__(self, request):
+        request_metrics = RequestMetrics()
+        token = current.set(request_metrics)
+        try:
+            response = await self.get_response(request)
+        finally:
+            current.reset(token)
+        return self.finish(request, response, request_metrics)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request_metrics = current.get()
+        if request_metrics is not None:
+            request_metrics.budget = budget_for(view_func)
+
+    def finish(self, request, response, request_metrics):
+        match = request.resolver_match
+        request_metrics.view = (match.url_name or match.view_name) if match else 'unmatched'
+        elapsed = time.perf_counter() - request_metrics.started
+
+        if getattr(settings, 'VLOG_SERVER_TIMING', True):
+            response['Server-Timing'] = ', '.join([
+                f'db;dur={request_metrics.db_seconds * 1000:.2f};desc="{request_metrics.queries} queries"',
+                f'serialize;dur={request_metrics.serialize_seconds * 1000:.2f}',
+                f'total;dur={elapsed * 1000:.2f}',
+            ])
+
+        labels = (request_metrics.view, request.method)
+        metrics.REQUESTS.inc(*labels, response.status_code)
+        metrics.REQUEST_DURATION.observe(elapsed, *labels)
+        if response.streaming:
+            response.streaming_content = self.count_streamed(response.streaming_content, request_metrics, labels)
+            return response
+        metrics.RESPONSE_SIZE.observe(len(response.content), *labels)
+        self.observe_queries(request_metrics, labels)
+        return response
+
+    def observe_queries(self, request_metrics, labels):
+        metrics.DB_QUERIES.observe(request_metrics.queries, *labels)
+        metrics.DB_DURATION.observe(request_metrics.db_seconds, *labels)
+        metrics.SERIALIZE_DURATION.observe(request_metrics.serialize_seconds, *labels)
+        self.check_budget(request_metrics)
+
+    def count_streamed(self, content, request_metrics, labels):
+        size = 0
+        chunks = iter(content)
+        try:
+            while True:
+                # Queries run while producing the next chunk belong to this request.
+                token = current.set(request_metrics)
+                try:
+                    chunk = next(chunks)
+                except StopIteration:
+                    break
+                finally:
+                    current.reset(token)
+                size += len(chunk)
+                yield chunk
+        finally:
+            metrics.RESPONSE_SIZE.observe(size, *labels)
+        self.observe_queries(request_metrics, labels)
+
+    @staticmethod
+    def check_budget(request_metrics):
+        budget = request_metrics.budget
+        if budget is None or request_metrics.queries <= budget:
+            return
+        message = f'{request_metrics.view} ran {request_metrics.queries} queries, over its budget of {budget}.'
+        metrics.BUDGET_EXCEEDED.inc(request_metrics.view)
+        if getattr(settings, 'VLOG_QUERY_BUDGET_STRICT', False):
+            raise QueryBudgetExceeded(message)
+        logger.warning(message)
+
+
+def metrics_view(request):
+    """Prometheus scrape endpoint."""
+    allowed = getattr(settings, 'VLOG_METRICS_ALLOWED_IPS', ['127.0.0.1', '::1'])
+    if allowed is not None and request.META.get('REMOTE_ADDR') not in allowed:
+        return HttpResponseForbidden()
+    return HttpResponse(metrics.registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
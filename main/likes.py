@@ -0,0 +1,256 @@
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import IntegrityError, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from . import changes, trending
+from .cache import invalidate_vlog
+from .models import Changes, Like, Vlogs
+
+
+def add_like(user, vlog):
+    """
+    Record ``user``'s like on ``vlog`` and bump the denormalized counter and trending score.
+
+    Returns the new ``Like`` or ``None`` if the user had already liked the vlog.
+    The counter is adjusted with a single ``UPDATE ... SET likes = likes + 1`` so
+    concurrent likes never overwrite each other. The same UPDATE moves ``updated_date``
+    forward, since the like count is part of what Last-Modified and exports describe.
+    """
+    try:
+        with transaction.atomic():
+            like = Like.objects.create(user=user, vlog=vlog)
+            Vlogs.objects.filter(pk=vlog.pk).update(likes=F('likes') + 1, updated_date=timezone.now())
+            trending.bump(vlog)
+    except IntegrityError:
+        return None
+    return like
+
+
+def remove_like(user, vlog):
+    """Drop ``user``'s like on ``vlog``. Returns ``False`` if there was nothing to drop."""
+    with transaction.atomic():
+        deleted, _ = Like.objects.filter(user=user, vlog=vlog).delete()
+        if deleted:
+            Vlogs.objects.filter(pk=vlog.pk).update(likes=F('likes') - deleted, updated_date=timezone.now())
+            trending.bump(vlog)
+    return bool(deleted)
+
+
+# Write-behind buffering
+#
+# With ``VLOG_LIKES_BUFFERED = True`` likes and unlikes are appended to an event log
+# kept in the ``VLOG_LIKES_CACHE`` cache instead of writing to the database. Every event
+# gets a sequence number from an atomic ``incr``; ``flush_likes`` later replays the log
+# in batches into ``Like`` and ``Vlogs.likes``. Until then, reads add the per-vlog
+# pending delta on top of the stored counter.
+#
+# Whether a user currently likes a vlog is read from the per-(vlog, user) state the
+# buffer keeps. That state is dropped once flushed, so the first like or unlike of a
+# pair after a flush still checks the ``Like`` table once. Toggles of the same pair
+# are serialised by a claim taken with ``cache.add``; a toggle that finds the claim
+# held by a concurrent one is refused rather than recorded twice.
+
+SEQ_KEY = 'likes:seq'
+FLUSHED_KEY = 'likes:flushed'
+HORIZON_KEY = 'likes:horizon'
+LOCK_KEY = 'likes:flush-lock'
+# Seconds a claim outlives a request that died holding it.
+CLAIM_TIMEOUT = 10
+
+
+def buffering_enabled():
+    return getattr(settings, 'VLOG_LIKES_BUFFERED', False)
+
+
+def get_buffer_cache():
+    return caches[getattr(settings, 'VLOG_LIKES_CACHE', 'default')]
+
+
+def _event_key(seq):
+    return f'likes:event:{seq}'
+
+
+def _state_key(vlog_id, user_id):
+    return f'likes:state:{vlog_id}:{user_id}'
+
+
+def _delta_key(vlog_id):
+    return f'likes:delta:{vlog_id}'
+
+
+def _claim_key(vlog_id, user_id):
+    return f'likes:claim:{vlog_id}:{user_id}'
+
+
+def _incr(cache, key, delta):
+    cache.add(key, 0, timeout=None)
+    try:
+        return cache.incr(key, delta)
+    except ValueError:
+        # The key was evicted between add() and incr().
+        cache.set(key, delta, timeout=None)
+        return delta
+
+
+def _is_liked(cache, user, vlog):
+    state = cache.get(_state_key(vlog.pk, user.pk))
+    if state is not None:
+        return state[1] > 0
+    return Like.objects.filter(user=user, vlog=vlog).exists()
+
+
+def _record(cache, user, vlog, delta):
+    seq = _incr(cache, SEQ_KEY, 1)
+    cache.set(_event_key(seq), (vlog.pk, user.pk, delta), timeout=None)
+    cache.set(_state_key(vlog.pk, user.pk), (seq, delta), timeout=None)
+    _incr(cache, _delta_key(vlog.pk), delta)
+    invalidate_vlog(vlog.pk)
+
+
+def _toggle(user, vlog, delta):
+    cache = get_buffer_cache()
+    claim = _claim_key(vlog.pk, user.pk)
+    if not cache.add(claim, 1, timeout=CLAIM_TIMEOUT):
+        return False
+    try:
+        if _is_liked(cache, user, vlog) == (delta > 0):
+            return False
+        _record(cache, user, vlog, delta)
+        return True
+    finally:
+        cache.delete(claim)
+
+
+def buffer_like(user, vlog):
+    """Buffered counterpart of :func:`add_like`. Returns ``False`` if already liked or being toggled."""
+    return _toggle(user, vlog, 1)
+
+
+def buffer_unlike(user, vlog):
+    """Buffered counterpart of :func:`remove_like`. Returns ``False`` if not liked or being toggled."""
+    return _toggle(user, vlog, -1)
+
+
+def pending_like_deltas(vlog_ids):
+    """Map vlog id -> likes recorded in the buffer but not flushed yet."""
+    if not buffering_enabled() or not vlog_ids:
+        return {}
+    keys = {_delta_key(vlog_id): vlog_id for vlog_id in vlog_ids}
+    return {keys[key]: delta for key, delta in get_buffer_cache().get_many(keys).items() if delta}
+
+
+async def apending_like_deltas(vlog_ids):
+    """Async counterpart of :func:`pending_like_deltas`."""
+    if not buffering_enabled() or not vlog_ids:
+        return {}
+    keys = {_delta_key(vlog_id): vlog_id for vlog_id in vlog_ids}
+    return {keys[key]: delta for key, delta in (await get_buffer_cache().aget_many(keys)).items() if delta}
+
+
+def flush_buffered_likes(batch_size=1000):
+    """
+    Apply buffered like events to the database.
+
+    Events are collapsed to the final state per (vlog, user), written with
+    ``bulk_create(ignore_conflicts=True)`` / a bulk delete, and each touched vlog's
+    counter is moved by the number of rows that actually changed. Returns the
+    number of events consumed.
+    """
+    cache = get_buffer_cache()
+    if not cache.add(LOCK_KEY, 1, timeout=300):
+        return 0
+    try:
+        consumed = 0
+        while True:
+            flushed = cache.get(FLUSHED_KEY, 0)
+            head = cache.get(SEQ_KEY, 0)
+            horizon = cache.get(HORIZON_KEY, 0)
+            if flushed >= head:
+                break
+            seqs = range(flushed + 1, min(head, flushed + batch_size) + 1)
+            found = cache.get_many([_event_key(seq) for seq in seqs])
+            events = []
+            for seq in seqs:
+                event = found.get(_event_key(seq))
+                if event is None:
+                    if seq > horizon:
+                        # Writer took the sequence number but has not stored the event yet.
+                        break
+                    # Lost event, older than the previous flush: skip it.
+                    events.append((seq, None))
+                    continue
+                events.append((seq, event))
+            if not events:
+                break
+            last_seq = events[-1][0]
+            _apply_events([event for _, event in events if event is not None], last_seq)
+            cache.set(FLUSHED_KEY, last_seq, timeout=None)
+            cache.delete_many([_event_key(seq) for seq, _ in events])
+            consumed += len(events)
+        cache.set(HORIZON_KEY, cache.get(SEQ_KEY, 0), timeout=None)
+        return consumed
+    finally:
+        cache.delete(LOCK_KEY)
+
+
+def _pairs(pairs):
+    condition = Q()
+    for vlog_id, user_id in pairs:
+        condition |= Q(vlog_id=vlog_id, user_id=user_id)
+    return condition
+
+
+def _apply_events(events, last_seq):
+    cache = get_buffer_cache()
+    final = {}
+    nominal = defaultdict(int)
+    for vlog_id, user_id, delta in events:
+        final[(vlog_id, user_id)] = delta
+        nominal[vlog_id] += delta
+    if not final:
+        return
+
+    vlog_ids = {vlog_id for vlog_id, _ in final}
+    user_ids = {user_id for _, user_id in final}
+    existing = set(
+        Like.objects.filter(vlog_id__in=vlog_ids, user_id__in=user_ids).values_list('vlog_id', 'user_id')
+    )
+    live_vlogs = set(Vlogs.objects.filter(pk__in=vlog_ids).values_list('pk', flat=True))
+    to_create = [pair for pair, delta in final.items() if delta > 0 and pair not in existing and pair[0] in live_vlogs]
+    to_delete = [pair for pair, delta in final.items() if delta < 0 and pair in existing]
+
+    moved = defaultdict(int)
+    for vlog_id, _ in to_create:
+        moved[vlog_id] += 1
+    for vlog_id, _ in to_delete:
+        moved[vlog_id] -= 1
+
+    with transaction.atomic():
+        Like.objects.bulk_create(
+            [Like(vlog_id=vlog_id, user_id=user_id) for vlog_id, user_id in to_create],
+            ignore_conflicts=True,
+        )
+        if to_create:
+            # bulk_create skips post_save and, with ignore_conflicts, does not return the new ids.
+            changes.record_many(Like.objects.filter(_pairs(to_create)).only('id', 'vlog_id', 'user_id'),
+                                Changes.CREATED)
+        if to_delete:
+            Like.objects.filter(_pairs(to_delete)).delete()
+        now = timezone.now()
+        for vlog_id, change in moved.items():
+            if change:
+                Vlogs.objects.filter(pk=vlog_id).update(likes=F('likes') + change, updated_date=now)
+        trending.refresh([vlog_id for vlog_id, change in moved.items() if change])
+
+    for vlog_id, delta in nominal.items():
+        if delta:
+            _incr(cache, _delta_key(vlog_id), -delta)
+        invalidate_vlog(vlog_id)
+    # Forget per-user state the database now reflects, unless a newer event replaced it.
+    state_keys = [_state_key(vlog_id, user_id) for vlog_id, user_id in final]
+    states = cache.get_many(state_keys)
+    cache.delete_many([key for key, (seq, _) in states.items() if seq <= last_seq])
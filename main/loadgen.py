@@ -0,0 +1,138 @@
+"""
+A small HTTP/1.1 load generator built on asyncio streams.
+
+It keeps ``concurrency`` keep-alive connections busy until ``total`` requests have
+completed and records each request's latency. Being a single coroutine per
+connection, it can hold far more concurrent requests than a thread-per-client tool,
+which is what comparing the ASGI and WSGI deployments needs.
+"""
+import asyncio
+import time
+from itertools import repeat
+from urllib.parse import urlsplit
+
+
+class LoadResult:
+    def __init__(self):
+        self.latencies = []
+        self.statuses = {}
+        self.errors = 0
+        self.elapsed = 0.0
+
+    def summary(self):
+        latencies = sorted(self.latencies)
+        completed = len(latencies)
+        return {
+            'requests': completed,
+            'errors': self.errors,
+            'statuses': {str(code): count for code, count in sorted(self.statuses.items())},
+            'seconds': round(self.elapsed, 3),
+            'throughput': round(completed / self.elapsed, 1) if self.elapsed else 0.0,
+            'p50_ms': percentile(latencies, 50),
+            'p90_ms': percentile(latencies, 90),
+            'p99_ms': percentile(latencies, 99),
+            'max_ms': round(latencies[-1] * 1000, 2) if latencies else None,
+        }
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, round(pct / 100 * (len(sorted_values) - 1)))
+    return round(sorted_values[index] * 1000, 2)
+
+
+async def read_response(reader):
+    """Read one response; returns ``(status, keep_alive)``."""
+    status_line = await reader.readline()
+    if not status_line:
+        raise ConnectionError('connection closed by server')
+    status = int(status_line.split()[1])
+    length, keep_alive, chunked = 0, not status_line.startswith(b'HTTP/1.0'), False
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b'\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        name, value = name.strip().lower(), value.strip().lower()
+        if name == 'content-length':
+            length = int(value)
+        elif name == 'connection':
+            keep_alive = value == 'keep-alive' or (keep_alive and value != 'close')
+        elif name == 'transfer-encoding':
+            chunked = 'chunked' in value
+    if chunked:
+        while True:
+            size = int((await reader.readline()).split(b';')[0], 16)
+            await reader.readexactly(size + 2)
+            if size == 0:
+                break
+    elif length:
+        await reader.readexactly(length)
+    elif not keep_alive:
+        await reader.read()
+    return status, keep_alive
+
+
+def build_request(method, url, headers=None, body=b''):
+    """Encode one HTTP/1.1 request for ``url``."""
+    parts = urlsplit(url)
+    target = parts.path + (f'?{parts.query}' if parts.query else '')
+    headers = dict(headers or {})
+    if body or method not in ('GET', 'HEAD'):
+        headers['Content-Length'] = len(body)
+    extra = ''.join(f'{name}: {value}\r\n' for name, value in headers.items())
+    return f'{method} {target} HTTP/1.1\r\nHost: {parts.netloc}\r\n{extra}\r\n'.encode() + body
+
+
+async def _client(host, port, requests, result):
+    """Send ``requests`` one after the other over a keep-alive connection, reconnecting as needed."""
+    reader = writer = None
+    for request in requests:
+        started = time.perf_counter()
+        try:
+            if writer is None:
+                reader, writer = await asyncio.open_connection(host, port)
+            writer.write(request)
+            await writer.drain()
+            status, keep_alive = await read_response(reader)
+        except (OSError, ConnectionError, ValueError, asyncio.IncompleteReadError):
+            result.errors += 1
+            if writer is not None:
+                writer.close()
+            reader = writer = None
+            continue
+        result.latencies.append(time.perf_counter() - started)
+        result.statuses[status] = result.statuses.get(status, 0) + 1
+        if not keep_alive:
+            writer.close()
+            reader = writer = None
+    if writer is not None:
+        writer.close()
+
+
+async def _run(url, request_streams):
+    parts = urlsplit(url)
+    result = LoadResult()
+    started = time.perf_counter()
+    await asyncio.gather(*(
+        _client(parts.hostname, parts.port or 80, requests, result) for requests in request_streams
+    ))
+    result.elapsed = time.perf_counter() - started
+    return result
+
+
+async def run_scripts(url, scripts):
+    """
+    Open one connection per script and send its requests (built with
+    :func:`build_request`) one after the other, all connections at once. Lets each
+    connection act as a different user, e.g. alternately liking and unliking a vlog.
+    """
+    return await _run(url, scripts)
+
+
+async def run_load(url, total, concurrency, headers=None):
+    """Send ``total`` GET requests for ``url`` over ``concurrency`` connections."""
+    # The connections share one iterator, so whichever is free sends the next request.
+    requests = repeat(build_request('GET', url, headers), total)
+    return await _run(url, [requests] * concurrency)
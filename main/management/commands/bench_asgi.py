@@ -0,0 +1,113 @@
+import asyncio
+import json
+import socket
+import subprocess
+import sys
+import time
+from importlib.util import find_spec
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from main.loadgen import run_load
+from main.models import Vlogs
+
+# Endpoint name -> (WSGI path, ASGI path); {pk} is filled with --vlog.
+ENDPOINTS = {
+    'feed': ('/api/vlogs/', '/api/vlogs/async/'),
+    'detail': ('/api/vlogs/{pk}/', '/api/vlogs/async/{pk}/'),
+    'comments': ('/api/vlogs/{pk}/comments/', '/api/vlogs/async/{pk}/comments/'),
+}
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def wait_for_port(port, process, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise CommandError(f"Server exited with status {process.returncode}.")
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=0.5).close()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise CommandError(f"Server did not start listening on port {port}.")
+
+
+class Command(BaseCommand):
+    help = ("Compare throughput and latency of the async read views under uvicorn with the sync views "
+            "under a WSGI server at high concurrency.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--endpoint', choices=sorted(ENDPOINTS), action='append',
+                            help="Endpoint(s) to measure. Defaults to all of them.")
+        parser.add_argument('--vlog', type=int, help="Vlog id for the detail and comments endpoints.")
+        parser.add_argument('--requests', type=int, default=5000, help="Requests per endpoint and server.")
+        parser.add_argument('--concurrency', type=int, default=200, help="Concurrent connections.")
+        parser.add_argument('--workers', type=int, default=1, help="Server worker processes.")
+        parser.add_argument('--threads', type=int, default=8, help="Threads per gunicorn worker.")
+        parser.add_argument('--asgi-url', help="Benchmark an already running ASGI server instead of starting one.")
+        parser.add_argument('--wsgi-url', help="Benchmark an already running WSGI server instead of starting one.")
+        parser.add_argument('--output', help="Also write the results as JSON to this file.")
+
+    def handle(self, *args, **options):
+        endpoints = options['endpoint'] or sorted(ENDPOINTS)
+        pk = options['vlog'] or Vlogs.objects.order_by('-posted_date').values_list('pk', flat=True).first()
+        if pk is None and set(endpoints) - {'feed'}:
+            raise CommandError("No vlogs to benchmark the detail and comments endpoints against.")
+
+        results = {}
+        for label, url, command in (
+            ('wsgi', options['wsgi_url'], self.wsgi_command),
+            ('asgi', options['asgi_url'], self.asgi_command),
+        ):
+            process = None
+            if not url:
+                port = free_port()
+                quiet = subprocess.DEVNULL if options['verbosity'] < 2 else None
+                process = subprocess.Popen(command(port, options), cwd=settings.BASE_DIR, stdout=quiet, stderr=quiet)
+                url = f'http://127.0.0.1:{port}'
+            try:
+                if process:
+                    wait_for_port(port, process)
+                for name in endpoints:
+                    path = ENDPOINTS[name][label == 'asgi'].format(pk=pk)
+                    # One warm-up pass fills the response cache and connection pools.
+                    asyncio.run(run_load(url + path, options['concurrency'], options['concurrency']))
+                    result = asyncio.run(run_load(url + path, options['requests'], options['concurrency']))
+                    results.setdefault(name, {})[label] = result.summary()
+                    self.report(name, label, results[name][label])
+            finally:
+                if process:
+                    process.terminate()
+                    process.wait()
+
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                json.dump({'concurrency': options['concurrency'], 'results': results}, output, indent=2)
+
+    def report(self, name, label, summary):
+        self.stdout.write(
+            f"{name:<9} {label}  {summary['throughput']:>9} req/s  p50 {summary['p50_ms']} ms  "
+            f"p99 {summary['p99_ms']} ms  errors {summary['errors']}  statuses {summary['statuses']}"
+        )
+
+    def asgi_command(self, port, options):
+        if find_spec('uvicorn') is None:
+            raise CommandError("uvicorn is not installed; run `pip install uvicorn` or pass --asgi-url.")
+        return [sys.executable, '-m', 'uvicorn', 'vlog.asgi:application', '--host', '127.0.0.1',
+                '--port', str(port), '--workers', str(options['workers']), '--log-level', 'warning',
+                '--no-access-log']
+
+    def wsgi_command(self, port, options):
+        if find_spec('gunicorn') is not None:
+            return [sys.executable, '-m', 'gunicorn', 'vlog.wsgi:application', '--bind', f'127.0.0.1:{port}',
+                    '--workers', str(options['workers']), '--threads', str(options['threads']),
+                    '--log-level', 'warning']
+        self.stderr.write("gunicorn is not installed, falling back to the threaded development server.")
+        return [sys.executable, 'manage.py', 'runserver', f'127.0.0.1:{port}', '--noreload', '--skip-checks']
@@ -0,0 +1,127 @@
+import json
+import subprocess
+import sys
+from importlib.util import find_spec
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import (setup_databases, setup_test_environment, teardown_databases,
+                               teardown_test_environment)
+
+from main import benchmarks
+from main.management.commands.bench_asgi import free_port, wait_for_port
+
+
+class Command(BaseCommand):
+    help = ("Seed a synthetic dataset and measure latency percentiles and throughput of the feed, detail, "
+            "like/unlike, comment and login endpoints and a mixed read/write load, in-process or against a live "
+            "server.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scenario', choices=list(benchmarks.SCENARIOS), action='append',
+                            help="Scenario(s) to run. Defaults to all of them.")
+        parser.add_argument('--users', type=int, default=50)
+        parser.add_argument('--vlogs', type=int, default=200)
+        parser.add_argument('--images', type=int, default=2, help="Images per vlog.")
+        parser.add_argument('--comments', type=int, default=5, help="Comments per vlog.")
+        parser.add_argument('--likes', type=int, default=10, help="Likes per vlog.")
+        parser.add_argument('--seed', type=int, default=0, help="Random seed for the dataset.")
+        parser.add_argument('--requests', type=int, default=500, help="Measured requests per scenario.")
+        parser.add_argument('--warmup', type=int, default=50, help="Unmeasured requests per scenario first.")
+        parser.add_argument('--clients', type=int, default=10,
+                            help="Simulated users; concurrent connections with --live.")
+        parser.add_argument('--live', action='store_true',
+                            help="Run over HTTP against a server using the configured database, which is "
+                                 "seeded with bench-* users. Point --settings at a scratch database.")
+        parser.add_argument('--url', help="With --live, use this running server instead of starting one.")
+        parser.add_argument('--workers', type=int, default=1, help="gunicorn workers when starting a server.")
+        parser.add_argument('--keep-data', action='store_true', help="With --live, leave the bench data in place.")
+        parser.add_argument('--output', help="Write the results as JSON to this file.")
+
+    def handle(self, *args, **options):
+        scenarios = options['scenario'] or list(benchmarks.SCENARIOS)
+        if options['users'] < 1 or options['vlogs'] < 1:
+            raise CommandError("--users and --vlogs must be at least 1.")
+        if options['url'] and not options['live']:
+            raise CommandError("--url requires --live.")
+
+        if options['live']:
+            results = self.run_live(scenarios, options)
+        else:
+            results = self.run_inprocess(scenarios, options)
+
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                json.dump(results, output, indent=2, sort_keys=True)
+
+    def seed(self, options):
+        try:
+            dataset = benchmarks.seed(users=options['users'], vlogs=options['vlogs'], images=options['images'],
+                                      comments=options['comments'], likes=options['likes'],
+                                      random_seed=options['seed'])
+        except benchmarks.BenchmarkError as exc:
+            raise CommandError(str(exc))
+        self.stdout.write(f"Seeded {dataset.sizes} on {connection.vendor}.")
+        return dataset
+
+    def run_inprocess(self, scenarios, options):
+        """Run against a throwaway test database, as the test suite does."""
+        setup_test_environment()
+        old_config = setup_databases(verbosity=0, interactive=False)
+        try:
+            dataset = self.seed(options)
+            return self.measure('inprocess', dataset, scenarios, options, lambda scenario: benchmarks.run_inprocess(
+                dataset, scenario, options['requests'], options['clients'], options['warmup']
+            ))
+        finally:
+            teardown_databases(old_config, verbosity=0)
+            teardown_test_environment()
+
+    def run_live(self, scenarios, options):
+        dataset = self.seed(options)
+        url, process = options['url'], None
+        try:
+            if not url:
+                port = free_port()
+                quiet = subprocess.DEVNULL if options['verbosity'] < 2 else None
+                process = subprocess.Popen(self.server_command(port, options), cwd=settings.BASE_DIR,
+                                           stdout=quiet, stderr=quiet)
+                wait_for_port(port, process)
+                url = f'http://127.0.0.1:{port}'
+            return self.measure('live', dataset, scenarios, options, lambda scenario: benchmarks.run_live(
+                url.rstrip('/'), dataset, scenario, options['requests'], options['clients'], options['warmup']
+            ))
+        finally:
+            if process:
+                process.terminate()
+                process.wait()
+            if not options['keep_data']:
+                benchmarks.remove(dataset)
+
+    def measure(self, mode, dataset, scenarios, options, run):
+        results = {}
+        for scenario in scenarios:
+            results[scenario] = run(scenario).summary()
+            self.report(scenario, results[scenario])
+        return {
+            'mode': mode,
+            'database': connection.vendor,
+            'dataset': dataset.sizes,
+            'requests': options['requests'],
+            'clients': min(options['clients'], benchmarks.max_clients(dataset)),
+            'results': results,
+        }
+
+    def report(self, scenario, summary):
+        self.stdout.write(
+            f"{scenario:<8} {summary['throughput']:>9} req/s  p50 {summary['p50_ms']} ms  "
+            f"p90 {summary['p90_ms']} ms  p99 {summary['p99_ms']} ms  statuses {summary['statuses']}"
+        )
+
+    def server_command(self, port, options):
+        if find_spec('gunicorn') is not None:
+            return [sys.executable, '-m', 'gunicorn', 'vlog.wsgi:application', '--bind', f'127.0.0.1:{port}',
+                    '--workers', str(options['workers']), '--threads', '8', '--log-level', 'warning']
+        self.stderr.write("gunicorn is not installed, falling back to the threaded development server.")
+        return [sys.executable, 'manage.py', 'runserver', f'127.0.0.1:{port}', '--noreload', '--skip-checks']
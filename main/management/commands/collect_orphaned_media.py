@@ -0,0 +1,91 @@
+import os
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from main import media_gc, storage
+
+
+class Command(BaseCommand):
+    help = "Delete media files that no database row references."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help="Report orphans without deleting them.")
+        parser.add_argument('--on-disk-index', action='store_true',
+                            help="Keep referenced names in a temporary SQLite file instead of memory.")
+        parser.add_argument('--min-age', type=int, default=3600,
+                            help="Skip files modified in the last N seconds (uploads still being committed).")
+        parser.add_argument('--batch-size', type=int, default=500, help="Orphans deleted per batch.")
+        parser.add_argument('--max-rate', type=float, default=0,
+                            help="Maximum deletions per second; 0 means unlimited.")
+        parser.add_argument('--state-file', help="Checkpoint file; rerunning with it resumes an interrupted run.")
+        parser.add_argument('--progress-every', type=int, default=10000, help="Report after this many files.")
+
+    def handle(self, *args, **options):
+        root = str(settings.MEDIA_ROOT)
+        state_file = Path(options['state_file']) if options['state_file'] else None
+        resume_after = None
+        if state_file and state_file.exists():
+            checkpoint = state_file.read_text().strip()
+            resume_after = tuple(checkpoint.split('/')) if checkpoint else None
+            self.stdout.write(f"Resuming after {checkpoint}")
+
+        if not options['dry_run']:
+            self.stdout.write(f"Collected {storage.collect_unreferenced()} unreferenced blob(s).")
+
+        index_class = media_gc.DiskIndex if options['on_disk_index'] else media_gc.MemoryIndex
+        index = index_class(media_gc.referenced_names())
+        hls_ids = media_gc.transcoded_video_ids()
+        self.stdout.write(f"Loaded {len(index)} referenced file name(s).")
+
+        cutoff = time.time() - options['min_age']
+        scanned = orphans = freed = 0
+        batch = []
+        started = time.monotonic()
+        try:
+            for name, entry in media_gc.walk(root, 'uploads', resume_after):
+                scanned += 1
+                if not media_gc.is_referenced(name, index, hls_ids) and entry.stat().st_mtime < cutoff:
+                    batch.append((name, entry))
+                progress = scanned % options['progress_every'] == 0
+                if len(batch) >= options['batch_size'] or progress:
+                    orphans, freed = self.flush(batch, orphans, freed, options, started)
+                    batch = []
+                    self.checkpoint(state_file, name)
+                if progress:
+                    self.stdout.write(f"Scanned {scanned} file(s), {orphans} orphan(s), {freed} byte(s)...")
+            orphans, freed = self.flush(batch, orphans, freed, options, started)
+        finally:
+            index.close()
+
+        if state_file and state_file.exists():
+            state_file.unlink()
+        verb = "Would delete" if options['dry_run'] else "Deleted"
+        self.stdout.write(self.style.SUCCESS(
+            f"Scanned {scanned} file(s). {verb} {orphans} orphan(s), {freed} byte(s)."
+        ))
+
+    def flush(self, batch, orphans, freed, options, started):
+        for name, entry in batch:
+            size = entry.stat().st_size
+            if options['dry_run']:
+                self.stdout.write(f"orphan: {name}")
+            else:
+                try:
+                    os.remove(entry.path)
+                except FileNotFoundError:
+                    continue
+            orphans += 1
+            freed += size
+            if options['max_rate'] and not options['dry_run']:
+                # Sleep until the average deletion rate is back under the limit.
+                ahead = orphans / options['max_rate'] - (time.monotonic() - started)
+                if ahead > 0:
+                    time.sleep(ahead)
+        return orphans, freed
+
+    def checkpoint(self, state_file, name):
+        if state_file:
+            state_file.write_text(name)
@@ -0,0 +1,22 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from main.trending import decay
+
+
+class Command(BaseCommand):
+    help = "Re-apply the age decay to trending scores in batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--loop', action='store_true', help="Keep running as a background worker.")
+        parser.add_argument('--interval', type=float, default=300.0, help="Seconds between passes with --loop.")
+
+    def handle(self, *args, **options):
+        while True:
+            refreshed = decay(batch_size=options['batch_size'])
+            self.stdout.write(f"Refreshed {refreshed} trending score(s).")
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
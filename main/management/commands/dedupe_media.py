@@ -0,0 +1,122 @@
+import hashlib
+import os
+import shutil
+import tempfile
+from collections import Counter
+from pathlib import Path
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count
+
+from main import cache, storage
+from main.models import Blobs, Documents, Images, Videos, Vlogs
+
+MEDIA_FILE_FIELDS = ((Images, 'image'), (Videos, 'video'), (Documents, 'document'), (Vlogs, 'cover'))
+
+
+def vlog_id_of(row):
+    return row.pk if isinstance(row, Vlogs) else row.vlog_id
+
+
+class Command(BaseCommand):
+    help = "Move existing media into content-addressed storage, sharing one copy per identical file."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--dry-run', action='store_true', help="Only report how much space would be reclaimed.")
+        parser.add_argument('--recount', action='store_true',
+                            help="Only recompute blob reference counts from the media rows.")
+
+    def handle(self, *args, **options):
+        if not storage.deduplicate():
+            self.stderr.write(self.style.WARNING(
+                "VLOG_MEDIA_DEDUPLICATE is off: new uploads will not be deduplicated."
+            ))
+        if options['recount']:
+            self.recount()
+            return
+
+        seen = set(Blobs.objects.values_list('name', flat=True))
+        moved = reclaimed = 0
+        touched_vlogs = set()
+        for model, field_name in MEDIA_FILE_FIELDS:
+            legacy_rows = (
+                model.objects.exclude(**{field_name: ''})
+                .exclude(**{f'{field_name}__isnull': True})
+                .exclude(**{f'{field_name}__startswith': storage.BLOB_DIR + '/'})
+                .order_by('pk').only('pk', field_name, *([] if model is Vlogs else ['vlog']))
+            )
+            last_pk = 0
+            while True:
+                rows = list(legacy_rows.filter(pk__gt=last_pk)[:options['batch_size']])
+                if not rows:
+                    break
+                last_pk = rows[-1].pk
+                for row in rows:
+                    legacy = getattr(row, field_name).name
+                    path = storage.media_storage.path(legacy)
+                    if not os.path.exists(path):
+                        self.stderr.write(f"Missing file for {model.__name__} {row.pk}: {legacy}")
+                        continue
+                    target = storage.blob_name(self.digest(path), legacy)
+                    size = os.path.getsize(path)
+                    if target in seen:
+                        reclaimed += size
+                    seen.add(target)
+                    moved += 1
+                    if options['dry_run']:
+                        continue
+                    self.move(model, field_name, row, path, legacy, target)
+                    touched_vlogs.add(vlog_id_of(row))
+                self.stdout.write(f"Processed {moved} file(s)...")
+
+        for vlog_id in touched_vlogs - {None}:
+            cache.invalidate_vlog(vlog_id)
+        verb = "Would move" if options['dry_run'] else "Moved"
+        self.stdout.write(self.style.SUCCESS(
+            f"{verb} {moved} file(s) into content-addressed storage, reclaiming {reclaimed} byte(s)."
+        ))
+
+    def digest(self, path):
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(block)
+        return digest.hexdigest()
+
+    def move(self, model, field_name, row, path, legacy, target):
+        if not storage.media_storage.exists(target):
+            temp_dir = Path(storage.media_storage.path(storage.BLOB_DIR)) / 'tmp'
+            temp_dir.mkdir(parents=True, exist_ok=True)
+            fd, temp_path = tempfile.mkstemp(dir=temp_dir)
+            os.close(fd)
+            shutil.copyfile(path, temp_path)
+            storage.media_storage.store_blob(temp_path, target)
+        with transaction.atomic():
+            model.objects.filter(pk=row.pk).update(**{field_name: target})
+            storage.retain([target])
+        if not any(m.objects.filter(**{f: legacy}).exists() for m, f in MEDIA_FILE_FIELDS):
+            os.remove(path)
+
+    def recount(self):
+        counts = Counter()
+        for model, field_name in MEDIA_FILE_FIELDS:
+            referenced = (
+                model.objects.filter(**{f'{field_name}__startswith': storage.BLOB_DIR + '/'})
+                .order_by().values(field_name).annotate(n=Count('pk'))
+            )
+            for row in referenced:
+                counts[row[field_name]] += row['n']
+
+        with transaction.atomic():
+            Blobs.objects.bulk_create([Blobs(name=name) for name in counts], ignore_conflicts=True)
+            blobs = list(Blobs.objects.only('pk', 'name', 'refcount'))
+            for blob in blobs:
+                blob.refcount = counts.get(blob.name, 0)
+            Blobs.objects.bulk_update(blobs, ['refcount'], batch_size=1000)
+        unreferenced = [blob.name for blob in blobs if not blob.refcount]
+        storage.collect(unreferenced)
+        self.stdout.write(self.style.SUCCESS(
+            f"Recounted {len(blobs)} blob(s); removed {len(unreferenced)} unreferenced."
+        ))
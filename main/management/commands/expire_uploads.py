@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from main import uploads
+
+
+class Command(BaseCommand):
+    help = "Delete abandoned resumable upload sessions and their staged files."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--max-age', type=int, default=None,
+                            help="Idle seconds before an incomplete upload expires "
+                                 "(default VLOG_UPLOAD_EXPIRE_SECONDS).")
+
+    def handle(self, *args, **options):
+        sessions, files = uploads.expire(options['max_age'])
+        self.stdout.write(self.style.SUCCESS(f"Expired {sessions} upload session(s) and {files} staged file(s)."))
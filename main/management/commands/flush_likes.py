@@ -0,0 +1,23 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from main.likes import flush_buffered_likes
+
+
+class Command(BaseCommand):
+    help = "Write buffered likes to the database in batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--loop', action='store_true', help="Keep running as a background worker.")
+        parser.add_argument('--interval', type=float, default=1.0, help="Seconds between flushes with --loop.")
+
+    def handle(self, *args, **options):
+        while True:
+            consumed = flush_buffered_likes(batch_size=options['batch_size'])
+            if consumed or not options['loop']:
+                self.stdout.write(f"Flushed {consumed} like event(s).")
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
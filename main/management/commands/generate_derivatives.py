@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Exists, OuterRef
+
+from main import derivatives
+from main.models import ImageDerivatives, Images, Vlogs
+
+
+class Command(BaseCommand):
+    help = "Build resized copies of images and covers whose derivatives are missing or out of date."
+
+    def handle(self, *args, **options):
+        image_ids = list(
+            Images.objects.exclude(image='')
+            .exclude(Exists(ImageDerivatives.objects.filter(image=OuterRef('pk'), source=OuterRef('image'))))
+            .values_list('id', flat=True)
+        )
+        for image_id in image_ids:
+            derivatives.generate_for_image(image_id)
+
+        vlog_ids = list(
+            Vlogs.objects.exclude(cover='').exclude(cover__isnull=True)
+            .exclude(Exists(ImageDerivatives.objects.filter(vlog=OuterRef('pk'), source=OuterRef('cover'))))
+            .values_list('id', flat=True)
+        )
+        for vlog_id in vlog_ids:
+            derivatives.generate_for_cover(vlog_id)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Generated derivatives for {len(image_ids)} image(s) and {len(vlog_ids)} cover(s)."
+        ))
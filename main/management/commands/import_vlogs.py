@@ -0,0 +1,37 @@
+import zipfile
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from main.bulk_import import DirectorySource, Importer, ZipSource
+
+
+class Command(BaseCommand):
+    help = "Import vlogs from a zip archive with manifest.ndjson, or from an NDJSON manifest next to its media."
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="A .zip archive or a .ndjson manifest.")
+        parser.add_argument('--user', required=True, help="Username that will own the imported vlogs.")
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--workers', type=int, default=None, help="Threads writing media files.")
+        parser.add_argument('--no-media-jobs', action='store_true',
+                            help="Skip derivative and transcoding jobs; run them later with "
+                                 "generate_derivatives and transcode_videos.")
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(username=options['user'])
+        except User.DoesNotExist:
+            raise CommandError(f"User {options['user']!r} does not exist.")
+
+        path = options['path']
+        source = ZipSource(path) if zipfile.is_zipfile(path) else DirectorySource(path)
+        importer = Importer(source, user, batch_size=options['batch_size'], workers=options['workers'],
+                            media_jobs=not options['no_media_jobs'])
+        importer.run(progress=lambda run: self.stdout.write(f"Imported {run.created} vlog(s)..."))
+
+        for error in importer.errors:
+            self.stderr.write(f"Line {error['line']}: {error['errors']}")
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {importer.created} vlog(s), skipped {len(importer.errors)} line(s)."
+        ))
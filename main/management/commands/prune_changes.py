@@ -0,0 +1,22 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from main import changes
+
+
+class Command(BaseCommand):
+    help = ("Delete change feed entries older than the retention period. Consumers that fall further behind "
+            "must resync from the export.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=float, default=None,
+                            help="Keep this many days of changes (default VLOG_CHANGES_RETENTION_DAYS).")
+        parser.add_argument('--batch-size', type=int, default=10000)
+
+    def handle(self, *args, **options):
+        days = options['days'] if options['days'] is not None else getattr(settings, 'VLOG_CHANGES_RETENTION_DAYS', 30)
+        deleted = changes.prune(timezone.now() - timedelta(days=days), batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} change(s) older than {days:g} day(s)."))
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from main import search
+
+
+class Command(BaseCommand):
+    help = "Rebuild the vlog full-text search index from scratch."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=10000, help="Vlog ids per INSERT ... SELECT.")
+
+    def handle(self, *args, **options):
+        if not search.supported():
+            self.stderr.write("Full-text search needs SQLite (FTS5) or PostgreSQL.")
+            return
+        indexed = 0
+        with transaction.atomic():
+            for count in search.rebuild(batch_size=options['batch_size']):
+                indexed += count
+                self.stdout.write(f"Indexed {indexed} vlog(s)...")
+        self.stdout.write(self.style.SUCCESS(f"Search index rebuilt with {indexed} vlog(s)."))
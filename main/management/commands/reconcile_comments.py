@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from main.models import Comments
+from main.reconcile import reconcile_counter
+
+
+class Command(BaseCommand):
+    help = "Repair drift between Vlogs.comments_count and the actual number of Comments rows."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--dry-run', action='store_true', help="Report drifted vlogs without fixing them.")
+
+    def handle(self, *args, **options):
+        fixed = reconcile_counter('comments_count', Comments, batch_size=options['batch_size'],
+                                  dry_run=options['dry_run'])
+        verb = "Would fix" if options['dry_run'] else "Fixed"
+        self.stdout.write(self.style.SUCCESS(f"{verb} comment counts on {fixed} vlog(s)."))
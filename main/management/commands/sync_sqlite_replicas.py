@@ -0,0 +1,40 @@
+import sqlite3
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from main.replicas import replicas
+
+
+class Command(BaseCommand):
+    help = ("Copy the SQLite primary database into the SQLite files of VLOG_READ_REPLICAS, so two local files "
+            "can stand in for a primary and its replicas. With --loop the copies lag the primary by up to "
+            "--interval seconds, like asynchronous replication.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true', help="Keep copying in the background.")
+        parser.add_argument('--interval', type=float, default=5.0, help="Seconds between copies with --loop.")
+
+    def handle(self, *args, **options):
+        primary = connections[DEFAULT_DB_ALIAS]
+        aliases = replicas()
+        if not aliases:
+            raise CommandError("VLOG_READ_REPLICAS is empty.")
+        for alias in [DEFAULT_DB_ALIAS, *aliases]:
+            if connections[alias].vendor != 'sqlite':
+                raise CommandError(f"Database {alias!r} is not SQLite; use the database's own replication.")
+
+        while True:
+            primary.ensure_connection()
+            for alias in aliases:
+                connections[alias].close()
+                target = sqlite3.connect(connections[alias].settings_dict['NAME'])
+                try:
+                    primary.connection.backup(target)
+                finally:
+                    target.close()
+                self.stdout.write(f"Copied {DEFAULT_DB_ALIAS} to {alias}.")
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
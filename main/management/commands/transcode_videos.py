@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+
+from main import transcoding
+from main.models import TranscodeJobs, Videos
+
+
+class Command(BaseCommand):
+    help = "Queue HLS transcoding for videos without a job and run pending jobs in this process."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--retry-failed', action='store_true', help="Also rerun failed jobs.")
+        parser.add_argument('--reset-running', action='store_true',
+                            help="Rerun jobs left running by a worker that died. Only use when no worker is active.")
+
+    def handle(self, *args, **options):
+        missing = Videos.objects.filter(transcode__isnull=True).exclude(video='').only('id', 'video')
+        TranscodeJobs.objects.bulk_create(
+            [TranscodeJobs(video=video, source=video.video.name) for video in missing.iterator()]
+        )
+
+        if options['retry_failed']:
+            TranscodeJobs.objects.filter(status=TranscodeJobs.FAILED).update(status=TranscodeJobs.PENDING)
+        if options['reset_running']:
+            TranscodeJobs.objects.filter(status=TranscodeJobs.RUNNING).update(status=TranscodeJobs.PENDING)
+
+        video_ids = list(
+            TranscodeJobs.objects.filter(status=TranscodeJobs.PENDING).values_list('video_id', flat=True)
+        )
+        for video_id in video_ids:
+            transcoding.transcode(video_id)
+        done = TranscodeJobs.objects.filter(video_id__in=video_ids, status=TranscodeJobs.DONE).count()
+        self.stdout.write(self.style.SUCCESS(f"Transcoded {done} of {len(video_ids)} video(s)."))
@@ -0,0 +1,133 @@
+import hashlib
+import mimetypes
+import re
+
+from django.conf import settings
+from django.http import FileResponse, HttpResponse, HttpResponseNotModified, StreamingHttpResponse
+from django.utils.http import http_date, parse_http_date_safe, parse_etags
+
+RANGE = re.compile(r'^bytes=(\d*)-(\d*)$')
+READ_SIZE = 64 * 1024
+
+
+def file_etag(field_file, modified):
+    """A strong validator: it changes whenever the stored bytes can have changed."""
+    stamp = modified.timestamp() if modified else ''
+    digest = hashlib.md5(f'{field_file.name}:{field_file.size}:{stamp}'.encode()).hexdigest()
+    return f'"{digest}"'
+
+
+def modified_time(field_file):
+    try:
+        return field_file.storage.get_modified_time(field_file.name)
+    except NotImplementedError:
+        return None
+
+
+def parse_range(header, size):
+    """
+    Return ``(start, end)`` for a single ``bytes=`` range, ``None`` to serve the whole
+    file (no header, or several ranges), or ``False`` if the range cannot be satisfied.
+    """
+    if not header:
+        return None
+    match = RANGE.match(header.strip())
+    if not match:
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        length = int(last)
+        if length == 0:
+            return False
+        return max(size - length, 0), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        return False
+    return start, end
+
+
+def range_allowed(request, etag, modified):
+    """``If-Range`` lets the client ask for a range only while the representation is unchanged."""
+    if_range = request.META.get('HTTP_IF_RANGE')
+    if not if_range:
+        return True
+    if if_range.startswith('"') or if_range.startswith('W/'):
+        return if_range == etag
+    since = parse_http_date_safe(if_range)
+    return bool(modified and since is not None and int(modified.timestamp()) == since)
+
+
+def iter_range(f, start, length):
+    try:
+        f.seek(start)
+        while length > 0:
+            data = f.read(min(READ_SIZE, length))
+            if not data:
+                break
+            length -= len(data)
+            yield data
+    finally:
+        f.close()
+
+
+def offload(field_file, response):
+    """Hand the transfer to the front server with ``X-Sendfile`` or ``X-Accel-Redirect``."""
+    mode = getattr(settings, 'VLOG_MEDIA_SENDFILE', None)
+    if mode == 'x-sendfile':
+        response['X-Sendfile'] = field_file.path
+    elif mode == 'x-accel-redirect':
+        prefix = getattr(settings, 'VLOG_MEDIA_ACCEL_PREFIX', '/protected-media/')
+        response['X-Accel-Redirect'] = prefix + field_file.name
+    else:
+        return False
+    return True
+
+
+def serve(request, field_file):
+    """Serve ``field_file`` with conditional GET, ``Range``/``If-Range`` and optional offload."""
+    size = field_file.size
+    modified = modified_time(field_file)
+    etag = file_etag(field_file, modified)
+    content_type = mimetypes.guess_type(field_file.name)[0] or 'application/octet-stream'
+
+    if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+    if if_none_match and (etag in parse_etags(if_none_match) or if_none_match.strip() == '*'):
+        response = HttpResponseNotModified()
+        response['ETag'] = etag
+        return response
+
+    requested = parse_range(request.META.get('HTTP_RANGE'), size) if range_allowed(request, etag, modified) else None
+
+    if requested is False:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{size}'
+    elif getattr(settings, 'VLOG_MEDIA_SENDFILE', None):
+        # The front server re-applies Range itself.
+        response = HttpResponse(content_type=content_type)
+        offload(field_file, response)
+    elif request.method == 'HEAD':
+        response = HttpResponse(content_type=content_type, status=206 if requested else 200)
+        start, end = requested or (0, size - 1)
+        response['Content-Length'] = end - start + 1
+        if requested:
+            response['Content-Range'] = f'bytes {start}-{end}/{size}'
+    elif requested:
+        start, end = requested
+        response = StreamingHttpResponse(
+            iter_range(field_file.open('rb'), start, end - start + 1), status=206, content_type=content_type
+        )
+        response['Content-Length'] = end - start + 1
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+    else:
+        # FileResponse lets the WSGI server use wsgi.file_wrapper / sendfile().
+        response = FileResponse(field_file.open('rb'), content_type=content_type)
+        response['Content-Length'] = size
+
+    response['Accept-Ranges'] = 'bytes'
+    response['ETag'] = etag
+    if modified:
+        response['Last-Modified'] = http_date(modified.timestamp())
+    return response
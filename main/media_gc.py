@@ -0,0 +1,116 @@
+"""
+Orphaned media collection, driven by the ``collect_orphaned_media`` command.
+
+Referenced names are streamed from every file column into either an in-memory set or,
+for very large trees, a temporary on-disk SQLite B-tree. The media tree is then walked
+in a stable sorted order so an interrupted run can resume after the last path it
+checkpointed.
+
+Blobs with a row are never orphans here: :func:`main.storage.collect_unreferenced`
+deletes the unreferenced ones under their row lock before the walk starts.
+"""
+import os
+import posixpath
+import sqlite3
+import tempfile
+
+from .models import Blobs, Documents, ImageDerivatives, Images, TranscodeJobs, Videos, Vlogs
+
+FILE_COLUMNS = (
+    (Images, 'image'),
+    (Videos, 'video'),
+    (Documents, 'document'),
+    (Vlogs, 'cover'),
+    (ImageDerivatives, 'file'),
+    (TranscodeJobs, 'manifest'),
+    (Blobs, 'name'),
+)
+HLS_DIR = 'uploads/hls'
+
+
+def referenced_names(chunk_size=5000):
+    for model, field_name in FILE_COLUMNS:
+        names = model.objects.exclude(**{field_name: ''}).exclude(**{f'{field_name}__isnull': True})
+        yield from names.values_list(field_name, flat=True).iterator(chunk_size=chunk_size)
+
+
+class MemoryIndex:
+    def __init__(self, names):
+        self.names = set(names)
+
+    def __contains__(self, name):
+        return name in self.names
+
+    def __len__(self):
+        return len(self.names)
+
+    def close(self):
+        self.names = set()
+
+
+class DiskIndex:
+    """Referenced names in a throwaway SQLite file, for trees too large to hold in memory."""
+
+    def __init__(self, names, batch_size=10000):
+        fd, self.path = tempfile.mkstemp(suffix='.sqlite3')
+        os.close(fd)
+        self.db = sqlite3.connect(self.path)
+        self.db.execute("PRAGMA journal_mode = OFF")
+        self.db.execute("PRAGMA synchronous = OFF")
+        self.db.execute("CREATE TABLE names (name TEXT PRIMARY KEY) WITHOUT ROWID")
+        batch = []
+        for name in names:
+            batch.append((name,))
+            if len(batch) >= batch_size:
+                self.db.executemany("INSERT OR IGNORE INTO names VALUES (?)", batch)
+                batch = []
+        self.db.executemany("INSERT OR IGNORE INTO names VALUES (?)", batch)
+        self.db.commit()
+
+    def __contains__(self, name):
+        return self.db.execute("SELECT 1 FROM names WHERE name = ?", (name,)).fetchone() is not None
+
+    def __len__(self):
+        return self.db.execute("SELECT count(*) FROM names").fetchone()[0]
+
+    def close(self):
+        self.db.close()
+        os.unlink(self.path)
+
+
+def transcoded_video_ids():
+    return set(TranscodeJobs.objects.values_list('video_id', flat=True))
+
+
+def is_referenced(name, index, hls_ids):
+    if name.startswith(HLS_DIR + '/'):
+        # Segments and rendition playlists are not stored in the database; the whole
+        # uploads/hls/<video id>/ directory belongs to that video's transcode job.
+        video_id = name[len(HLS_DIR) + 1:].split('/', 1)[0]
+        return video_id.isdigit() and int(video_id) in hls_ids
+    return name in index
+
+
+def _key(relative):
+    return tuple(relative.split('/'))
+
+
+def walk(root, relative='', resume_after=None):
+    """Yield ``(relative path, DirEntry)`` for every file under ``root/relative`` in sorted order."""
+    directory = os.path.join(root, relative)
+    try:
+        with os.scandir(directory) as entries:
+            entries = sorted(entries, key=lambda entry: entry.name)
+    except FileNotFoundError:
+        return
+    for entry in entries:
+        path = posixpath.join(relative, entry.name) if relative else entry.name
+        key = _key(path)
+        if entry.is_dir(follow_symlinks=False):
+            if resume_after and key < resume_after[:len(key)]:
+                continue
+            yield from walk(root, path, resume_after)
+        elif entry.is_file(follow_symlinks=False):
+            if resume_after and key <= resume_after:
+                continue
+            yield path, entry
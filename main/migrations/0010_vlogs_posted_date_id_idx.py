@@ -0,0 +1,17 @@
+# Generated by Django 4.2.30 on 2026-10-18 08:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0009_remove_vlogs_tags_delete_tags'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='vlogs',
+            index=models.Index(fields=['-posted_date', '-id'], name='vlogs_posted_date_id_idx'),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 4.2.30 on 2026-10-18 08:30
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0010_vlogs_posted_date_id_idx'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='comments',
+            name='vlog',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='comments', to='main.vlogs'),
+        ),
+    ]
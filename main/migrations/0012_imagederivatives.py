@@ -0,0 +1,30 @@
+# Generated by Django 4.2.30 on 2026-10-18 08:33
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0011_alter_comments_vlog'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImageDerivatives',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source', models.CharField(max_length=255)),
+                ('width', models.PositiveIntegerField()),
+                ('height', models.PositiveIntegerField()),
+                ('format', models.CharField(max_length=10)),
+                ('file', models.ImageField(upload_to='uploads/derivatives/%Y/%m/%d/')),
+                ('image', models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='derivatives', to='main.images')),
+                ('vlog', models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='cover_derivatives', to='main.vlogs')),
+            ],
+            options={
+                'ordering': ['width', 'format'],
+            },
+        ),
+    ]
@@ -0,0 +1,38 @@
+from django.db import migrations
+
+
+def create_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        schema_editor.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS main_vlogs_fts "
+            "USING fts5(title, content, description, comments, tokenize='porter unicode61')"
+        )
+    elif vendor == 'postgresql':
+        schema_editor.execute(
+            "CREATE TABLE IF NOT EXISTS main_vlogs_search ("
+            "vlog_id bigint PRIMARY KEY REFERENCES main_vlogs (id) ON DELETE CASCADE DEFERRABLE INITIALLY DEFERRED, "
+            "document tsvector NOT NULL)"
+        )
+        schema_editor.execute(
+            "CREATE INDEX IF NOT EXISTS main_vlogs_search_document_idx ON main_vlogs_search USING GIN (document)"
+        )
+
+
+def drop_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        schema_editor.execute("DROP TABLE IF EXISTS main_vlogs_fts")
+    elif vendor == 'postgresql':
+        schema_editor.execute("DROP TABLE IF EXISTS main_vlogs_search")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0014_transcodejobs'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_index, drop_index),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 4.2.30 on 2026-10-18 08:38
+
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def backfill_comments_count(apps, schema_editor):
+    Vlogs = apps.get_model('main', 'Vlogs')
+    Comments = apps.get_model('main', 'Comments')
+    counts = Comments.objects.filter(vlog=OuterRef('pk')).order_by().values('vlog').annotate(n=Count('id')).values('n')
+    Vlogs.objects.update(comments_count=Coalesce(Subquery(counts, output_field=IntegerField()), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0015_vlogs_search_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='vlogs',
+            name='comments_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='comments',
+            index=models.Index(fields=['vlog', '-posted_date', '-id'], name='comments_vlog_posted_date_idx'),
+        ),
+        migrations.RunPython(backfill_comments_count, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 4.2.30 on 2026-10-18 08:43
+
+import django.core.validators
+from django.db import migrations, models
+import main.storage
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0016_vlogs_comments_count'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Blobs',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255, unique=True)),
+                ('refcount', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.AlterField(
+            model_name='documents',
+            name='document',
+            field=models.FileField(storage=main.storage.ContentAddressedStorage(), upload_to='uploads/documents/%Y/%m/%d/', validators=[django.core.validators.FileExtensionValidator(allowed_extensions=('txt', 'pdf', 'doc', 'docx'))]),
+        ),
+        migrations.AlterField(
+            model_name='images',
+            name='image',
+            field=models.ImageField(storage=main.storage.ContentAddressedStorage(), upload_to='uploads/images/%Y/%m/%d/'),
+        ),
+        migrations.AlterField(
+            model_name='videos',
+            name='video',
+            field=models.FileField(storage=main.storage.ContentAddressedStorage(), upload_to='uploads/videos/%Y/%m/%d/', validators=[django.core.validators.FileExtensionValidator(allowed_extensions=['MOV', 'avi', 'mp4', 'webm', 'mkv'])]),
+        ),
+        migrations.AlterField(
+            model_name='vlogs',
+            name='cover',
+            field=models.ImageField(null=True, storage=main.storage.ContentAddressedStorage(), upload_to='uploads/images/%Y/%m/%d/'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.30 on 2026-10-18 08:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0017_blobs'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='vlogs',
+            index=models.Index(fields=['updated_date', 'id'], name='vlogs_updated_date_id_idx'),
+        ),
+    ]
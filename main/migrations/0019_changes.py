@@ -0,0 +1,45 @@
+# Generated by Django 4.2.30 on 2026-10-18 08:57
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+def create_covering_index(apps, schema_editor):
+    # SQLite stores the table in rowid order already; elsewhere cover the columns the
+    # change feed reads so "WHERE id > %s ORDER BY id" never visits the heap.
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(
+            "CREATE INDEX IF NOT EXISTS main_changes_seq_covering_idx ON main_changes (id) "
+            "INCLUDE (kind, action, object_id, vlog_id, user_id, created_at)"
+        )
+
+
+def drop_covering_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute("DROP INDEX IF EXISTS main_changes_seq_covering_idx")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0018_vlogs_updated_date_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Changes',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('kind', models.CharField(choices=[('vlog', 'Vlog'), ('comment', 'Comment'), ('like', 'Like')], max_length=10)),
+                ('action', models.CharField(choices=[('created', 'Created'), ('updated', 'Updated'), ('deleted', 'Deleted')], max_length=10)),
+                ('object_id', models.BigIntegerField()),
+                ('vlog_id', models.BigIntegerField()),
+                ('user_id', models.BigIntegerField(null=True)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'ordering': ['id'],
+            },
+        ),
+        migrations.RunPython(create_covering_index, drop_covering_index),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 4.2.30 on 2026-10-18 09:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0019_changes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='vlogs',
+            name='trending_score',
+            field=models.FloatField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='vlogs',
+            index=models.Index(fields=['-trending_score', '-id'], name='vlogs_trending_idx'),
+        ),
+    ]
@@ -0,0 +1,80 @@
+# Generated by Django 4.2.30 on 2026-10-18 09:02
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('main', '0020_vlogs_trending_score'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Follows',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fanout_on_read', models.BooleanField(default=False)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='TimelineEntries',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('posted_date', models.DateTimeField()),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='vlogs',
+            index=models.Index(fields=['user', '-posted_date', '-id'], name='vlogs_user_posted_date_idx'),
+        ),
+        migrations.AddField(
+            model_name='timelineentries',
+            name='author',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='timelineentries',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='timeline', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='timelineentries',
+            name='vlog',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='main.vlogs'),
+        ),
+        migrations.AddField(
+            model_name='follows',
+            name='author',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='followers', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='follows',
+            name='follower',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='following', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='timelineentries',
+            index=models.Index(fields=['user', '-posted_date', '-vlog'], name='timeline_user_posted_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='timelineentries',
+            index=models.Index(fields=['user', 'author'], name='timeline_user_author_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='timelineentries',
+            unique_together={('user', 'vlog')},
+        ),
+        migrations.AddIndex(
+            model_name='follows',
+            index=models.Index(fields=['follower', 'fanout_on_read'], name='follows_follower_fanout_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='follows',
+            unique_together={('follower', 'author')},
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 4.2.30 on 2026-10-18 09:42
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count
+import django.db.models.deletion
+
+
+def backfill_follower_counts(apps, schema_editor):
+    Follows = apps.get_model('main', 'Follows')
+    FollowerCounts = apps.get_model('main', 'FollowerCounts')
+    on_read = set(Follows.objects.filter(fanout_on_read=True).values_list('author_id', flat=True).distinct())
+    counts = Follows.objects.order_by().values('author_id').annotate(followers=Count('id'))
+    FollowerCounts.objects.bulk_create([
+        FollowerCounts(author_id=row['author_id'], followers=row['followers'],
+                       fanout_on_read=row['author_id'] in on_read)
+        for row in counts.iterator()
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('main', '0021_follows_timelines'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FollowerCounts',
+            fields=[
+                ('author', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='+', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('followers', models.IntegerField(default=0)),
+                ('fanout_on_read', models.BooleanField(default=False)),
+            ],
+        ),
+        migrations.RunPython(backfill_follower_counts, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-18 09:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0022_follower_counts'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='blobs',
+            name='stored_at',
+            field=models.DateTimeField(null=True),
+        ),
+    ]
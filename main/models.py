@@ -1,62 +1,251 @@
+import uuid
+
 from django.core.validators import FileExtensionValidator
 from django.contrib.auth.models import User
-from django.db import models
+from django.db import models, router, transaction
+from django.utils import timezone
+
+from .storage import media_storage
+
+
+class ChangeLoggedModel(models.Model):
+    """
+    Saves run in a transaction, so the ``Changes`` row written by the post_save
+    receiver commits or rolls back together with the change, see main/changes.py.
+    """
+
+    class Meta:
+        abstract = True
+
+    def save(self, *args, **kwargs):
+        with transaction.atomic(using=kwargs.get('using') or router.db_for_write(type(self), instance=self)):
+            super().save(*args, **kwargs)
 
 
 class Images(models.Model):
-    image = models.ImageField(upload_to="uploads/images/%Y/%m/%d/")
+    image = models.ImageField(upload_to="uploads/images/%Y/%m/%d/", storage=media_storage)
     vlog = models.ForeignKey('Vlogs', on_delete=models.CASCADE, related_name='images', null=True)
 
 
 class Videos(models.Model):
-    video = models.FileField(upload_to="uploads/videos/%Y/%m/%d/", validators=(
+    video = models.FileField(upload_to="uploads/videos/%Y/%m/%d/", storage=media_storage, validators=(
         [FileExtensionValidator(allowed_extensions=['MOV', 'avi', 'mp4', 'webm', 'mkv'])]
     ))
     vlog = models.ForeignKey('Vlogs', on_delete=models.CASCADE, related_name='videos', null=True)
 
 
 class Documents(models.Model):
-    document = models.FileField(upload_to="uploads/documents/%Y/%m/%d/", validators=(
+    document = models.FileField(upload_to="uploads/documents/%Y/%m/%d/", storage=media_storage, validators=(
         [FileExtensionValidator(allowed_extensions=('txt', 'pdf', 'doc', 'docx'), )]
     ))
     vlog = models.ForeignKey('Vlogs', on_delete=models.CASCADE, related_name='documents', null=True)
 
 
-class Comments(models.Model):
+class Comments(ChangeLoggedModel):
     comment = models.TextField(null=False)
     user = models.ForeignKey(User, on_delete=models.CASCADE)
-    vlog = models.ForeignKey('Vlogs', on_delete=models.CASCADE)
+    vlog = models.ForeignKey('Vlogs', on_delete=models.CASCADE, related_name='comments')
     posted_date = models.DateTimeField(auto_now_add=True)
     updated_date = models.DateTimeField(auto_now_add=True)
 
     class Meta:
         ordering = ["-posted_date"]
+        indexes = [
+            models.Index(fields=["vlog", "-posted_date", "-id"], name="comments_vlog_posted_date_idx"),
+        ]
 
     def __str__(self):
         return self.comment[:20]
 
 
-class Vlogs(models.Model):
+DERIVATIVE_FIELDS = ("id", "image_id", "vlog_id", "width", "height", "format", "file")
+
+
+class VlogsQuerySet(models.QuerySet):
+    LIST_FIELDS = ("id", "title", "cover", "content", "description", "likes", "comments_count", "posted_date",
+                   "updated_date", "user__username")
+
+    def list_rows(self):
+        """Feed rows without relations: the author is joined in and only the serialized columns are loaded."""
+        return self.select_related("user").only(*self.LIST_FIELDS)
+
+    def for_list(self):
+        """Feed rows with their cover derivatives."""
+        return self.list_rows().prefetch_related(
+            models.Prefetch("cover_derivatives", queryset=ImageDerivatives.objects.only(*DERIVATIVE_FIELDS)),
+        )
+
+    def for_detail(self, detail_comments=10):
+        """A vlog with its media and newest ``detail_comments`` comments, fetched in one query per relation."""
+        return self.for_list().prefetch_related(
+            models.Prefetch("images", queryset=Images.objects.only("id", "image", "vlog_id").prefetch_related(
+                models.Prefetch("derivatives", queryset=ImageDerivatives.objects.only(*DERIVATIVE_FIELDS)),
+            )),
+            models.Prefetch("videos", queryset=Videos.objects.select_related("transcode").only(
+                "id", "video", "vlog_id", "transcode__status", "transcode__manifest"
+            )),
+            models.Prefetch("documents", queryset=Documents.objects.only("id", "document", "vlog_id")),
+            models.Prefetch("comments", to_attr="recent_comments", queryset=Comments.objects.order_by(
+                "-posted_date", "-id"
+            ).only("id", "comment", "user_id", "vlog_id", "posted_date", "updated_date")[:detail_comments]),
+        )
+
+
+class Vlogs(ChangeLoggedModel):
     title = models.CharField(max_length=100, null=False)
-    cover = models.ImageField(upload_to="uploads/images/%Y/%m/%d/", null=True)
+    cover = models.ImageField(upload_to="uploads/images/%Y/%m/%d/", storage=media_storage, null=True)
     content = models.CharField(max_length=255, null=True)
     description = models.TextField(null=False)
     posted_date = models.DateTimeField(auto_now_add=True)
     updated_date = models.DateTimeField(auto_now=True)
     likes = models.IntegerField(default=0)
+    comments_count = models.IntegerField(default=0)
+    trending_score = models.FloatField(default=0)
     user = models.ForeignKey(User, on_delete=models.CASCADE)
 
+    objects = VlogsQuerySet.as_manager()
+
     def __str__(self):
         return self.title
 
     class Meta:
         ordering = ["-posted_date"]
+        indexes = [
+            models.Index(fields=["-posted_date", "-id"], name="vlogs_posted_date_id_idx"),
+            models.Index(fields=["updated_date", "id"], name="vlogs_updated_date_id_idx"),
+            models.Index(fields=["-trending_score", "-id"], name="vlogs_trending_idx"),
+            models.Index(fields=["user", "-posted_date", "-id"], name="vlogs_user_posted_date_idx"),
+        ]
+
+
+class ImageDerivatives(models.Model):
+    """A resized copy of an ``Images.image`` or ``Vlogs.cover`` upload, see main/derivatives.py."""
+    image = models.ForeignKey(Images, on_delete=models.CASCADE, related_name='derivatives', null=True)
+    vlog = models.ForeignKey('Vlogs', on_delete=models.CASCADE, related_name='cover_derivatives', null=True)
+    source = models.CharField(max_length=255)
+    width = models.PositiveIntegerField()
+    height = models.PositiveIntegerField()
+    format = models.CharField(max_length=10)
+    file = models.ImageField(upload_to="uploads/derivatives/%Y/%m/%d/")
+
+    class Meta:
+        ordering = ["width", "format"]
+
+
+class TranscodeJobs(models.Model):
+    """HLS transcoding state for a ``Videos`` row, see main/transcoding.py."""
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = [(PENDING, 'Pending'), (RUNNING, 'Running'), (DONE, 'Done'), (FAILED, 'Failed')]
+
+    video = models.OneToOneField(Videos, on_delete=models.CASCADE, related_name='transcode')
+    source = models.CharField(max_length=255)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING, db_index=True)
+    manifest = models.FileField(max_length=255, blank=True)
+    error = models.TextField(blank=True)
+    started_at = models.DateTimeField(null=True)
+    finished_at = models.DateTimeField(null=True)
 
 
-class Like(models.Model):
+class VideoUploads(models.Model):
+    """A resumable chunked upload that becomes a ``Videos`` row once complete, see main/uploads.py."""
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    vlog = models.ForeignKey('Vlogs', on_delete=models.CASCADE, related_name='video_uploads')
+    filename = models.CharField(max_length=255)
+    size = models.PositiveBigIntegerField()
+    sha256 = models.CharField(max_length=64, blank=True)
+    offset = models.PositiveBigIntegerField(default=0)
+    video = models.OneToOneField(Videos, on_delete=models.SET_NULL, null=True, related_name='upload')
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+
+class Blobs(models.Model):
+    """Reference count of a deduplicated media file, see main/storage.py."""
+    name = models.CharField(max_length=255, unique=True)
+    refcount = models.IntegerField(default=0)
+    # When an upload last stored or reused the file; collect() leaves it alone for a while after.
+    stored_at = models.DateTimeField(null=True)
+
+
+class Like(ChangeLoggedModel):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     vlog = models.ForeignKey(Vlogs, on_delete=models.CASCADE)
     created_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
         unique_together = ('user', 'vlog')
+
+
+class Follows(models.Model):
+    """
+    ``follower`` follows ``author``. ``fanout_on_read`` is set on every edge of an author
+    with too many followers to fan out to, see main/timelines.py.
+    """
+    follower = models.ForeignKey(User, on_delete=models.CASCADE, related_name='following')
+    author = models.ForeignKey(User, on_delete=models.CASCADE, related_name='followers')
+    fanout_on_read = models.BooleanField(default=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ('follower', 'author')
+        indexes = [
+            models.Index(fields=["follower", "fanout_on_read"], name="follows_follower_fanout_idx"),
+        ]
+
+
+class FollowerCounts(models.Model):
+    """
+    How many followers ``author`` has and whether their vlogs are merged in on read.
+    Follows of one author are serialised on this row, see main/timelines.py.
+    """
+    author = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='+')
+    followers = models.IntegerField(default=0)
+    fanout_on_read = models.BooleanField(default=False)
+
+
+class TimelineEntries(models.Model):
+    """A vlog fanned out to ``user``'s home timeline, see main/timelines.py."""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='timeline')
+    vlog = models.ForeignKey('Vlogs', on_delete=models.CASCADE, related_name='+')
+    author = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    posted_date = models.DateTimeField()
+
+    class Meta:
+        unique_together = ('user', 'vlog')
+        indexes = [
+            models.Index(fields=["user", "-posted_date", "-vlog"], name="timeline_user_posted_date_idx"),
+            models.Index(fields=["user", "author"], name="timeline_user_author_idx"),
+        ]
+
+
+class Changes(models.Model):
+    """
+    Append-only log of changes to vlogs, comments and likes, see main/changes.py.
+
+    The primary key is the sequence number consumers resume from. On SQLite the table
+    is clustered on it; on PostgreSQL migration 0019 adds a covering index so range
+    reads by sequence are index-only scans.
+    """
+    VLOG = 'vlog'
+    COMMENT = 'comment'
+    LIKE = 'like'
+    KIND_CHOICES = [(VLOG, 'Vlog'), (COMMENT, 'Comment'), (LIKE, 'Like')]
+    CREATED = 'created'
+    UPDATED = 'updated'
+    DELETED = 'deleted'
+    ACTION_CHOICES = [(CREATED, 'Created'), (UPDATED, 'Updated'), (DELETED, 'Deleted')]
+
+    id = models.BigAutoField(primary_key=True)
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    action = models.CharField(max_length=10, choices=ACTION_CHOICES)
+    object_id = models.BigIntegerField()
+    vlog_id = models.BigIntegerField()
+    user_id = models.BigIntegerField(null=True)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        ordering = ["id"]
@@ -0,0 +1,144 @@
+import base64
+import json
+from datetime import datetime
+
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import CursorPagination
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination:
+    """
+    Keyset pagination on ``(posted_date, id)``. DRF views use it through
+    :class:`KeysetCursorPagination`; the async views, whose querysets must be evaluated
+    with the async ORM, and the home timeline, which merges several sources, call it
+    directly. The cursor is an opaque token holding the boundary row and the direction;
+    responses have DRF's ``next``/``previous``/``results`` shape.
+    """
+    cursor_query_param = 'cursor'
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+    class InvalidCursor(Exception):
+        pass
+
+    def __init__(self, request):
+        self.request = request
+
+    def get_page_size(self):
+        try:
+            size = int(self.request.GET[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return min(size, self.max_page_size) if size > 0 else self.page_size
+
+    @staticmethod
+    def encode_cursor(row, reverse=False):
+        token = json.dumps({'d': row.posted_date.isoformat(), 'i': row.pk, 'r': int(reverse)})
+        return base64.urlsafe_b64encode(token.encode()).decode()
+
+    @classmethod
+    def decode_cursor(cls, value):
+        try:
+            token = json.loads(base64.urlsafe_b64decode(value.encode()))
+            return datetime.fromisoformat(token['d']), int(token['i']), bool(token['r'])
+        except (ValueError, TypeError, KeyError):
+            raise cls.InvalidCursor(value)
+
+    def get_cursor(self):
+        """``(posted_date, id, reverse)`` of the request's cursor, or ``None`` on the first page."""
+        value = self.request.GET.get(self.cursor_query_param)
+        return self.decode_cursor(value) if value else None
+
+    @staticmethod
+    def after(queryset, cursor, id_field='id'):
+        """Rows of ``queryset`` past ``cursor`` in its direction, nearest first."""
+        if cursor is None:
+            return queryset.order_by('-posted_date', f'-{id_field}')
+        posted_date, pk, reverse = cursor
+        if reverse:
+            return queryset.filter(
+                Q(posted_date__gt=posted_date) | Q(posted_date=posted_date, **{f'{id_field}__gt': pk})
+            ).order_by('posted_date', id_field)
+        return queryset.filter(
+            Q(posted_date__lt=posted_date) | Q(posted_date=posted_date, **{f'{id_field}__lt': pk})
+        ).order_by('-posted_date', f'-{id_field}')
+
+    def link(self, row, reverse=False):
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(row, reverse))
+
+    def page(self, rows, size, cursor):
+        """
+        Turn up to ``size + 1`` rows fetched with :meth:`after` into
+        ``(rows, next_url, previous_url)``, newest first.
+        """
+        has_more = len(rows) > size
+        rows = rows[:size]
+        if cursor and cursor[2]:
+            rows.reverse()
+            previous_url = self.link(rows[0], reverse=True) if has_more else None
+            next_url = self.link(rows[-1]) if rows else None
+        else:
+            next_url = self.link(rows[-1]) if has_more else None
+            previous_url = self.link(rows[0], reverse=True) if cursor and rows else None
+        return rows, next_url, previous_url
+
+
+class KeysetCursorPagination(CursorPagination):
+    """
+    DRF pagination class backed by :class:`KeysetPagination`. DRF's own
+    ``CursorPagination`` keeps only the first ordering field in its cursor and steps
+    over rows with an equal ``posted_date`` with an OFFSET, which lands on the wrong
+    rows when paging back through such ties; this cursor holds the full ``(posted_date, id)``.
+    """
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    ordering = ('-posted_date', '-id')
+
+    def paginate_queryset(self, queryset, request, view=None):
+        keyset = KeysetPagination(request)
+        keyset.page_size, keyset.max_page_size = self.page_size, self.max_page_size
+        try:
+            cursor = keyset.get_cursor()
+        except KeysetPagination.InvalidCursor:
+            raise NotFound(self.invalid_cursor_message)
+        size = keyset.get_page_size()
+        rows = list(keyset.after(queryset, cursor)[:size + 1])
+        rows, self.next_url, self.previous_url = keyset.page(rows, size, cursor)
+        self.display_page_controls = bool(self.next_url or self.previous_url)
+        return rows
+
+    def get_next_link(self):
+        return self.next_url
+
+    def get_previous_link(self):
+        return self.previous_url
+
+
+class VlogsCursorPagination(KeysetCursorPagination):
+    """
+    Keyset pagination for the vlog feed.
+
+    Pages are fetched with a ``WHERE (posted_date, id) < <cursor>`` range read on the
+    ``(posted_date, id)`` index instead of an OFFSET, so deep pages cost the same
+    as the first one. ``id`` breaks ties between vlogs posted at the same instant.
+    """
+
+
+class CommentsCursorPagination(KeysetCursorPagination):
+    """Keyset pagination over a vlog's comments, backed by the ``(vlog, posted_date, id)`` index."""
+
+
+class AsyncKeysetPagination(KeysetPagination):
+    """:class:`KeysetPagination` over a single queryset, read with the async ORM."""
+
+    async def paginate(self, queryset):
+        """Return ``(rows, next_url, previous_url)`` for the page the request's cursor points at."""
+        size = self.get_page_size()
+        cursor = self.get_cursor()
+        rows = [row async for row in self.after(queryset, cursor)[:size + 1].aiterator()]
+        return self.page(rows, size, cursor)
@@ -0,0 +1,40 @@
+"""
+Repair of denormalized counters on ``Vlogs``, driven by ``reconcile_likes`` and
+``reconcile_comments``.
+
+Drifted vlogs are found in pk-ordered batches, and each batch is fixed by a single
+UPDATE that recounts the rows itself. A like or comment committed between finding
+the batch and writing it is therefore counted instead of overwritten.
+"""
+from django.db.models import Count, F, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from .cache import invalidate_vlog
+from .models import Vlogs
+
+
+def reconcile_counter(field_name, model, batch_size=1000, dry_run=False):
+    """Set ``Vlogs.<field_name>`` to the number of ``model`` rows per vlog; return how many vlogs drifted."""
+    counted = model.objects.filter(vlog=OuterRef('pk')).order_by().values('vlog').annotate(n=Count('id')).values('n')
+    actual = Coalesce(Subquery(counted, output_field=IntegerField()), 0)
+    drifted = (
+        Vlogs.objects.order_by('pk')
+        .annotate(actual=actual)
+        .exclude(**{field_name: F('actual')})
+        .values_list('pk', flat=True)
+    )
+
+    fixed = 0
+    last_pk = 0
+    while True:
+        ids = list(drifted.filter(pk__gt=last_pk)[:batch_size])
+        if not ids:
+            break
+        last_pk = ids[-1]
+        fixed += len(ids)
+        if dry_run:
+            continue
+        Vlogs.objects.filter(pk__in=ids).update(**{field_name: actual})
+        for vlog_id in ids:
+            invalidate_vlog(vlog_id)
+    return fixed
@@ -0,0 +1,178 @@
+"""
+Read-replica routing.
+
+``ReplicaMiddleware`` picks one of the ``VLOG_READ_REPLICAS`` database aliases for
+each GET, HEAD or OPTIONS request, round-robin over the replicas that are reachable,
+and ``ReplicaRouter`` sends that request's reads to it. Everything else, and work
+done outside a request (worker pools, management commands), uses ``default``.
+
+A replica may lag behind the primary, so a user who has just written (any unsafe
+request that succeeded) is pinned to the primary for ``VLOG_READ_YOUR_WRITES_SECONDS``
+and sees their own like or comment straight away. Pins are kept by user id in
+``VLOG_REPLICA_PIN_CACHE``, which must be shared between processes in production.
+Requests are matched to a user before DRF authenticates them, from the JWT in the
+Authorization header or the session.
+
+A replica whose connection fails is skipped for ``VLOG_REPLICA_RETRY_SECONDS``.
+Locally, two SQLite files can stand in for a primary and replica; see
+``manage.py sync_sqlite_replicas``.
+"""
+import itertools
+import logging
+import threading
+import time
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.contrib.auth import SESSION_KEY
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+from rest_framework_simplejwt.tokens import AccessToken
+
+logger = logging.getLogger(__name__)
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+read_alias = ContextVar('vlog_read_alias', default=None)
+
+_rotation = itertools.count()
+_down_until = {}
+_lock = threading.Lock()
+
+
+def replicas():
+    return list(getattr(settings, 'VLOG_READ_REPLICAS', []))
+
+
+def pin_seconds():
+    return getattr(settings, 'VLOG_READ_YOUR_WRITES_SECONDS', 5)
+
+
+def retry_seconds():
+    return getattr(settings, 'VLOG_REPLICA_RETRY_SECONDS', 30)
+
+
+def pin_cache():
+    return caches[getattr(settings, 'VLOG_REPLICA_PIN_CACHE', 'default')]
+
+
+def pin_key(user_id):
+    return f'replicas:pin:{user_id}'
+
+
+def pin(user_id):
+    """Send ``user_id``'s reads to the primary for the next ``VLOG_READ_YOUR_WRITES_SECONDS``."""
+    pin_cache().set(pin_key(user_id), True, pin_seconds())
+
+
+def is_pinned(user_id):
+    return user_id is not None and bool(pin_cache().get(pin_key(user_id)))
+
+
+def mark_down(alias):
+    with _lock:
+        _down_until[alias] = time.monotonic() + retry_seconds()
+    logger.warning("Read replica %s is unavailable, skipping it for %ss.", alias, retry_seconds())
+
+
+def is_healthy(alias):
+    if _down_until.get(alias, 0) > time.monotonic():
+        return False
+    try:
+        connections[alias].ensure_connection()
+    except DatabaseError:
+        mark_down(alias)
+        return False
+    return True
+
+
+def choose():
+    """The next healthy replica in rotation, or ``default`` if there is none."""
+    aliases = replicas()
+    for _ in aliases:
+        alias = aliases[next(_rotation) % len(aliases)]
+        if is_healthy(alias):
+            return alias
+    return DEFAULT_DB_ALIAS
+
+
+def request_user_id(request):
+    """The id of the user making ``request``, without touching the database where possible."""
+    kind, _, token = request.META.get('HTTP_AUTHORIZATION', '').partition(' ')
+    if kind in jwt_settings.AUTH_HEADER_TYPES and token:
+        try:
+            return AccessToken(token.strip()).get(jwt_settings.USER_ID_CLAIM)
+        except TokenError:
+            return None
+    if settings.SESSION_COOKIE_NAME in request.COOKIES and hasattr(request, 'session'):
+        return request.session.get(SESSION_KEY)
+    return None
+
+
+def read_database(request):
+    if request.method not in SAFE_METHODS or not replicas() or is_pinned(request_user_id(request)):
+        return DEFAULT_DB_ALIAS
+    return choose()
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        return read_alias.get()
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {DEFAULT_DB_ALIAS, *replicas()}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas get their schema from the primary.
+        return False if db in replicas() else None
+
+
+class ReplicaMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        token = read_alias.set(read_database(request))
+        try:
+            response = self.get_response(request)
+        finally:
+            read_alias.reset(token)
+        self.pin_writer(request, response)
+        return response
+
+    async def __acall__(self, request):
+        # Only hop to a thread for the cache and connection checks when there is routing to do.
+        if not replicas():
+            return await self.get_response(request)
+        token = read_alias.set(await sync_to_async(read_database)(request))
+        try:
+            response = await self.get_response(request)
+        finally:
+            read_alias.reset(token)
+        await sync_to_async(self.pin_writer)(request, response)
+        return response
+
+    @staticmethod
+    def pin_writer(request, response):
+        if request.method in SAFE_METHODS or response.status_code >= 400 or not replicas():
+            return
+        # DRF puts the user it authenticated on the underlying request as well.
+        user = getattr(request, 'user', None)
+        if user is not None and user.is_authenticated:
+            pin(user.pk)
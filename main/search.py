@@ -0,0 +1,166 @@
+"""
+Ranked full-text search over vlogs.
+
+The index lives in a side table keyed by vlog id: an FTS5 virtual table on SQLite and a
+``tsvector`` column with a GIN index on PostgreSQL (see migration 0015). Rows are
+refreshed by signals in main/signals.py and rebuilt in bulk by ``rebuild_search_index``.
+Comment writes only mark their vlog; each marked vlog is re-indexed once when the
+transaction commits, so a burst of comments or a cascade costs one refresh per vlog.
+"""
+import re
+
+from django.conf import settings
+from django.db import connections, router, transaction
+
+SQLITE_TABLE = 'main_vlogs_fts'
+POSTGRES_TABLE = 'main_vlogs_search'
+
+COMMENTS_SQL = "(SELECT {concat} FROM main_comments c WHERE c.vlog_id = v.id)"
+
+
+def include_comments():
+    return getattr(settings, 'VLOG_SEARCH_INCLUDE_COMMENTS', True)
+
+
+def search_config():
+    return getattr(settings, 'VLOG_SEARCH_CONFIG', 'english')
+
+
+def _connection(write=True):
+    from .models import Vlogs
+    alias = router.db_for_write(Vlogs) if write else router.db_for_read(Vlogs)
+    return connections[alias]
+
+
+def _insert_sql(where):
+    connection = _connection()
+    if connection.vendor == 'sqlite':
+        comments = COMMENTS_SQL.format(concat="group_concat(c.comment, ' ')") if include_comments() else "''"
+        return (
+            f"INSERT INTO {SQLITE_TABLE} (rowid, title, content, description, comments) "
+            f"SELECT v.id, v.title, coalesce(v.content, ''), v.description, coalesce({comments}, '') "
+            f"FROM main_vlogs v WHERE {where}"
+        ), []
+    config = search_config()
+    comments = COMMENTS_SQL.format(concat="string_agg(c.comment, ' ')") if include_comments() else "''"
+    return (
+        f"INSERT INTO {POSTGRES_TABLE} (vlog_id, document) "
+        "SELECT v.id, "
+        "setweight(to_tsvector(%s::regconfig, v.title), 'A') || "
+        "setweight(to_tsvector(%s::regconfig, coalesce(v.content, '')), 'B') || "
+        "setweight(to_tsvector(%s::regconfig, v.description), 'C') || "
+        f"setweight(to_tsvector(%s::regconfig, coalesce({comments}, '')), 'D') "
+        f"FROM main_vlogs v WHERE {where}"
+    ), [config] * 4
+
+
+def _delete_sql(where):
+    if _connection().vendor == 'sqlite':
+        return f"DELETE FROM {SQLITE_TABLE} WHERE {where.format(id='rowid')}"
+    return f"DELETE FROM {POSTGRES_TABLE} WHERE {where.format(id='vlog_id')}"
+
+
+def supported():
+    return _connection().vendor in ('sqlite', 'postgresql')
+
+
+def index_vlog(vlog_id):
+    """Refresh the index row of one vlog; removes it if the vlog is gone."""
+    if not supported():
+        return
+    insert, params = _insert_sql("v.id = %s")
+    with _connection().cursor() as cursor:
+        cursor.execute(_delete_sql("{id} = %s"), [vlog_id])
+        cursor.execute(insert, params + [vlog_id])
+
+
+def index_vlogs(vlog_ids):
+    """Refresh the index rows of many vlogs with one set-based statement per chunk."""
+    if not supported() or not vlog_ids:
+        return
+    with _connection().cursor() as cursor:
+        for start in range(0, len(vlog_ids), 500):
+            chunk = list(vlog_ids[start:start + 500])
+            placeholders = ', '.join(['%s'] * len(chunk))
+            insert, params = _insert_sql(f"v.id IN ({placeholders})")
+            cursor.execute(_delete_sql(f"{{id}} IN ({placeholders})"), chunk)
+            cursor.execute(insert, params + chunk)
+
+
+def remove_vlog(vlog_id):
+    if not supported():
+        return
+    with _connection().cursor() as cursor:
+        cursor.execute(_delete_sql("{id} = %s"), [vlog_id])
+
+
+def index_vlog_on_commit(vlog_id):
+    """Re-index one vlog when the current transaction commits, once however often it is marked."""
+    connection = _connection()
+    if not connection.in_atomic_block:
+        index_vlog(vlog_id)
+        return
+    pending = getattr(connection, 'vlog_search_pending', None)
+    # A rollback drops the flush callback with the rest of the transaction, so start over.
+    if pending is None or not any(callback is pending for _, callback, _ in connection.run_on_commit):
+        pending = connection.vlog_search_pending = PendingVlogs(connection)
+        transaction.on_commit(pending, using=connection.alias)
+    pending.add(vlog_id)
+
+
+class PendingVlogs(set):
+    """Vlog ids marked in one transaction; called by ``on_commit`` to index them together."""
+
+    def __init__(self, connection):
+        super().__init__()
+        self.connection = connection
+
+    def __call__(self):
+        if self.connection.vlog_search_pending is self:
+            self.connection.vlog_search_pending = None
+        index_vlogs(sorted(self))
+
+
+def rebuild(batch_size=10000):
+    """Rebuild the whole index with set-based inserts over id ranges. Yields rows indexed per batch."""
+    with _connection().cursor() as cursor:
+        cursor.execute(_delete_sql("1 = 1"))
+        cursor.execute("SELECT coalesce(max(id), 0) FROM main_vlogs")
+        max_id = cursor.fetchone()[0]
+        insert, params = _insert_sql("v.id > %s AND v.id <= %s")
+        for low in range(0, max_id, batch_size):
+            cursor.execute(insert, params + [low, low + batch_size])
+            yield cursor.rowcount
+
+
+def to_fts5_query(text):
+    """Quote every term so user input is never parsed as FTS5 syntax; the last one matches as a prefix."""
+    terms = [term.replace('"', '""') for term in re.findall(r'\w+', text)]
+    if not terms:
+        return None
+    return ' '.join(f'"{term}"' for term in terms) + '*'
+
+
+def search(text, limit, offset=0):
+    """Return vlog ids matching ``text``, best match first."""
+    connection = _connection(write=False)
+    if connection.vendor == 'sqlite':
+        query = to_fts5_query(text)
+        if query is None:
+            return []
+        sql = (
+            f"SELECT rowid FROM {SQLITE_TABLE} WHERE {SQLITE_TABLE} MATCH %s "
+            f"ORDER BY bm25({SQLITE_TABLE}, 10.0, 5.0, 2.0, 1.0) LIMIT %s OFFSET %s"
+        )
+        params = [query, limit, offset]
+    elif connection.vendor == 'postgresql':
+        sql = (
+            f"SELECT vlog_id FROM {POSTGRES_TABLE}, websearch_to_tsquery(%s::regconfig, %s) query "
+            "WHERE document @@ query ORDER BY ts_rank_cd(document, query) DESC, vlog_id DESC LIMIT %s OFFSET %s"
+        )
+        params = [search_config(), text, limit, offset]
+    else:
+        raise NotImplementedError(f"Full-text search is not available on {connection.vendor}")
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return [row[0] for row in cursor.fetchall()]
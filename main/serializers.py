@@ -1,9 +1,57 @@
+import os
+
+from django.core.files.base import ContentFile
 from django.core.validators import FileExtensionValidator
+from django.db import models, transaction
 from rest_framework import serializers
-from .models import Images, Videos, Documents, Comments, Vlogs, Like
+from .likes import pending_like_deltas
+from .models import (Images, Videos, Documents, Comments, Vlogs, Like, ImageDerivatives, VideoUploads, TranscodeJobs,
+                     Follows)
+from .storage_writes import ParallelStorageWriter
+
+
+class PendingLikesListSerializer(serializers.ListSerializer):
+    """Looks up the buffered like deltas of a whole page with one cache read."""
+
+    def to_representation(self, data):
+        items = list(data.all() if isinstance(data, models.manager.BaseManager) else data)
+        if 'pending_likes' in self.context:
+            return super().to_representation(items)
+        self.context['pending_likes'] = pending_like_deltas([item.pk for item in items])
+        try:
+            return super().to_representation(items)
+        finally:
+            del self.context['pending_likes']
+
+
+class PendingLikesMixin:
+    """
+    Adds likes still sitting in the write-behind buffer to the stored counter.
+
+    Callers that already looked the deltas up (the async views, the export) pass them
+    in the ``pending_likes`` context entry so serialization does not touch the cache;
+    with ``many=True`` the list serializer looks them up for the whole page.
+    """
+
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        if 'likes' in data:
+            pending = self.context.get('pending_likes')
+            if pending is None:
+                pending = pending_like_deltas([instance.pk])
+            data['likes'] += pending.get(instance.pk, 0)
+        return data
+
+
+class ImageDerivativesSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = ImageDerivatives
+        fields = ['file', 'width', 'height', 'format']
 
 
 class ImagesSerializer(serializers.ModelSerializer):
+    derivatives = ImageDerivativesSerializer(many=True, read_only=True)
+
     class Meta:
         model = Images
         fields = '__all__'
@@ -15,7 +63,15 @@ class ImagesSerializer(serializers.ModelSerializer):
         return instance
 
 
+class TranscodeJobsSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = TranscodeJobs
+        fields = ['status', 'manifest']
+
+
 class VideosSerializer(serializers.ModelSerializer):
+    transcode = TranscodeJobsSerializer(read_only=True)
+
     class Meta:
         model = Videos
         fields = '__all__'
@@ -28,6 +84,25 @@ class VideosSerializer(serializers.ModelSerializer):
         return instance
 
 
+class VideoUploadsSerializer(serializers.ModelSerializer):
+    sha256 = serializers.RegexField(r'^[0-9a-fA-F]{64}$', required=False, allow_blank=True)
+
+    class Meta:
+        model = VideoUploads
+        fields = ['id', 'vlog', 'filename', 'size', 'sha256', 'offset', 'video', 'created_at', 'updated_at']
+        read_only_fields = ['vlog', 'offset', 'video', 'created_at', 'updated_at']
+
+    def validate_filename(self, value):
+        for validator in Videos._meta.get_field('video').validators:
+            validator(ContentFile(b'', name=value))
+        return os.path.basename(value)
+
+    def validate_size(self, value):
+        if value <= 0:
+            raise serializers.ValidationError("Size must be positive.")
+        return value
+
+
 class DocumentsSerializer(serializers.ModelSerializer):
     class Meta:
         model = Documents
@@ -52,26 +127,26 @@ class CommentsSerializer(serializers.ModelSerializer):
         return instance
 
 
-class VlogsSerializer(serializers.ModelSerializer):
+class VlogsSerializer(PendingLikesMixin, serializers.ModelSerializer):
     images = ImagesSerializer(many=True, read_only=True)
     videos = VideosSerializer(many=True, read_only=True)
     documents = DocumentsSerializer(many=True, read_only=True)
-    comments = CommentsSerializer(many=True, read_only=True)
+    comments = CommentsSerializer(source='recent_comments', many=True, read_only=True)
     uploaded_images = serializers.ListField(
         child=serializers.ImageField(allow_empty_file=False, use_url=False),
         write_only=True, required=False
     )
     uploaded_videos = serializers.ListField(
-        child=serializers.FileField(allow_empty_file=False, use_url=False),
-        write_only=True, required=False, validators=(
+        child=serializers.FileField(allow_empty_file=False, use_url=False, validators=(
             [FileExtensionValidator(allowed_extensions=['MOV', 'avi', 'mp4', 'webm', 'mkv'])]
-        )
+        )),
+        write_only=True, required=False
     )
     uploaded_documents = serializers.ListField(
-        child=serializers.FileField(allow_empty_file=False, use_url=False),
-        write_only=True, required=False, validators=(
+        child=serializers.FileField(allow_empty_file=False, use_url=False, validators=(
             [FileExtensionValidator(allowed_extensions=('txt', 'pdf', 'doc', 'docx'), )]
-        )
+        )),
+        write_only=True, required=False
     )
     user = serializers.ReadOnlyField(source='user.username')
 
@@ -81,24 +156,42 @@ class VlogsSerializer(serializers.ModelSerializer):
                   'images', 'uploaded_images',
                   'videos', 'uploaded_videos',
                   'documents', 'uploaded_documents',
-                  'comments',
+                  'comments_count', 'comments',
                   'user']
-        read_only_fields = ['likes', 'user', 'comments']
+        read_only_fields = ['likes', 'user', 'comments_count', 'comments']
+        list_serializer_class = PendingLikesListSerializer
 
     def create(self, validated_data):
         uploaded_images = validated_data.pop('uploaded_images', [])
         uploaded_videos = validated_data.pop('uploaded_videos', [])
         uploaded_documents = validated_data.pop('uploaded_documents', [])
-        vlog = Vlogs.objects.create(**validated_data)
+        cover = validated_data.pop('cover', None)
+        vlog = Vlogs(**validated_data)
+        media = []
 
-        for image_data in uploaded_images:
-            Images.objects.create(vlog=vlog, image=image_data)
+        # Every file of the request is written in parallel, so the slowest one sets the latency.
+        writer = ParallelStorageWriter()
+        if cover:
+            writer.save(vlog, 'cover', cover)
+        for model, field_name, uploads in ((Images, 'image', uploaded_images),
+                                           (Videos, 'video', uploaded_videos),
+                                           (Documents, 'document', uploaded_documents)):
+            for upload in uploads:
+                row = model()
+                writer.save(row, field_name, upload)
+                media.append(row)
+        writer.wait()
+        self.storage_timings = writer.timings
 
-        for video_data in uploaded_videos:
-            Videos.objects.create(vlog=vlog, video=video_data)
-
-        for document_data in uploaded_documents:
-            Documents.objects.create(vlog=vlog, document=document_data)
+        try:
+            with transaction.atomic():
+                vlog.save()
+                for row in media:
+                    row.vlog = vlog
+                    row.save()
+        except Exception:
+            writer.rollback()
+            raise
 
         return vlog
 
@@ -113,14 +206,15 @@ class VlogsSerializer(serializers.ModelSerializer):
         return instance
 
 
-class VlogsListSerializer(serializers.ModelSerializer):
-    tags = serializers.SlugRelatedField(many=True, slug_field='tag', read_only=True)
+class VlogsListSerializer(PendingLikesMixin, serializers.ModelSerializer):
     user = serializers.ReadOnlyField(source="user.username")
+    cover_derivatives = ImageDerivativesSerializer(many=True, read_only=True)
 
     class Meta:
         model = Vlogs
-        fields = ["id", "title", "cover", "content", "description", "likes", "tags", "posted_date", "updated_date",
-                  "user"]
+        fields = ["id", "title", "cover", "cover_derivatives", "content", "description", "likes", "comments_count",
+                  "posted_date", "updated_date", "user"]
+        list_serializer_class = PendingLikesListSerializer
 
 
 class LikeSerializer(serializers.ModelSerializer):
@@ -128,3 +222,44 @@ class LikeSerializer(serializers.ModelSerializer):
         model = Like
         fields = '__all__'
         read_only_fields = ["user", "vlog"]
+
+
+class FollowsSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Follows
+        fields = ['follower', 'author', 'created_at']
+        read_only_fields = ['follower', 'author', 'created_at']
+
+
+class VlogsImportEntrySerializer(serializers.Serializer):
+    """One line of a bulk import manifest, see main/bulk_import.py."""
+    title = serializers.CharField(max_length=100)
+    content = serializers.CharField(max_length=255, required=False, allow_null=True, allow_blank=True)
+    description = serializers.CharField()
+    cover = serializers.CharField(required=False, allow_blank=True)
+    images = serializers.ListField(child=serializers.CharField(), required=False)
+    videos = serializers.ListField(child=serializers.CharField(), required=False)
+    documents = serializers.ListField(child=serializers.CharField(), required=False)
+
+    @staticmethod
+    def check_names(names, model, field_name):
+        for validator in model._meta.get_field(field_name).validators:
+            for name in names:
+                validator(ContentFile(b'', name=name))
+        return names
+
+    def validate_cover(self, value):
+        return self.check_names([value], Vlogs, 'cover')[0] if value else value
+
+    def validate_images(self, value):
+        return self.check_names(value, Images, 'image')
+
+    def validate_videos(self, value):
+        return self.check_names(value, Videos, 'video')
+
+    def validate_documents(self, value):
+        return self.check_names(value, Documents, 'document')
+
+
+class VlogsImportSerializer(serializers.Serializer):
+    archive = serializers.FileField(validators=[FileExtensionValidator(allowed_extensions=['zip'])])
@@ -0,0 +1,158 @@
+from django.db import transaction
+from django.db.models import F
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from . import cache, changes, derivatives, search, storage, timelines, transcoding
+from .models import Changes, Vlogs, Images, Videos, Documents, Comments, Like, ImageDerivatives
+
+
+@receiver([post_save, post_delete], sender=Vlogs)
+def vlog_changed(sender, instance, **kwargs):
+    cache.invalidate_vlog_on_commit(instance.pk)
+
+
+@receiver(post_save, sender=Vlogs)
+@receiver(post_save, sender=Comments)
+@receiver(post_save, sender=Like)
+def log_saved(sender, instance, created, **kwargs):
+    changes.record(instance, Changes.CREATED if created else Changes.UPDATED)
+
+
+@receiver(post_delete, sender=Vlogs)
+@receiver(post_delete, sender=Comments)
+@receiver(post_delete, sender=Like)
+def log_deleted(sender, instance, **kwargs):
+    changes.record(instance, Changes.DELETED)
+
+
+@receiver(post_save, sender=Vlogs)
+def vlog_saved_for_search(sender, instance, **kwargs):
+    search.index_vlog(instance.pk)
+
+
+@receiver(post_delete, sender=Vlogs)
+def vlog_deleted_for_search(sender, instance, **kwargs):
+    search.remove_vlog(instance.pk)
+
+
+@receiver([post_save, post_delete], sender=Comments)
+def comment_changed_for_search(sender, instance, origin=None, **kwargs):
+    if search.include_comments() and not deleted_with_vlog(origin):
+        search.index_vlog_on_commit(instance.vlog_id)
+
+
+@receiver(post_save, sender=Vlogs)
+def vlog_created_for_timelines(sender, instance, created, **kwargs):
+    if created:
+        timelines.pool.schedule(timelines.fan_out, instance.pk)
+
+
+@receiver(post_save, sender=Vlogs)
+def vlog_cover_saved(sender, instance, update_fields=None, **kwargs):
+    # Runs before count_blob_references, so _stored_file still holds the pre_save cover.
+    if update_fields is not None and 'cover' not in update_fields:
+        return
+    if getattr(instance, '_stored_file', '') != media_file_name(instance):
+        derivatives.pool.schedule(derivatives.generate_for_cover, instance.pk)
+
+
+@receiver(post_save, sender=Videos)
+def video_saved(sender, instance, update_fields=None, **kwargs):
+    if update_fields is None or 'video' in update_fields:
+        transcoding.enqueue(instance)
+
+
+@receiver(post_save, sender=Images)
+def image_saved(sender, instance, update_fields=None, **kwargs):
+    if update_fields is None or 'image' in update_fields:
+        derivatives.pool.schedule(derivatives.generate_for_image, instance.pk)
+
+
+@receiver(post_delete, sender=ImageDerivatives)
+def derivative_deleted(sender, instance, **kwargs):
+    # Also reached through the cascade from an image or vlog; the file goes once the delete commits.
+    name, file_storage = instance.file.name, instance.file.storage
+    if name:
+        transaction.on_commit(lambda: file_storage.delete(name))
+
+
+def deleted_with_vlog(origin):
+    """Whether a delete that started from ``origin`` is a vlog's cascade, which leaves no parent to update."""
+    return isinstance(origin, Vlogs) or getattr(origin, 'model', None) is Vlogs
+
+
+@receiver([post_save, post_delete], sender=Images)
+@receiver([post_save, post_delete], sender=Videos)
+@receiver([post_save, post_delete], sender=Documents)
+def vlog_child_changed(sender, instance, origin=None, **kwargs):
+    if instance.vlog_id is None or deleted_with_vlog(origin):
+        return
+    # Media are part of the vlog, so they move its Last-Modified forward.
+    Vlogs.objects.filter(pk=instance.vlog_id).update(updated_date=timezone.now())
+    cache.invalidate_vlog_on_commit(instance.vlog_id)
+
+
+@receiver(post_save, sender=Comments)
+def comment_saved(sender, instance, created, **kwargs):
+    # One UPDATE of the parent per comment write: the counter and Last-Modified move together.
+    counter = {'comments_count': F('comments_count') + 1} if created else {}
+    Vlogs.objects.filter(pk=instance.vlog_id).update(updated_date=timezone.now(), **counter)
+    cache.invalidate_vlog_on_commit(instance.vlog_id)
+
+
+@receiver(post_delete, sender=Comments)
+def comment_deleted(sender, instance, origin=None, **kwargs):
+    if deleted_with_vlog(origin):
+        return
+    Vlogs.objects.filter(pk=instance.vlog_id).update(comments_count=F('comments_count') - 1,
+                                                      updated_date=timezone.now())
+    cache.invalidate_vlog_on_commit(instance.vlog_id)
+
+
+@receiver([post_save, post_delete], sender=Like)
+def like_changed(sender, instance, origin=None, **kwargs):
+    if not deleted_with_vlog(origin):
+        cache.invalidate_vlog_on_commit(instance.vlog_id)
+
+
+MEDIA_FILE_FIELDS = {Images: 'image', Videos: 'video', Documents: 'document', Vlogs: 'cover'}
+
+
+def media_file_name(instance):
+    field_file = getattr(instance, MEDIA_FILE_FIELDS[type(instance)])
+    return field_file.name if field_file else ''
+
+
+@receiver(pre_save, sender=Images)
+@receiver(pre_save, sender=Videos)
+@receiver(pre_save, sender=Documents)
+@receiver(pre_save, sender=Vlogs)
+def remember_stored_file(sender, instance, update_fields=None, **kwargs):
+    instance._stored_file = ''
+    # Vlogs always need it to tell whether the cover changed, see vlog_cover_saved.
+    needed = storage.deduplicate() or (sender is Vlogs and (update_fields is None or 'cover' in update_fields))
+    if needed and not instance._state.adding:
+        field_name = MEDIA_FILE_FIELDS[sender]
+        instance._stored_file = sender.objects.filter(pk=instance.pk).values_list(field_name, flat=True).first() or ''
+
+
+@receiver(post_save, sender=Images)
+@receiver(post_save, sender=Videos)
+@receiver(post_save, sender=Documents)
+@receiver(post_save, sender=Vlogs)
+def count_blob_references(sender, instance, **kwargs):
+    old, new = getattr(instance, '_stored_file', ''), media_file_name(instance)
+    if old != new:
+        storage.retain([new])
+        storage.release([old])
+    instance._stored_file = new
+
+
+@receiver(post_delete, sender=Images)
+@receiver(post_delete, sender=Videos)
+@receiver(post_delete, sender=Documents)
+@receiver(post_delete, sender=Vlogs)
+def release_blob_reference(sender, instance, **kwargs):
+    storage.release([media_file_name(instance)])
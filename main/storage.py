@@ -0,0 +1,149 @@
+"""
+Content-addressed media storage.
+
+With ``VLOG_MEDIA_DEDUPLICATE`` on, every upload to ``ContentAddressedStorage`` is hashed
+while it streams to a temporary file and stored once under ``uploads/blobs/`` by its
+SHA-256. Rows referencing a blob are counted in ``Blobs.refcount`` by the signals in
+main/signals.py, and a blob's file is deleted only when its count drops to zero.
+
+An upload that stores or reuses a blob only references it once its row is saved. In
+between, the blob's count can still be zero, so storing a blob stamps
+``Blobs.stored_at`` and :func:`collect` spares blobs stamped within the last
+``VLOG_BLOB_REUSE_GRACE_SECONDS``. It decides under a lock on the blob's row, so a
+concurrent store or :func:`retain` either waits for the blob to be gone or keeps it.
+
+Deleting a blob through the storage never removes its file, since a rollback cannot
+tell whether another row shares it. A blob stored by an upload that then failed is
+never released either, so :func:`collect_unreferenced` (run by ``collect_orphaned_media``)
+sweeps every blob left at zero references once its grace period is over.
+"""
+import hashlib
+import os
+import tempfile
+from datetime import timedelta
+from pathlib import Path
+
+from django.apps import apps
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+from django.utils.deconstruct import deconstructible
+
+BLOB_DIR = 'uploads/blobs'
+
+
+def deduplicate():
+    return getattr(settings, 'VLOG_MEDIA_DEDUPLICATE', False)
+
+
+def reuse_grace():
+    return getattr(settings, 'VLOG_BLOB_REUSE_GRACE_SECONDS', 3600)
+
+
+def is_blob(name):
+    return bool(name) and name.startswith(BLOB_DIR + '/')
+
+
+def blob_name(digest, original_name):
+    extension = os.path.splitext(original_name)[1].lower()
+    return f'{BLOB_DIR}/{digest[:2]}/{digest[2:4]}/{digest}{extension}'
+
+
+@deconstructible(path='main.storage.ContentAddressedStorage')
+class ContentAddressedStorage(FileSystemStorage):
+
+    def _save(self, name, content):
+        if not deduplicate():
+            return super()._save(name, content)
+
+        temp_dir = Path(self.path(BLOB_DIR)) / 'tmp'
+        temp_dir.mkdir(parents=True, exist_ok=True)
+        digest = hashlib.sha256()
+        fd, temp_path = tempfile.mkstemp(dir=temp_dir)
+        try:
+            with os.fdopen(fd, 'wb') as out:
+                for chunk in content.chunks():
+                    digest.update(chunk)
+                    out.write(chunk)
+            return self.store_blob(temp_path, blob_name(digest.hexdigest(), name))
+        finally:
+            if os.path.exists(temp_path):
+                os.unlink(temp_path)
+
+    def store_blob(self, path, name):
+        """Move the file at ``path`` to blob ``name`` unless an identical blob is already stored."""
+        mark_stored(name)
+        full_path = self.path(name)
+        if not os.path.exists(full_path):
+            os.makedirs(os.path.dirname(full_path), exist_ok=True)
+            os.replace(path, full_path)
+            if self.file_permissions_mode is not None:
+                os.chmod(full_path, self.file_permissions_mode)
+        return name
+
+    def delete(self, name):
+        # Blobs are only removed by collect(), which checks the grace period under the row lock.
+        if is_blob(name):
+            return
+        super().delete(name)
+
+
+media_storage = ContentAddressedStorage()
+
+
+def get_blobs_model():
+    return apps.get_model('main', 'Blobs')
+
+
+def upsert(name, **changes):
+    """Apply ``changes`` to blob ``name``'s row, creating it first if needed, without a read in between."""
+    Blobs = get_blobs_model()
+    # The row can vanish between the insert and the update if collect() deletes it; insert it again.
+    while not Blobs.objects.filter(name=name).update(**changes):
+        Blobs.objects.bulk_create([Blobs(name=name)], ignore_conflicts=True)
+
+
+def mark_stored(name):
+    upsert(name, stored_at=timezone.now())
+
+
+def retain(names):
+    for name in filter(is_blob, names):
+        upsert(name, refcount=F('refcount') + 1)
+
+
+def release(names):
+    names = [name for name in names if is_blob(name)]
+    if not names:
+        return
+    get_blobs_model().objects.filter(name__in=names).update(refcount=F('refcount') - 1)
+    transaction.on_commit(lambda: collect(names))
+
+
+def collect(names):
+    """Delete the blobs among ``names`` that are no longer referenced nor recently stored; return how many."""
+    Blobs = get_blobs_model()
+    settled = timezone.now() - timedelta(seconds=reuse_grace())
+    deleted = 0
+    for name in names:
+        with transaction.atomic():
+            blob = Blobs.objects.select_for_update().filter(
+                Q(stored_at__isnull=True) | Q(stored_at__lt=settled), name=name, refcount__lte=0,
+            ).first()
+            if blob is None:
+                continue
+            blob.delete()
+            # Still under the row lock: a store of the same content waits and then writes the file anew.
+            FileSystemStorage.delete(media_storage, name)
+            deleted += 1
+    return deleted
+
+
+def collect_unreferenced():
+    """Collect every blob left without references, including ones whose upload never saved its row."""
+    Blobs = get_blobs_model()
+    settled = timezone.now() - timedelta(seconds=reuse_grace())
+    unreferenced = Blobs.objects.filter(Q(stored_at__isnull=True) | Q(stored_at__lt=settled), refcount__lte=0)
+    return collect(list(unreferenced.values_list('name', flat=True)))
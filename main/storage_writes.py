@@ -0,0 +1,73 @@
+import logging
+import os
+import time
+
+from django.core.files import File
+
+from .workers import WorkerPool
+
+logger = logging.getLogger(__name__)
+
+pool = WorkerPool('storage', 'VLOG_STORAGE_WRITE_WORKERS', None, default_workers=8)
+
+
+def store(instance, field_name, content, name=None):
+    """Save ``content`` to the storage of ``instance``'s file field and return the stored name."""
+    field = instance._meta.get_field(field_name)
+    name = os.path.basename(name or content.name)
+    target = field.generate_filename(instance, name)
+    if not isinstance(content, File):
+        content = File(content, name=name)
+    return field.storage.save(target, content, max_length=field.max_length)
+
+
+def timed_store(instance, field_name, content):
+    started = time.perf_counter()
+    stored = store(instance, field_name, content)
+    return stored, time.perf_counter() - started
+
+
+class ParallelStorageWriter:
+    """
+    Saves several uploaded files at once on the shared storage pool.
+
+    Call :meth:`save` for every file, then :meth:`wait`, which assigns the stored names
+    to the instances. If a write or the caller's database transaction fails,
+    :meth:`rollback` deletes whatever was already written. ``timings`` holds
+    ``(file name, seconds)`` for every completed write.
+    """
+
+    def __init__(self, executor=None):
+        self.executor = executor or pool.get_executor()
+        self.pending = []
+        self.written = []
+        self.timings = []
+
+    def save(self, instance, field_name, content):
+        future = self.executor.submit(timed_store, instance, field_name, content)
+        self.pending.append((instance, field_name, content.name, future))
+
+    def wait(self):
+        error = None
+        for instance, field_name, name, future in self.pending:
+            try:
+                stored, seconds = future.result()
+            except Exception as exc:
+                error = error or exc
+                continue
+            self.written.append((instance._meta.get_field(field_name).storage, stored))
+            self.timings.append((name, seconds))
+            setattr(instance, field_name, stored)
+            logger.debug("Stored %s as %s in %.1f ms", name, stored, seconds * 1000)
+        self.pending = []
+        if error is not None:
+            self.rollback()
+            raise error
+
+    def rollback(self):
+        for storage, stored in self.written:
+            try:
+                storage.delete(stored)
+            except OSError:
+                logger.warning("Could not delete %s after a failed upload", stored, exc_info=True)
+        self.written = []
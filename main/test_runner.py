@@ -0,0 +1,10 @@
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+
+class VlogTestRunner(DiscoverRunner):
+    """Runs the suite with ``VLOG_QUERY_BUDGET_STRICT`` on, so a view over its query budget fails its test."""
+
+    def run_tests(self, *args, **kwargs):
+        with override_settings(VLOG_QUERY_BUDGET_STRICT=True):
+            return super().run_tests(*args, **kwargs)
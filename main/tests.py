@@ -1,3 +1,1360 @@
-from django.test import TestCase
+import hashlib
+import json
+import re
+import shutil
+import tempfile
+import zipfile
+from datetime import timedelta
+from io import BytesIO, StringIO
+from pathlib import Path
+from urllib.parse import quote
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import connection, connections, transaction
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import AsyncClient, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from PIL import Image
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+from vlog import settings_sqlite
+
+from . import benchmarks, bulk_import, changes, likes, replicas, search, storage, timelines
+from .backends.sqlite3.base import DatabaseWrapper
+from .instrumentation import QueryBudgetExceeded
+from .likes import add_like, pending_like_deltas
+from .models import (Vlogs, Comments, Images, Like, ImageDerivatives, Videos, TranscodeJobs, Documents, Blobs,
+                     Changes, FollowerCounts, Follows, TimelineEntries, VideoUploads)
+
+
+class VlogsQueryCountTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(username="author", password="Password1")
+
+    def create_vlogs(self, count):
+        for i in range(count):
+            vlog = Vlogs.objects.create(title=f"vlog {i}", description="description", user=self.user)
+            Images.objects.create(vlog=vlog, image=f"uploads/images/{i}.png")
+            Comments.objects.create(vlog=vlog, user=self.user, comment="comment")
+
+    def test_feed_query_count_is_constant(self):
+        self.create_vlogs(3)
+        with self.assertNumQueries(2):
+            response = self.client.get("/api/vlogs/")
+        self.assertEqual(len(response.json()["results"]), 3)
+
+        self.create_vlogs(20)
+        with self.assertNumQueries(2):
+            response = self.client.get("/api/vlogs/?page_size=20")
+        self.assertEqual(len(response.json()["results"]), 20)
+
+    def test_feed_pages_through_equal_posted_dates(self):
+        self.create_vlogs(5)
+        Vlogs.objects.update(posted_date=timezone.now())
+        expected = list(Vlogs.objects.order_by("-id").values_list("title", flat=True))
+
+        for url in ("/api/vlogs/?page_size=2", "/api/vlogs/async/?page_size=2"):
+            titles, pages, page = [], [], {"next": url}
+            while page["next"]:
+                page = self.client.get(page["next"]).json()
+                pages.append([vlog["title"] for vlog in page["results"]])
+                titles += pages[-1]
+            self.assertEqual(titles, expected, url)
+            self.assertEqual(len(pages), 3)
+
+            page = self.client.get(page["previous"]).json()
+            self.assertEqual([vlog["title"] for vlog in page["results"]], pages[1])
+            page = self.client.get(page["previous"]).json()
+            self.assertEqual([vlog["title"] for vlog in page["results"]], pages[0])
+            self.assertIsNone(page["previous"])
+
+    def test_detail_query_count(self):
+        self.create_vlogs(1)
+        vlog = Vlogs.objects.get()
+        Comments.objects.create(vlog=vlog, user=self.user, comment="another")
+        # One query for the ETag, then the vlog and its six prefetched relations.
+        with self.assertNumQueries(8):
+            response = self.client.get(f"/api/vlogs/{vlog.pk}/")
+        data = response.json()
+        self.assertEqual(data["user"], "author")
+        self.assertEqual(len(data["images"]), 1)
+        self.assertEqual(len(data["comments"]), 2)
+
+
+class LikeCounterTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(username="fan", password="Password1")
+        self.vlog = Vlogs.objects.create(title="vlog", description="description", user=self.user)
+        self.client.force_authenticate(self.user)
+
+    def test_like_and_drop_like_adjust_counter(self):
+        response = self.client.post(f"/api/vlogs/{self.vlog.pk}/like/")
+        self.assertEqual(response.status_code, 201)
+        response = self.client.post(f"/api/vlogs/{self.vlog.pk}/like/")
+        self.assertEqual(response.status_code, 400)
+        self.vlog.refresh_from_db()
+        self.assertEqual(self.vlog.likes, 1)
+
+        response = self.client.put(f"/api/vlogs/{self.vlog.pk}/drop-like/")
+        self.assertEqual(response.status_code, 204)
+        response = self.client.put(f"/api/vlogs/{self.vlog.pk}/drop-like/")
+        self.assertEqual(response.status_code, 400)
+        self.vlog.refresh_from_db()
+        self.assertEqual(self.vlog.likes, 0)
+
+    def test_reconcile_likes_repairs_drift(self):
+        Like.objects.create(user=self.user, vlog=self.vlog)
+        Vlogs.objects.filter(pk=self.vlog.pk).update(likes=42)
+        call_command("reconcile_likes", stdout=StringIO())
+        self.vlog.refresh_from_db()
+        self.assertEqual(self.vlog.likes, 1)
+
+
+class ResponseCacheTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(username="author", password="Password1")
+        self.vlog = Vlogs.objects.create(title="vlog", description="description", user=self.user)
+
+    def test_detail_is_cached_and_invalidated(self):
+        url = f"/api/vlogs/{self.vlog.pk}/"
+        self.client.get(url)
+        with self.assertNumQueries(1):
+            response = self.client.get(url)
+        self.assertEqual(response.json()["comments"], [])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Comments.objects.create(vlog=self.vlog, user=self.user, comment="fresh")
+        self.assertEqual(len(self.client.get(url).json()["comments"]), 1)
+
+    @override_settings(ALLOWED_HOSTS=["internal.local", "public.example.com"])
+    def test_detail_is_cached_per_origin(self):
+        Images.objects.create(vlog=self.vlog, image="uploads/images/a.png")
+        url = f"/api/vlogs/{self.vlog.pk}/"
+        internal = self.client.get(url, HTTP_HOST="internal.local").json()
+        public = self.client.get(url, HTTP_HOST="public.example.com", secure=True).json()
+        self.assertTrue(internal["images"][0]["image"].startswith("http://internal.local/"))
+        self.assertTrue(public["images"][0]["image"].startswith("https://public.example.com/"))
+
+    def test_feed_is_cached_and_invalidated(self):
+        self.client.get("/api/vlogs/")
+        with self.assertNumQueries(0):
+            self.client.get("/api/vlogs/")
+
+        self.vlog.title = "renamed"
+        with self.captureOnCommitCallbacks(execute=True):
+            self.vlog.save()
+        self.assertEqual(self.client.get("/api/vlogs/").json()["results"][0]["title"], "renamed")
+
+    def test_conditional_get(self):
+        url = f"/api/vlogs/{self.vlog.pk}/"
+        response = self.client.get(url)
+        etag = response["ETag"]
+        self.assertTrue(response.has_header("Last-Modified"))
+
+        with self.assertNumQueries(1):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        Like.objects.create(user=self.user, vlog=self.vlog)
+        Vlogs.objects.filter(pk=self.vlog.pk).update(likes=1)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+        feed_etag = self.client.get("/api/vlogs/")["ETag"]
+        self.assertEqual(self.client.get("/api/vlogs/", HTTP_IF_NONE_MATCH=feed_etag).status_code, 304)
+
+    def test_likes_move_last_modified(self):
+        url = f"/api/vlogs/{self.vlog.pk}/"
+        Vlogs.objects.filter(pk=self.vlog.pk).update(updated_date=timezone.now() - timedelta(hours=1))
+        last_modified = self.client.get(url)["Last-Modified"]
+        self.assertEqual(self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified).status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            add_like(self.user, self.vlog)
+        response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["likes"], 1)
+
+    def test_entries_cached_before_commit_are_dropped_on_commit(self):
+        url = f"/api/vlogs/{self.vlog.pk}/"
+        self.client.get(url)
+        with self.captureOnCommitCallbacks(execute=True):
+            add_like(self.user, self.vlog)
+            # A read between the write and the commit caches whatever it saw.
+            self.client.get(url)
+            self.client.get("/api/vlogs/")
+            with self.assertNumQueries(1):
+                self.client.get(url)
+        # Both are rebuilt rather than served from the entries cached before the commit.
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.client.get(url).json()["likes"], 1)
+        self.assertGreater(len(queries), 1)
+        with self.assertNumQueries(2):
+            self.client.get("/api/vlogs/")
+
+
+class ImageDerivativesTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        self.client = APIClient()
+        self.user = User.objects.create_user(username="author", password="Password1")
+
+    def upload(self, width, height):
+        buffer = BytesIO()
+        Image.new("RGB", (width, height), "red").save(buffer, "PNG")
+        return SimpleUploadedFile("photo.png", buffer.getvalue(), content_type="image/png")
+
+    def test_derivatives_are_generated_and_exposed(self):
+        with override_settings(MEDIA_ROOT=self.media_root, VLOG_DERIVATIVES_ASYNC=False, VLOG_TIMELINE_ASYNC=False,
+                               VLOG_DERIVATIVE_WIDTHS=(100, 200, 800)):
+            with self.captureOnCommitCallbacks(execute=True):
+                vlog = Vlogs.objects.create(title="vlog", description="d", user=self.user, cover=self.upload(400, 200))
+                image = Images.objects.create(vlog=vlog, image=self.upload(50, 50))
+
+        self.assertEqual(
+            sorted(vlog.cover_derivatives.values_list("width", "height", "format")),
+            [(100, 50, "jpeg"), (100, 50, "webp"), (200, 100, "jpeg"), (200, 100, "webp")],
+        )
+        self.assertEqual(sorted(image.derivatives.values_list("width", "format")), [(50, "jpeg"), (50, "webp")])
+        self.assertEqual(ImageDerivatives.objects.count(), 6)
+
+        feed = self.client.get("/api/vlogs/").json()["results"][0]
+        self.assertEqual(len(feed["cover_derivatives"]), 4)
+        detail = self.client.get(f"/api/vlogs/{vlog.pk}/").json()
+        self.assertEqual(len(detail["images"][0]["derivatives"]), 2)
+
+    def test_only_cover_changes_rerender_and_deletes_remove_files(self):
+        with override_settings(MEDIA_ROOT=self.media_root, VLOG_DERIVATIVES_ASYNC=False, VLOG_TIMELINE_ASYNC=False,
+                               VLOG_DERIVATIVE_WIDTHS=(100,)):
+            with self.captureOnCommitCallbacks(execute=True):
+                vlog = Vlogs.objects.create(title="vlog", description="d", user=self.user, cover=self.upload(400, 200))
+                Images.objects.create(vlog=vlog, image=self.upload(200, 200))
+            files = [Path(self.media_root, name) for name in ImageDerivatives.objects.values_list("file", flat=True)]
+            self.assertEqual(len(files), 4)
+
+            with mock.patch("main.derivatives.generate_for_cover") as generate, \
+                    self.captureOnCommitCallbacks(execute=True):
+                vlog.title = "renamed"
+                vlog.save()
+            generate.assert_not_called()
+
+            with self.captureOnCommitCallbacks(execute=True):
+                vlog.delete()
+        self.assertFalse(ImageDerivatives.objects.exists())
+        self.assertFalse(any(path.exists() for path in files))
+
+
+class ResumableVideoUploadTest(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        settings = override_settings(MEDIA_ROOT=self.media_root, VLOG_UPLOAD_STAGING_DIR=f"{self.media_root}/partial")
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.client = APIClient()
+        self.admin = User.objects.create_superuser(username="admin", password="Password1")
+        self.client.force_authenticate(self.admin)
+        self.vlog = Vlogs.objects.create(title="vlog", description="description", user=self.admin)
+
+    def put_chunk(self, url, payload, start, total):
+        return self.client.generic("PUT", url, payload, content_type="application/octet-stream",
+                                   HTTP_CONTENT_RANGE=f"bytes {start}-{start + len(payload) - 1}/{total}")
+
+    def test_chunked_upload_resume_and_complete(self):
+        payload = bytes(range(256)) * 40
+        response = self.client.post(f"/api/vlogs/{self.vlog.pk}/video/uploads/", {
+            "filename": "clip.mp4", "size": len(payload), "sha256": hashlib.sha256(payload).hexdigest(),
+        })
+        self.assertEqual(response.status_code, 201)
+        url = f"/api/vlogs/{self.vlog.pk}/video/uploads/{response.json()['id']}/"
+
+        self.assertEqual(self.put_chunk(url, payload[:4000], 0, len(payload)).json()["offset"], 4000)
+        self.assertEqual(self.put_chunk(url, payload[8000:], 8000, len(payload)).status_code, 409)
+        self.assertEqual(self.client.get(url).json()["offset"], 4000)
+        self.assertEqual(self.client.post(f"{url}complete/").status_code, 400)
+
+        self.assertEqual(self.put_chunk(url, payload[4000:], 4000, len(payload)).json()["offset"], len(payload))
+        response = self.client.post(f"{url}complete/")
+        self.assertEqual(response.status_code, 201)
+        video = Videos.objects.get(vlog=self.vlog)
+        with video.video.open("rb") as f:
+            self.assertEqual(f.read(), payload)
+
+    def test_checksum_mismatch_resets_upload(self):
+        response = self.client.post(f"/api/vlogs/{self.vlog.pk}/video/uploads/", {
+            "filename": "clip.mp4", "size": 3, "sha256": "0" * 64,
+        })
+        url = f"/api/vlogs/{self.vlog.pk}/video/uploads/{response.json()['id']}/"
+        self.put_chunk(url, b"abc", 0, 3)
+        self.assertEqual(self.client.post(f"{url}complete/").status_code, 400)
+        self.assertEqual(self.client.get(url).json()["offset"], 0)
+        self.assertFalse(Videos.objects.exists())
+
+    def test_failed_complete_keeps_the_staged_bytes(self):
+        response = self.client.post(f"/api/vlogs/{self.vlog.pk}/video/uploads/", {"filename": "clip.mp4", "size": 3})
+        url = f"/api/vlogs/{self.vlog.pk}/video/uploads/{response.json()['id']}/"
+        self.put_chunk(url, b"abc", 0, 3)
+
+        with mock.patch.object(Videos, "save", side_effect=RuntimeError("disk full")):
+            with self.assertRaises(RuntimeError):
+                self.client.post(f"{url}complete/")
+        self.assertEqual(list(Path(self.media_root).rglob("clip*.mp4")), [])
+
+        self.assertEqual(self.client.post(f"{url}complete/").status_code, 201)
+        self.assertEqual(self.client.post(f"{url}complete/").status_code, 200)
+        self.assertEqual(Videos.objects.filter(vlog=self.vlog).count(), 1)
+
+    def test_expire_abandoned_uploads(self):
+        response = self.client.post(f"/api/vlogs/{self.vlog.pk}/video/uploads/", {"filename": "clip.mp4", "size": 6})
+        url = f"/api/vlogs/{self.vlog.pk}/video/uploads/{response.json()['id']}/"
+        self.put_chunk(url, b"abc", 0, 6)
+        stray = Path(self.media_root, "partial", "stray")
+        stray.write_bytes(b"x")
+
+        call_command("expire_uploads", stdout=StringIO())
+        self.assertEqual(VideoUploads.objects.count(), 1)
+
+        call_command("expire_uploads", "--max-age", "-1", stdout=StringIO())
+        self.assertFalse(VideoUploads.objects.exists())
+        self.assertEqual(list(Path(self.media_root, "partial").iterdir()), [])
+
+    def test_rejects_unsupported_extension(self):
+        response = self.client.post(f"/api/vlogs/{self.vlog.pk}/video/uploads/", {"filename": "a.exe", "size": 3})
+        self.assertEqual(response.status_code, 400)
+
+
+class MediaRangeTest(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        settings = override_settings(MEDIA_ROOT=self.media_root)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.client = APIClient()
+        self.user = User.objects.create_user(username="author", password="Password1")
+        self.vlog = Vlogs.objects.create(title="vlog", description="description", user=self.user)
+        self.payload = bytes(range(256)) * 4
+        self.video = Videos.objects.create(vlog=self.vlog, video=SimpleUploadedFile("clip.mp4", self.payload))
+        self.url = f"/api/vlogs/{self.vlog.pk}/video/{self.video.pk}/file/"
+
+    def test_full_and_partial_content(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b"".join(response.streaming_content), self.payload)
+        self.assertEqual(response["Accept-Ranges"], "bytes")
+        etag = response["ETag"]
+
+        response = self.client.get(self.url, HTTP_RANGE="bytes=100-199")
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response["Content-Range"], f"bytes 100-199/{len(self.payload)}")
+        self.assertEqual(b"".join(response.streaming_content), self.payload[100:200])
+
+        response = self.client.get(self.url, HTTP_RANGE="bytes=-24")
+        self.assertEqual(b"".join(response.streaming_content), self.payload[-24:])
+
+        self.assertEqual(self.client.get(self.url, HTTP_RANGE="bytes=5000-").status_code, 416)
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.assertEqual(self.client.get(self.url, HTTP_RANGE="bytes=0-9", HTTP_IF_RANGE=etag).status_code, 206)
+        self.assertEqual(self.client.get(self.url, HTTP_RANGE="bytes=0-9", HTTP_IF_RANGE='"stale"').status_code, 200)
+
+    def test_accel_redirect_offload(self):
+        with override_settings(VLOG_MEDIA_SENDFILE="x-accel-redirect"):
+            response = self.client.get(self.url)
+        self.assertEqual(response["X-Accel-Redirect"], f"/protected-media/{self.video.video.name}")
+        self.assertEqual(response.content, b"")
+
+
+@override_settings(VLOG_TRANSCODE_ASYNC=False, VLOG_TRANSCODE_ENCODER="main.transcoding.StubEncoder")
+class TranscodeTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        settings = override_settings(MEDIA_ROOT=self.media_root)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.user = User.objects.create_user(username="author", password="Password1")
+        self.vlog = Vlogs.objects.create(title="vlog", description="description", user=self.user)
+
+    def test_upload_is_transcoded_to_hls(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            video = Videos.objects.create(vlog=self.vlog, video=SimpleUploadedFile("clip.mp4", b"data"))
+
+        job = TranscodeJobs.objects.get(video=video)
+        self.assertEqual(job.status, TranscodeJobs.DONE)
+        master = job.manifest.read().decode()
+        self.assertEqual(master.count("#EXT-X-STREAM-INF"), 3)
+        self.assertIn("720p/index.m3u8", master)
+
+        transcode = APIClient().get(f"/api/vlogs/{self.vlog.pk}/").json()["videos"][0]["transcode"]
+        self.assertEqual(transcode["status"], "done")
+        self.assertTrue(transcode["manifest"].endswith(f"uploads/hls/{video.pk}/master.m3u8"))
+
+    def test_ladder_follows_the_source_size(self):
+        for size, expected in [
+            ((640, 480), ["RESOLUTION=480x360"]),
+            ((720, 1280), ["RESOLUTION=202x360", "RESOLUTION=404x720", "RESOLUTION=608x1080"]),
+        ]:
+            with mock.patch("main.transcoding.StubEncoder.probe", return_value=size):
+                with self.captureOnCommitCallbacks(execute=True):
+                    video = Videos.objects.create(vlog=self.vlog, video=SimpleUploadedFile("clip.mp4", b"data"))
+            master = TranscodeJobs.objects.get(video=video).manifest.read().decode()
+            self.assertEqual(re.findall(r"RESOLUTION=\S+", master), expected)
+
+    def test_failed_encoder_marks_job(self):
+        with override_settings(VLOG_FFMPEG_BINARY="missing-ffmpeg",
+                               VLOG_TRANSCODE_ENCODER="main.transcoding.FfmpegEncoder"):
+            with self.assertLogs("main.transcoding", "ERROR"), self.captureOnCommitCallbacks(execute=True):
+                video = Videos.objects.create(vlog=self.vlog, video=SimpleUploadedFile("clip.mp4", b"data"))
+        job = TranscodeJobs.objects.get(video=video)
+        self.assertEqual(job.status, TranscodeJobs.FAILED)
+        self.assertIn("not installed", job.error)
+
+        call_command("transcode_videos", "--retry-failed", stdout=StringIO())
+        job.refresh_from_db()
+        self.assertEqual(job.status, TranscodeJobs.DONE)
+
+
+class CommentThreadTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(username="reader", password="Password1")
+        self.vlog = Vlogs.objects.create(title="vlog", description="description", user=self.user)
+        self.client.force_authenticate(self.user)
+
+    @override_settings(VLOG_DETAIL_COMMENTS=2)
+    def test_comment_count_detail_and_listing(self):
+        for i in range(5):
+            response = self.client.post(f"/api/vlogs/{self.vlog.pk}/post-comment/", {"comment": f"comment {i}"})
+            self.assertEqual(response.status_code, 201)
+
+        detail = self.client.get(f"/api/vlogs/{self.vlog.pk}/").json()
+        self.assertEqual(detail["comments_count"], 5)
+        self.assertEqual([c["comment"] for c in detail["comments"]], ["comment 4", "comment 3"])
+
+        page = self.client.get(f"/api/vlogs/{self.vlog.pk}/comments/?page_size=3").json()
+        self.assertEqual([c["comment"] for c in page["results"]], ["comment 4", "comment 3", "comment 2"])
+        page = self.client.get(page["next"]).json()
+        self.assertEqual([c["comment"] for c in page["results"]], ["comment 1", "comment 0"])
+        self.assertEqual(self.client.get("/api/vlogs/999/comments/").status_code, 404)
+
+        comment = Comments.objects.get(comment="comment 0")
+        response = self.client.delete(f"/api/vlogs/{self.vlog.pk}/delete-comment/{comment.pk}/")
+        self.assertEqual(response.status_code, 204)
+        self.vlog.refresh_from_db()
+        self.assertEqual(self.vlog.comments_count, 4)
+
+    def test_comment_writes_and_vlog_delete_update_the_parent_once(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.client.post(f"/api/vlogs/{self.vlog.pk}/post-comment/", {"comment": "first"})
+        updates = [query['sql'] for query in queries if query['sql'].startswith('UPDATE "main_vlogs"')]
+        # The counter and updated_date, then the trending score.
+        self.assertEqual(len(updates), 2)
+
+        Comments.objects.create(vlog=self.vlog, user=self.user, comment="second")
+        Images.objects.create(vlog=self.vlog, image="uploads/images/a.png")
+        Like.objects.create(user=self.user, vlog=self.vlog)
+        self.vlog.refresh_from_db()
+        self.assertEqual(self.vlog.comments_count, 2)
+        with CaptureQueriesContext(connection) as queries:
+            self.vlog.delete()
+        self.assertFalse([query for query in queries if query['sql'].startswith('UPDATE "main_vlogs"')])
+
+    def test_reconcile_comments_repairs_drift(self):
+        Comments.objects.create(vlog=self.vlog, user=self.user, comment="hi")
+        Vlogs.objects.filter(pk=self.vlog.pk).update(comments_count=42)
+        call_command("reconcile_comments", "--dry-run", stdout=StringIO())
+        self.vlog.refresh_from_db()
+        self.assertEqual(self.vlog.comments_count, 42)
+        call_command("reconcile_comments", stdout=StringIO())
+        self.vlog.refresh_from_db()
+        self.assertEqual(self.vlog.comments_count, 1)
+
+
+@override_settings(VLOG_TIMELINE_ASYNC=False, VLOG_DERIVATIVES_ASYNC=False, VLOG_TIMELINE_LENGTH=3,
+                   VLOG_FANOUT_MAX_FOLLOWERS=2)
+class HomeTimelineTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.reader = User.objects.create_user(username="reader", password="Password1")
+        self.author = User.objects.create_user(username="author", password="Password1")
+        self.star = User.objects.create_user(username="star", password="Password1")
+        self.client.force_authenticate(self.reader)
+
+    def post(self, author, title):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Vlogs.objects.create(title=title, description="description", user=author)
+
+    def follow(self, user, author):
+        self.client.force_authenticate(user)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(f"/api/vlogs/users/{author.pk}/follow/")
+        self.client.force_authenticate(self.reader)
+        return response
+
+    def titles(self, url="/api/vlogs/home/"):
+        page = self.client.get(url).json()
+        return [vlog["title"] for vlog in page["results"]], page
+
+    def test_fan_out_on_write_is_capped_and_backfilled(self):
+        self.post(self.author, "before follow")
+        self.assertEqual(self.follow(self.reader, self.author).status_code, 201)
+        self.assertEqual(self.follow(self.reader, self.author).status_code, 400)
+        self.assertEqual(self.follow(self.reader, self.reader).status_code, 400)
+        for i in range(4):
+            self.post(self.author, f"vlog {i}")
+        self.assertEqual(TimelineEntries.objects.filter(user=self.reader).count(), 3)
+
+        titles, page = self.titles("/api/vlogs/home/?page_size=2")
+        self.assertEqual(titles, ["vlog 3", "vlog 2"])
+        titles, page = self.titles(page["next"])
+        self.assertEqual(titles, ["vlog 1"])
+        self.assertIsNone(page["next"])
+
+        response = self.client.delete(f"/api/vlogs/users/{self.author.pk}/unfollow/")
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(self.titles()[0], [])
+        self.assertFalse(TimelineEntries.objects.exists())
+
+    def test_trim_only_touches_timelines_over_the_cap(self):
+        self.follow(self.reader, self.author)
+        vlogs = [self.post(self.author, f"vlog {i}") for i in range(3)]
+        with self.assertNumQueries(1):
+            timelines.trim([self.reader.pk, self.star.pk])
+
+        old = Vlogs.objects.create(title="old", description="description", user=self.star)
+        TimelineEntries.objects.create(user=self.reader, vlog=old, author=self.star,
+                                       posted_date=timezone.now() - timedelta(days=1))
+        timelines.trim([self.reader.pk, self.star.pk])
+        self.assertEqual(set(TimelineEntries.objects.filter(user=self.reader).values_list('vlog_id', flat=True)),
+                         {vlog.pk for vlog in vlogs})
+
+    def test_popular_authors_are_merged_on_read(self):
+        self.follow(self.reader, self.author)
+        self.post(self.star, "star 0")
+        for fan in range(2):
+            self.follow(User.objects.create_user(username=f"fan{fan}", password="Password1"), self.star)
+        self.assertEqual(self.follow(self.reader, self.star).status_code, 201)
+        self.assertEqual(Follows.objects.filter(author=self.star, fanout_on_read=True).count(), 3)
+        counts = FollowerCounts.objects.get(author=self.star)
+        self.assertEqual((counts.followers, counts.fanout_on_read), (3, True))
+
+        self.post(self.author, "author 0")
+        self.post(self.star, "star 1")
+        self.post(self.author, "author 1")
+        self.assertFalse(TimelineEntries.objects.filter(author=self.star, vlog__title="star 1").exists())
+
+        with self.assertNumQueries(5):
+            titles, page = self.titles("/api/vlogs/home/?page_size=3")
+        self.assertEqual(titles, ["author 1", "star 1", "author 0"])
+        titles, page = self.titles(page["next"])
+        self.assertEqual(titles, ["star 0"])
+        titles, page = self.titles(page["previous"])
+        self.assertEqual(titles, ["author 1", "star 1", "author 0"])
+
+        # Once merged on read, an author stays that way when followers leave.
+        self.client.delete(f"/api/vlogs/users/{self.star.pk}/unfollow/")
+        counts.refresh_from_db()
+        self.assertEqual((counts.followers, counts.fanout_on_read), (2, True))
+
+
+class TrendingTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.users = [User.objects.create_user(username=f"user{i}", password="Password1") for i in range(3)]
+        self.fresh = Vlogs.objects.create(title="fresh", description="description", user=self.users[0])
+        self.old = Vlogs.objects.create(title="old", description="description", user=self.users[0])
+        Vlogs.objects.filter(pk=self.old.pk).update(posted_date=timezone.now() - timedelta(hours=30))
+
+    def titles(self, queries=2):
+        # The ranked rows, then their cover derivatives.
+        with self.assertNumQueries(queries):
+            response = self.client.get("/api/vlogs/trending/")
+        return [vlog["title"] for vlog in response.json()["results"]]
+
+    def test_scores_follow_likes_comments_and_age(self):
+        self.assertEqual(self.titles(queries=1), [])
+        for user in self.users:
+            self.client.force_authenticate(user)
+            self.client.post(f"/api/vlogs/{self.old.pk}/like/")
+        self.client.post(f"/api/vlogs/{self.fresh.pk}/like/")
+        # One like on a new vlog outranks three on a day-old one.
+        self.assertEqual(self.titles(), ["fresh", "old"])
+
+        # Scores only age when decay_trending runs.
+        Vlogs.objects.filter(pk=self.fresh.pk).update(posted_date=timezone.now() - timedelta(hours=40))
+        self.assertEqual(self.titles(), ["fresh", "old"])
+        call_command("decay_trending", stdout=StringIO())
+        self.assertEqual(self.titles(), ["old", "fresh"])
+
+        self.client.post(f"/api/vlogs/{self.fresh.pk}/post-comment/", {"comment": "nice"})
+        self.client.put(f"/api/vlogs/{self.fresh.pk}/drop-like/")
+        self.assertEqual(self.titles(), ["old", "fresh"])
+        comment = Comments.objects.get()
+        self.client.delete(f"/api/vlogs/{self.fresh.pk}/delete-comment/{comment.pk}/")
+        self.assertEqual(self.titles(), ["old"])
+
+    @override_settings(VLOG_TRENDING_WINDOW_HOURS=24)
+    def test_decay_drops_vlogs_outside_the_window(self):
+        Vlogs.objects.update(likes=5)
+        call_command("decay_trending", stdout=StringIO())
+        self.assertEqual(self.titles(), ["fresh"])
+        self.assertEqual(Vlogs.objects.get(pk=self.old.pk).trending_score, 0)
+
+
+class ExportTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(username="author", password="Password1")
+        self.vlogs = [Vlogs.objects.create(title=f"vlog {i}", description="description", user=self.user)
+                      for i in range(5)]
+
+    def export(self, query=""):
+        response = self.client.get(f"/api/vlogs/export/{query}")
+        self.assertTrue(response.streaming)
+        self.assertEqual(response["Content-Type"], "application/x-ndjson")
+        lines = b"".join(response.streaming_content).decode().splitlines()
+        return response, [json.loads(line) for line in lines]
+
+    @override_settings(VLOG_EXPORT_CHUNK_SIZE=2, VLOG_EXPORT_SETTLE_SECONDS=0)
+    def test_export_streams_every_vlog_and_resumes_from_watermark(self):
+        response, rows = self.export()
+        self.assertEqual([row["title"] for row in rows], [f"vlog {i}" for i in range(5)])
+        self.assertEqual(rows[0]["user"], "author")
+        watermark = response["X-Export-Watermark"]
+
+        vlog = self.vlogs[1]
+        vlog.title = "renamed"
+        vlog.save()
+        response, rows = self.export(f"?updated_since={quote(watermark)}")
+        self.assertEqual([row["title"] for row in rows], ["renamed"])
+
+        response, rows = self.export(f"?updated_since={quote(response['X-Export-Watermark'])}")
+        self.assertEqual(rows, [])
+        self.assertEqual(self.client.get("/api/vlogs/export/?updated_since=yesterday").status_code, 400)
+
+    @override_settings(VLOG_EXPORT_SETTLE_SECONDS=60)
+    def test_recent_changes_wait_for_the_next_export(self):
+        Vlogs.objects.update(updated_date=timezone.now() - timedelta(minutes=5))
+        response, rows = self.export()
+        self.assertEqual(len(rows), 5)
+        watermark = response["X-Export-Watermark"]
+
+        add_like(self.user, self.vlogs[2])
+        response, rows = self.export(f"?updated_since={quote(watermark)}")
+        self.assertEqual(rows, [])
+
+        with self.settings(VLOG_EXPORT_SETTLE_SECONDS=0):
+            response, rows = self.export(f"?updated_since={quote(watermark)}")
+        self.assertEqual([(row["id"], row["likes"]) for row in rows], [(self.vlogs[2].pk, 1)])
+
+
+class ChangeFeedTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.admin = User.objects.create_superuser(username="admin", password="Password1")
+        self.client.force_authenticate(self.admin)
+        self.vlog = Vlogs.objects.create(title="vlog", description="description", user=self.admin)
+
+    def test_changes_are_logged_in_order_and_resumable(self):
+        self.client.post(f"/api/vlogs/{self.vlog.pk}/post-comment/", {"comment": "hi"})
+        self.client.post(f"/api/vlogs/{self.vlog.pk}/like/")
+        self.client.put(f"/api/vlogs/{self.vlog.pk}/drop-like/")
+        comment = Comments.objects.get()
+        self.client.delete(f"/api/vlogs/{self.vlog.pk}/delete-comment/{comment.pk}/")
+
+        data = self.client.get("/api/vlogs/changes/").json()
+        self.assertEqual([(c["kind"], c["action"]) for c in data["changes"]], [
+            ("vlog", "created"), ("comment", "created"), ("like", "created"), ("like", "deleted"),
+            ("comment", "deleted"),
+        ])
+        self.assertTrue(all(c["vlog"] == self.vlog.pk for c in data["changes"]))
+        self.assertEqual(data["last_seq"], data["changes"][-1]["seq"])
+
+        page = self.client.get(f"/api/vlogs/changes/?since={data['changes'][1]['seq']}&limit=2").json()
+        self.assertEqual([c["seq"] for c in page["changes"]], [c["seq"] for c in data["changes"][2:4]])
+        empty = self.client.get(f"/api/vlogs/changes/?since={data['last_seq']}").json()
+        self.assertEqual(empty, {"changes": [], "last_seq": data["last_seq"]})
+
+    def test_rolled_back_changes_are_not_logged(self):
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            Vlogs.objects.create(title="gone", description="description", user=self.admin)
+            raise RuntimeError
+        self.assertEqual(Changes.objects.count(), 1)
+
+    def test_read_waits_for_unsettled_gaps(self):
+        first = Changes.objects.get()
+        Changes.objects.create(id=first.id + 2, kind=Changes.VLOG, action=Changes.UPDATED,
+                               object_id=self.vlog.pk, vlog_id=self.vlog.pk)
+        self.assertEqual([c.id for c in changes.read(0, 10)], [first.id])
+        Changes.objects.filter(id=first.id + 2).update(created_at=timezone.now() - timedelta(minutes=1))
+        self.assertEqual([c.id for c in changes.read(0, 10)], [first.id, first.id + 2])
+
+    @override_settings(VLOG_CHANGES_STREAM_SECONDS=0)
+    def test_event_stream_resumes_from_last_event_id(self):
+        Comments.objects.create(vlog=self.vlog, user=self.admin, comment="hi")
+        first, second = Changes.objects.values_list("id", flat=True)
+        response = self.client.get("/api/vlogs/changes/", HTTP_ACCEPT="text/event-stream",
+                                   HTTP_LAST_EVENT_ID=str(first))
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+        body = b"".join(response.streaming_content).decode()
+        self.assertIn(f"id: {second}\nevent: change\n", body)
+        self.assertNotIn(f"id: {first}\n", body)
+
+    def test_requires_admin(self):
+        self.client.force_authenticate(User.objects.create_user(username="reader", password="Password1"))
+        self.assertEqual(self.client.get("/api/vlogs/changes/").status_code, 403)
+
+    @override_settings(VLOG_CHANGES_MAX_STREAMS=1, VLOG_CHANGES_STREAM_SECONDS=0)
+    def test_waiting_clients_are_capped(self):
+        held = self.client.get("/api/vlogs/changes/", HTTP_ACCEPT="text/event-stream")
+        self.assertEqual(changes.streams.active, 1)
+        busy = self.client.get("/api/vlogs/changes/?wait=5")
+        self.assertEqual(busy.status_code, 503)
+        self.assertEqual(busy["Retry-After"], "1")
+        self.assertEqual(self.client.get("/api/vlogs/changes/").status_code, 200)
+
+        held.close()
+        self.assertEqual(changes.streams.active, 0)
+        response = self.client.get("/api/vlogs/changes/", HTTP_ACCEPT="text/event-stream")
+        b"".join(response.streaming_content)
+        response.close()
+        self.assertEqual(changes.streams.active, 0)
+
+    def test_prune_changes(self):
+        Changes.objects.update(created_at=timezone.now() - timedelta(days=40))
+        Comments.objects.create(vlog=self.vlog, user=self.admin, comment="recent")
+        call_command("prune_changes", stdout=StringIO())
+        self.assertEqual(list(Changes.objects.values_list("kind", flat=True)), [Changes.COMMENT])
+
+
+class AsyncReadViewsTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.async_client = AsyncClient()
+        self.user = User.objects.create_user(username="author", password="Password1")
+        for i in range(5):
+            vlog = Vlogs.objects.create(title=f"vlog {i}", description="description", user=self.user)
+            Images.objects.create(vlog=vlog, image=f"uploads/images/{i}.png")
+            Comments.objects.create(vlog=vlog, user=self.user, comment=f"comment {i}")
+        self.vlog = vlog
+
+    def request_async(self, method, path, **kwargs):
+        """Drive the coroutine views through AsyncClient from a sync test, so query counting works."""
+        async def send():
+            return await getattr(self.async_client, method)(path, **kwargs)
+        return async_to_sync(send)()
+
+    def get_async(self, path, **kwargs):
+        return self.request_async("get", path, **kwargs)
+
+    def test_feed_pages_match_sync_view(self):
+        with self.assertNumQueries(2):
+            response = self.get_async("/api/vlogs/async/?page_size=2")
+        page = response.json()
+        self.assertEqual([v["title"] for v in page["results"]], ["vlog 4", "vlog 3"])
+        self.assertIsNone(page["previous"])
+
+        page = self.get_async(page["next"]).json()
+        self.assertEqual([v["title"] for v in page["results"]], ["vlog 2", "vlog 1"])
+        back = self.get_async(page["previous"]).json()
+        self.assertEqual([v["title"] for v in back["results"]], ["vlog 4", "vlog 3"])
+        self.assertIsNone(back["previous"])
+
+        sync_page = self.client.get("/api/vlogs/?page_size=2").json()
+        async_page = self.get_async("/api/vlogs/async/?page_size=2").json()
+        self.assertEqual(async_page["results"], sync_page["results"])
+        self.assertEqual(self.get_async("/api/vlogs/async/?cursor=bogus").status_code, 404)
+
+    def test_detail_matches_sync_view_and_honours_etag(self):
+        url = f"/api/vlogs/async/{self.vlog.pk}/"
+        with self.assertNumQueries(8):
+            response = self.get_async(url)
+        sync_data = self.client.get(f"/api/vlogs/{self.vlog.pk}/").json()
+        self.assertEqual(response.json(), sync_data)
+
+        with self.assertNumQueries(1):
+            response = self.get_async(url, headers={"If-None-Match": response["ETag"]})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(self.get_async("/api/vlogs/async/999/").status_code, 404)
+        self.assertEqual(self.request_async("post", url).status_code, 405)
+
+    def test_comment_listing(self):
+        for i in range(3):
+            Comments.objects.create(vlog=self.vlog, user=self.user, comment=f"reply {i}")
+        page = self.get_async(f"/api/vlogs/async/{self.vlog.pk}/comments/?page_size=2").json()
+        self.assertEqual([c["comment"] for c in page["results"]], ["reply 2", "reply 1"])
+        page = self.get_async(page["next"]).json()
+        self.assertEqual([c["comment"] for c in page["results"]], ["reply 0", "comment 4"])
+        self.assertIsNone(page["next"])
+        self.assertEqual(self.get_async("/api/vlogs/async/999/comments/").status_code, 404)
+
+
+class InstrumentationTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(username="author", password="Password1")
+        self.vlog = Vlogs.objects.create(title="vlog", description="description", user=self.user)
+
+    def test_server_timing_reports_queries(self):
+        response = self.client.get("/api/vlogs/")
+        timing = response["Server-Timing"]
+        self.assertIn('db;dur=', timing)
+        self.assertIn('desc="2 queries"', timing)
+        self.assertIn('serialize;dur=', timing)
+        self.assertIn('total;dur=', timing)
+
+    def test_async_views_report_queries(self):
+        async def get():
+            return await AsyncClient().get("/api/vlogs/async/")
+
+        response = async_to_sync(get)()
+        self.assertIn('desc="2 queries"', response["Server-Timing"])
+
+    def test_metrics_endpoint(self):
+        self.client.get(f"/api/vlogs/{self.vlog.pk}/")
+        response = self.client.get("/metrics")
+        self.assertEqual(response.status_code, 200)
+        body = response.content.decode()
+        self.assertIn("# TYPE vlog_http_request_duration_seconds histogram", body)
+        self.assertIn('vlog_http_requests_total{view="vlog-view",method="GET",status="200"}', body)
+        self.assertIn('vlog_http_request_db_queries_bucket{view="vlog-view",method="GET",le="+Inf"}', body)
+
+    @override_settings(VLOG_METRICS_ALLOWED_IPS=["10.0.0.1"])
+    def test_metrics_endpoint_allow_list(self):
+        self.assertEqual(self.client.get("/metrics").status_code, 403)
+
+    def test_metrics_endpoint_is_loopback_only_by_default(self):
+        self.assertEqual(self.client.get("/metrics", REMOTE_ADDR="203.0.113.7").status_code, 403)
+
+    @override_settings(VLOG_EXPORT_SETTLE_SECONDS=0)
+    def test_streamed_queries_count_against_the_budget(self):
+        with mock.patch("main.views.VlogsExportView.query_budget", 0, create=True):
+            response = self.client.get("/api/vlogs/export/")
+            with self.assertRaises(QueryBudgetExceeded):
+                b"".join(response.streaming_content)
+
+    def test_query_budget_exceeded(self):
+        with mock.patch("main.views.VlogsTrendingView.query_budget", 0):
+            with self.assertRaises(QueryBudgetExceeded):
+                self.client.get("/api/vlogs/trending/")
+        with override_settings(VLOG_QUERY_BUDGET_STRICT=False), mock.patch(
+            "main.views.VlogsTrendingView.query_budget", 0
+        ):
+            with self.assertLogs("main.instrumentation", "WARNING"):
+                self.assertEqual(self.client.get("/api/vlogs/trending/").status_code, 200)
+
+
+class SQLiteTuningTest(TestCase):
+    def test_profile_pragmas_and_transaction_mode(self):
+        with tempfile.TemporaryDirectory() as directory:
+            settings_dict = {**connection.settings_dict, **settings_sqlite.DATABASES["default"],
+                             "NAME": f"{directory}/tuned.sqlite3"}
+            wrapper = DatabaseWrapper(settings_dict)
+            try:
+                with wrapper.cursor() as cursor:
+                    cursor.execute("PRAGMA journal_mode")
+                    self.assertEqual(cursor.fetchone()[0], "wal")
+                    cursor.execute("PRAGMA synchronous")
+                    self.assertEqual(cursor.fetchone()[0], 1)
+                    cursor.execute("PRAGMA busy_timeout")
+                    self.assertEqual(cursor.fetchone()[0], 5000)
+                self.assertEqual(wrapper.transaction_mode, "IMMEDIATE")
+            finally:
+                wrapper.close()
+
+    def test_default_settings_leave_the_journal_mode_alone(self):
+        self.assertEqual(connection.settings_dict["ENGINE"], "django.db.backends.sqlite3")
+
+
+@override_settings(VLOG_READ_REPLICAS=["replica"])
+class ReadReplicaTest(TransactionTestCase):
+    """
+    A second SQLite file stands in for a replica that has not caught up with the
+    primary. The copy is taken with SQLite's backup API, which cannot run inside
+    TestCase's open transaction.
+    """
+
+    def setUp(self):
+        cache.clear()
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.add_database("replica", f"{directory}/replica.sqlite3")
+        self.add_database("broken", f"{directory}/missing/broken.sqlite3")
+        self.addCleanup(replicas._down_until.clear)
+
+        self.user = User.objects.create_user(username="reader", password="Password1")
+        self.vlog = Vlogs.objects.create(title="fresh", description="description", user=self.user)
+        call_command("sync_sqlite_replicas", stdout=StringIO())
+        with connections["replica"].cursor() as cursor:
+            cursor.execute("UPDATE main_vlogs SET title = 'stale'")
+        self.client = APIClient()
+
+    def add_database(self, alias, name):
+        connections.settings[alias] = {**connections["default"].settings_dict, "NAME": name}
+
+        def remove():
+            connections[alias].close()
+            del connections.settings[alias]
+            if hasattr(connections._connections, alias):
+                delattr(connections._connections, alias)
+        self.addCleanup(remove)
+
+    def title(self):
+        return self.client.get(f"/api/vlogs/{self.vlog.pk}/").json()["title"]
+
+    def test_reads_go_to_replica_until_the_user_writes(self):
+        self.assertEqual(self.title(), "stale")
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {AccessToken.for_user(self.user)}")
+        self.assertEqual(self.title(), "stale")
+
+        response = self.client.post(f"/api/vlogs/{self.vlog.pk}/like/")
+        self.assertEqual(response.status_code, 201)
+        self.assertTrue(Like.objects.using("default").filter(user=self.user, vlog=self.vlog).exists())
+        self.assertEqual(self.title(), "fresh")
+
+        # Only the writer is pinned to the primary.
+        self.client.credentials()
+        self.assertEqual(self.title(), "stale")
+
+    def test_unreachable_replica_is_skipped(self):
+        with override_settings(VLOG_READ_REPLICAS=["broken", "replica"]), self.assertLogs("main.replicas"):
+            self.assertEqual({self.title() for _ in range(4)}, {"stale"})
+        self.assertIn("broken", replicas._down_until)
+
+    def test_writes_and_migrations_stay_on_primary(self):
+        router = replicas.ReplicaRouter()
+        self.assertEqual(router.db_for_write(Vlogs), "default")
+        self.assertFalse(router.allow_migrate("replica", "main"))
+        self.assertIsNone(router.allow_migrate("default", "main"))
+
+
+class BenchmarkTest(TestCase):
+    def test_seed(self):
+        dataset = benchmarks.seed(users=4, vlogs=6, images=2, comments=3, likes=2)
+        self.assertEqual(len(dataset.users), 4)
+        self.assertEqual(Images.objects.count(), 12)
+        self.assertEqual(Comments.objects.count(), 18)
+        self.assertEqual(Like.objects.count(), 12)
+        for vlog in Vlogs.objects.all():
+            self.assertEqual(vlog.likes, Like.objects.filter(vlog=vlog).count())
+        # Bench user i never likes vlog i, so the like scenario starts from a clean slate.
+        for index, vlog_id in enumerate(dataset.vlogs):
+            self.assertFalse(Like.objects.filter(user_id=dataset.users[index % 4][0], vlog_id=vlog_id).exists())
+        benchmarks.seed(users=2, vlogs=1, images=0, comments=0, likes=0)
+        self.assertEqual(User.objects.count(), 2)
+
+    def test_real_bench_named_users_are_left_alone(self):
+        dataset = benchmarks.seed(users=2, vlogs=1, images=0, comments=0, likes=0)
+        real = User.objects.create_user(username="bench-press", password="Password1")
+        with self.assertRaises(benchmarks.BenchmarkError):
+            benchmarks.seed(users=2, vlogs=1, images=0, comments=0, likes=0)
+        benchmarks.remove(dataset)
+        self.assertEqual(list(User.objects.all()), [real])
+
+    def test_scenarios_in_process(self):
+        dataset = benchmarks.seed(users=3, vlogs=3, images=1, comments=1, likes=1)
+        expected = {
+            "feed": {"200": 6},
+            "detail": {"200": 6},
+            "like": {"201": 3, "204": 3},
+            "comment": {"201": 6},
+            "login": {"200": 6},
+        }
+        for scenario, statuses in expected.items():
+            with self.subTest(scenario):
+                summary = benchmarks.run_inprocess(dataset, scenario, requests=6, clients=3, warmup=2).summary()
+                self.assertEqual(summary["statuses"], statuses)
+                self.assertEqual(summary["requests"], 6)
+        for vlog in Vlogs.objects.all():
+            self.assertEqual(vlog.likes, Like.objects.filter(vlog=vlog).count())
+
+
+@override_settings(VLOG_DERIVATIVES_ASYNC=False, VLOG_TRANSCODE_ASYNC=False, VLOG_TIMELINE_ASYNC=False,
+                   VLOG_TRANSCODE_ENCODER="main.transcoding.StubEncoder")
+class BulkImportTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        settings = override_settings(MEDIA_ROOT=self.media_root)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.admin = User.objects.create_superuser(username="admin", password="Password1")
+
+    def archive(self, lines, files):
+        buffer = BytesIO()
+        with zipfile.ZipFile(buffer, "w") as archive:
+            archive.writestr("manifest.ndjson", "\n".join(json.dumps(line) for line in lines))
+            for name, content in files.items():
+                archive.writestr(name, content)
+        return SimpleUploadedFile("import.zip", buffer.getvalue(), content_type="application/zip")
+
+    def test_import_archive(self):
+        lines = [
+            {"title": "first", "description": "d", "videos": ["a.mp4"], "documents": ["notes.txt"]},
+            {"title": "second", "description": "d", "videos": ["a.mp4", "b.mp4"]},
+            {"title": "broken", "description": "d", "videos": ["missing.mp4"]},
+            {"title": "invalid", "videos": ["virus.exe"]},
+        ]
+        archive = self.archive(lines, {"a.mp4": b"a", "b.mp4": b"b", "notes.txt": b"n"})
+        client = APIClient()
+        client.force_authenticate(self.admin)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = client.post("/api/vlogs/import/", {"archive": archive}, format="multipart")
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()["created"], 2)
+        self.assertEqual(sorted(error["line"] for error in response.json()["errors"]), [3, 4])
+        first = Vlogs.objects.get(title="first")
+        self.assertEqual(first.user, self.admin)
+        self.assertEqual(first.videos.count(), 1)
+        self.assertEqual(first.documents.get().document.read(), b"n")
+        self.assertEqual(Vlogs.objects.get(title="second").videos.count(), 2)
+        self.assertEqual(TranscodeJobs.objects.filter(status=TranscodeJobs.DONE).count(), 3)
+        self.assertEqual(len(client.get("/api/vlogs/search/?q=second").json()["results"]), 1)
+
+    def test_unexpected_write_error_removes_the_batch_files(self):
+        lines = [{"title": "first", "description": "d", "videos": ["a.mp4", "b.mp4"]}]
+        archive = self.archive(lines, {"a.mp4": b"a", "b.mp4": b"b"})
+        store = bulk_import.store
+
+        def flaky_store(instance, field_name, f, name):
+            if name == "b.mp4":
+                raise ValueError("unexpected")
+            return store(instance, field_name, f, name)
+
+        client = APIClient(raise_request_exception=True)
+        client.force_authenticate(self.admin)
+        with mock.patch("main.bulk_import.store", side_effect=flaky_store), self.assertRaises(ValueError):
+            client.post("/api/vlogs/import/", {"archive": archive}, format="multipart")
+        self.assertFalse(Vlogs.objects.exists())
+        self.assertEqual([path for path in Path(self.media_root).rglob("*") if path.is_file()], [])
+
+        response = client.post("/api/vlogs/import/", {"archive": self.archive(lines, {})}, format="multipart")
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(response.json()["errors"]), 1)
+        response = client.post("/api/vlogs/import/", {"archive": SimpleUploadedFile("a.zip", b"nope")},
+                               format="multipart")
+        self.assertEqual(response.status_code, 400)
+
+    def test_import_command_from_manifest_directory(self):
+        source = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, source)
+        with open(f"{source}/clip.mp4", "wb") as f:
+            f.write(b"clip")
+        Image.new("RGB", (10, 10), "blue").save(f"{source}/cover.png")
+        with open(f"{source}/manifest.ndjson", "w") as f:
+            f.write(json.dumps({"title": "from disk", "description": "d", "videos": ["clip.mp4"],
+                                "cover": "cover.png", "images": ["cover.png"]}) + "\n")
+            f.write(json.dumps({"title": "escape", "description": "d", "videos": ["../clip.mp4"]}) + "\n")
+
+        call_command("import_vlogs", f"{source}/manifest.ndjson", "--user", "admin", "--no-media-jobs",
+                     stdout=StringIO(), stderr=StringIO())
+        self.assertEqual(Vlogs.objects.get().title, "from disk")
+        self.assertEqual(Videos.objects.get().video.read(), b"clip")
+        self.assertFalse(ImageDerivatives.objects.exists())
+
+        with override_settings(VLOG_DERIVATIVE_WIDTHS=(320,), VLOG_DERIVATIVE_FORMATS=("webp",)):
+            call_command("generate_derivatives", stdout=StringIO())
+        self.assertEqual(ImageDerivatives.objects.filter(image=Images.objects.get()).count(), 1)
+        self.assertEqual(ImageDerivatives.objects.filter(vlog=Vlogs.objects.get()).count(), 1)
+
+
+@override_settings(VLOG_DERIVATIVES_ASYNC=False, VLOG_TRANSCODE_ASYNC=False, VLOG_TIMELINE_ASYNC=False,
+                   VLOG_TRANSCODE_ENCODER="main.transcoding.StubEncoder")
+class VlogPostStorageTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        settings = override_settings(MEDIA_ROOT=self.media_root)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_superuser(username="admin", password="Password1"))
+
+    def image(self, name):
+        buffer = BytesIO()
+        Image.new("RGB", (10, 10), "blue").save(buffer, "PNG")
+        return SimpleUploadedFile(name, buffer.getvalue(), content_type="image/png")
+
+    def stored_files(self):
+        return sorted(path.name for path in Path(self.media_root, "uploads").rglob("*") if path.is_file())
+
+    def test_post_writes_all_files(self):
+        response = self.client.post("/api/vlogs/post/", {
+            "title": "vlog", "description": "description", "cover": self.image("cover.png"),
+            "uploaded_images": [self.image("one.png"), self.image("two.png")],
+            "uploaded_videos": [SimpleUploadedFile("clip.mp4", b"clip")],
+        }, format="multipart")
+        self.assertEqual(response.status_code, 201)
+        vlog = Vlogs.objects.get()
+        self.assertTrue(vlog.cover.name.endswith("cover.png"))
+        self.assertEqual(sorted(Path(image.image.name).name for image in vlog.images.all()), ["one.png", "two.png"])
+        self.assertEqual(vlog.videos.get().video.read(), b"clip")
+
+    def test_failed_insert_removes_written_files(self):
+        with mock.patch.object(Images, "save", side_effect=RuntimeError("db down")):
+            with self.assertRaises(RuntimeError):
+                self.client.post("/api/vlogs/post/", {
+                    "title": "vlog", "description": "description",
+                    "uploaded_images": [self.image("one.png")],
+                    "uploaded_documents": [SimpleUploadedFile("notes.txt", b"notes")],
+                }, format="multipart")
+        self.assertFalse(Vlogs.objects.exists())
+        self.assertEqual(self.stored_files(), [])
+
+
+class ContentAddressedStorageTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        settings = override_settings(MEDIA_ROOT=self.media_root, VLOG_DERIVATIVES_ASYNC=False)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.admin = User.objects.create_superuser(username="admin", password="Password1")
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+        self.vlog = Vlogs.objects.create(title="vlog", description="description", user=self.admin)
+
+    def document(self, content):
+        return SimpleUploadedFile("notes.txt", content)
+
+    @override_settings(VLOG_MEDIA_DEDUPLICATE=True, VLOG_BLOB_REUSE_GRACE_SECONDS=0)
+    def test_identical_uploads_share_one_blob(self):
+        first = Documents.objects.create(vlog=self.vlog, document=self.document(b"same"))
+        second = Documents.objects.create(vlog=self.vlog, document=self.document(b"same"))
+        self.assertEqual(first.document.name, second.document.name)
+        self.assertTrue(first.document.name.startswith("uploads/blobs/"))
+        self.assertEqual(Blobs.objects.get().refcount, 2)
+        path = Path(first.document.path)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.delete(f"/api/vlogs/{self.vlog.pk}/document/{first.pk}/")
+        self.assertEqual(response.status_code, 204)
+        self.assertTrue(path.exists())
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.delete(f"/api/vlogs/{self.vlog.pk}/document/{second.pk}/")
+        self.assertFalse(path.exists())
+        self.assertFalse(Blobs.objects.exists())
+
+    @override_settings(VLOG_MEDIA_DEDUPLICATE=True)
+    def test_recently_stored_blob_survives_collection(self):
+        first = Documents.objects.create(vlog=self.vlog, document=self.document(b"same"))
+        name, path = first.document.name, Path(first.document.path)
+        with self.captureOnCommitCallbacks(execute=True):
+            first.delete()
+        # Stored moments ago, so an upload reusing it may not have saved its row yet.
+        self.assertTrue(path.exists())
+        self.assertEqual(Blobs.objects.get(name=name).refcount, 0)
+
+        storage.retain([name])
+        storage.retain(["uploads/blobs/aa/bb/missing.txt"])
+        self.assertEqual(dict(Blobs.objects.values_list("name", "refcount")),
+                         {name: 1, "uploads/blobs/aa/bb/missing.txt": 1})
+
+        Blobs.objects.filter(name=name).update(refcount=0, stored_at=timezone.now() - timedelta(hours=2))
+        storage.collect([name])
+        self.assertFalse(path.exists())
+        self.assertFalse(Blobs.objects.filter(name=name).exists())
+
+    @override_settings(VLOG_MEDIA_DEDUPLICATE=True)
+    def test_unretained_blob_is_left_to_collection(self):
+        # What a rolled-back upload leaves behind: a stored blob no row ever retained.
+        name = storage.media_storage.save("notes.txt", ContentFile(b"orphan"))
+        path = Path(storage.media_storage.path(name))
+        storage.media_storage.delete(name)
+        self.assertTrue(path.exists())
+
+        call_command("collect_orphaned_media", "--min-age", "0", stdout=StringIO())
+        self.assertTrue(path.exists())
+
+        with override_settings(VLOG_BLOB_REUSE_GRACE_SECONDS=0):
+            call_command("collect_orphaned_media", stdout=StringIO())
+        self.assertFalse(path.exists())
+        self.assertFalse(Blobs.objects.exists())
+
+    def test_dedupe_existing_media(self):
+        first = Documents.objects.create(vlog=self.vlog, document=self.document(b"same"))
+        second = Documents.objects.create(vlog=self.vlog, document=self.document(b"same"))
+        Documents.objects.create(vlog=self.vlog, document=self.document(b"other"))
+        legacy = Path(first.document.path)
+
+        with override_settings(VLOG_MEDIA_DEDUPLICATE=True):
+            call_command("dedupe_media", stdout=StringIO())
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertEqual(first.document.name, second.document.name)
+        self.assertEqual(first.document.read(), b"same")
+        self.assertFalse(legacy.exists())
+        self.assertEqual(sorted(Blobs.objects.values_list("refcount", flat=True)), [1, 2])
+
+        Blobs.objects.update(refcount=7)
+        with override_settings(VLOG_MEDIA_DEDUPLICATE=True):
+            call_command("dedupe_media", "--recount", stdout=StringIO())
+        self.assertEqual(sorted(Blobs.objects.values_list("refcount", flat=True)), [1, 2])
+
+
+class OrphanedMediaTest(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        settings = override_settings(MEDIA_ROOT=self.media_root)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        user = User.objects.create_user(username="author", password="Password1")
+        self.vlog = Vlogs.objects.create(title="vlog", description="description", user=user)
+        self.kept = Documents.objects.create(vlog=self.vlog, document=SimpleUploadedFile("kept.txt", b"kept"))
+        self.orphans = []
+        for i in range(3):
+            document = Documents.objects.create(vlog=self.vlog, document=SimpleUploadedFile(f"gone{i}.txt", b"x"))
+            self.orphans.append(Path(document.document.path))
+        Documents.objects.exclude(pk=self.kept.pk).delete()
+
+    def test_dry_run_then_delete(self):
+        out = StringIO()
+        call_command("collect_orphaned_media", "--dry-run", "--min-age", "0", stdout=out)
+        self.assertIn("Would delete 3 orphan(s)", out.getvalue())
+        self.assertTrue(all(path.exists() for path in self.orphans))
+
+        call_command("collect_orphaned_media", "--on-disk-index", "--min-age", "0", "--batch-size", "1",
+                     stdout=StringIO())
+        self.assertFalse(any(path.exists() for path in self.orphans))
+        self.assertTrue(Path(self.kept.document.path).exists())
+
+    def test_recent_files_and_resume(self):
+        call_command("collect_orphaned_media", stdout=StringIO())
+        self.assertTrue(all(path.exists() for path in self.orphans))
+
+        state_file = Path(self.media_root, "gc-state")
+        names = sorted(str(path.relative_to(self.media_root)) for path in self.orphans)
+        state_file.write_text(names[0])
+        call_command("collect_orphaned_media", "--min-age", "0", "--state-file", str(state_file), stdout=StringIO())
+        self.assertEqual([path.exists() for path in sorted(self.orphans)], [True, False, False])
+        self.assertFalse(state_file.exists())
+
+
+class SearchTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(username="author", password="Password1")
+
+    def test_ranked_search_follows_changes(self):
+        in_title = Vlogs.objects.create(title="Mountain hiking", description="a walk", user=self.user)
+        in_text = Vlogs.objects.create(title="Weekend", description="we went hiking in the hills", user=self.user)
+        Vlogs.objects.create(title="Cooking", description="pasta", user=self.user)
+
+        results = self.client.get("/api/vlogs/search/?q=hiking").json()["results"]
+        self.assertEqual([vlog["id"] for vlog in results], [in_title.pk, in_text.pk])
+        self.assertEqual(len(self.client.get("/api/vlogs/search/?q=hik").json()["results"]), 2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Comments.objects.create(vlog=in_text, user=self.user, comment="lovely sunset")
+        results = self.client.get("/api/vlogs/search/?q=sunset").json()["results"]
+        self.assertEqual([vlog["id"] for vlog in results], [in_text.pk])
+
+        in_title.delete()
+        self.assertEqual(len(self.client.get("/api/vlogs/search/?q=hiking").json()["results"]), 1)
+        self.assertEqual(self.client.get("/api/vlogs/search/?q=").status_code, 400)
+
+    def test_comment_writes_reindex_once_per_vlog(self):
+        vlog = Vlogs.objects.create(title="Busy", description="description", user=self.user)
+        with mock.patch("main.search.index_vlogs", wraps=search.index_vlogs) as index_vlogs:
+            with self.captureOnCommitCallbacks(execute=True):
+                for text in ("first", "second", "third"):
+                    Comments.objects.create(vlog=vlog, user=self.user, comment=text)
+            index_vlogs.assert_called_once_with([vlog.pk])
+            self.assertEqual(len(self.client.get("/api/vlogs/search/?q=third").json()["results"]), 1)
+
+            index_vlogs.reset_mock()
+            with self.captureOnCommitCallbacks(execute=True):
+                vlog.delete()
+            index_vlogs.assert_not_called()
+
+    def test_rebuild_search_index(self):
+        vlog = Vlogs.objects.create(title="Rebuild me", description="description", user=self.user)
+        with connection.cursor() as cursor:
+            cursor.execute("DELETE FROM main_vlogs_fts")
+        self.assertEqual(self.client.get("/api/vlogs/search/?q=rebuild").json()["results"], [])
+        call_command("rebuild_search_index", stdout=StringIO())
+        results = self.client.get("/api/vlogs/search/?q=rebuild").json()["results"]
+        self.assertEqual([result["id"] for result in results], [vlog.pk])
+
+
+@override_settings(VLOG_LIKES_BUFFERED=True)
+class BufferedLikesTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(username="fan", password="Password1")
+        self.vlog = Vlogs.objects.create(title="vlog", description="description", user=self.user)
+        self.client.force_authenticate(self.user)
+
+    def test_buffered_likes_are_visible_before_and_after_flush(self):
+        response = self.client.post(f"/api/vlogs/{self.vlog.pk}/like/")
+        self.assertEqual(response.status_code, 202)
+        response = self.client.post(f"/api/vlogs/{self.vlog.pk}/like/")
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Like.objects.exists())
+        response = self.client.get(f"/api/vlogs/{self.vlog.pk}/")
+        self.assertEqual(response.json()["likes"], 1)
+        self.assertFalse(response.has_header("Last-Modified"))
+
+        call_command("flush_likes", stdout=StringIO())
+        self.vlog.refresh_from_db()
+        self.assertEqual(self.vlog.likes, 1)
+        self.assertTrue(Like.objects.filter(user=self.user, vlog=self.vlog).exists())
+        self.assertEqual(self.client.get(f"/api/vlogs/{self.vlog.pk}/").json()["likes"], 1)
+
+        response = self.client.put(f"/api/vlogs/{self.vlog.pk}/drop-like/")
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(self.client.get(f"/api/vlogs/{self.vlog.pk}/").json()["likes"], 0)
+        call_command("flush_likes", stdout=StringIO())
+        self.vlog.refresh_from_db()
+        self.assertEqual(self.vlog.likes, 0)
+        self.assertFalse(Like.objects.exists())
+
+    def test_feed_reads_pending_likes_once_per_page(self):
+        for i in range(3):
+            Vlogs.objects.create(title=f"vlog {i}", description="description", user=self.user)
+        self.client.post(f"/api/vlogs/{self.vlog.pk}/like/")
+        with mock.patch("main.serializers.pending_like_deltas", wraps=pending_like_deltas) as lookup:
+            results = self.client.get("/api/vlogs/").json()["results"]
+        self.assertEqual(lookup.call_count, 1)
+        self.assertEqual({vlog["id"]: vlog["likes"] for vlog in results}[self.vlog.pk], 1)
+
+    def test_concurrent_toggle_is_refused(self):
+        buffer_cache = likes.get_buffer_cache()
+        buffer_cache.add(likes._claim_key(self.vlog.pk, self.user.pk), 1)
+        self.assertEqual(self.client.post(f"/api/vlogs/{self.vlog.pk}/like/").status_code, 400)
+        self.assertEqual(pending_like_deltas([self.vlog.pk]), {})
+
+        buffer_cache.delete(likes._claim_key(self.vlog.pk, self.user.pk))
+        self.assertEqual(self.client.post(f"/api/vlogs/{self.vlog.pk}/like/").status_code, 202)
+        with self.assertNumQueries(0):
+            self.assertFalse(likes.buffer_like(self.user, self.vlog))
@@ -0,0 +1,138 @@
+"""
+Home timelines.
+
+When a vlog is created it is fanned out on write: a ``TimelineEntries`` row is
+inserted for every follower of its author, in batches on the ``timelines`` pool, and
+each follower's timeline is trimmed to the newest ``VLOG_TIMELINE_LENGTH`` entries.
+Authors with more than ``VLOG_FANOUT_MAX_FOLLOWERS`` followers are not fanned out;
+every edge to them is flagged ``fanout_on_read`` and their vlogs are merged into the
+home feed at read time instead. Either way a home page is read with a bounded number
+of ``LIMIT page_size`` range reads, independent of how many authors a user follows.
+
+The switch is decided from the author's ``FollowerCounts`` row, which every follow
+locks, so an edge can never disagree with the others on how its author is read.
+Followers lost when a follower's account is deleted are not subtracted; the count
+only decides when to switch, and switching early is harmless.
+"""
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import IntegrityError, transaction
+from django.db.models import F, OuterRef, Q, Subquery
+
+from .models import FollowerCounts, Follows, TimelineEntries, Vlogs
+from .workers import WorkerPool
+
+pool = WorkerPool('timelines', 'VLOG_TIMELINE_WORKERS', 'VLOG_TIMELINE_ASYNC')
+
+FANOUT_BATCH_SIZE = 1000
+
+
+def timeline_length():
+    return getattr(settings, 'VLOG_TIMELINE_LENGTH', 800)
+
+
+def max_fanout_followers():
+    return getattr(settings, 'VLOG_FANOUT_MAX_FOLLOWERS', 10000)
+
+
+def fans_out_on_read(author_id):
+    return FollowerCounts.objects.filter(author_id=author_id, fanout_on_read=True).exists()
+
+
+def follow(follower, author):
+    """Make ``follower`` follow ``author``. Returns the new ``Follows`` or ``None`` if already following."""
+    try:
+        with transaction.atomic():
+            FollowerCounts.objects.bulk_create([FollowerCounts(author=author)], ignore_conflicts=True)
+            counts = FollowerCounts.objects.select_for_update().get(author=author)
+            edge = Follows.objects.create(follower=follower, author=author, fanout_on_read=counts.fanout_on_read)
+            counts.followers += 1
+            if not counts.fanout_on_read and counts.followers > max_fanout_followers():
+                # The author just outgrew fan-out on write; their existing entries stay and are de-duplicated on read.
+                Follows.objects.filter(author=author).update(fanout_on_read=True)
+                counts.fanout_on_read = edge.fanout_on_read = True
+            counts.save(update_fields=['followers', 'fanout_on_read'])
+    except IntegrityError:
+        return None
+    if not edge.fanout_on_read:
+        pool.schedule(backfill, follower.pk, author.pk)
+    return edge
+
+
+def unfollow(follower, author):
+    """Returns ``False`` if ``follower`` was not following ``author``."""
+    with transaction.atomic():
+        deleted, _ = Follows.objects.filter(follower=follower, author=author).delete()
+        if deleted:
+            FollowerCounts.objects.filter(author=author).update(followers=F('followers') - deleted)
+            TimelineEntries.objects.filter(user=follower, author=author).delete()
+    return bool(deleted)
+
+
+def entry(user_id, vlog):
+    return TimelineEntries(user_id=user_id, vlog_id=vlog.pk, author_id=vlog.user_id, posted_date=vlog.posted_date)
+
+
+def backfill(follower_id, author_id):
+    """Copy the newest vlogs of a newly followed author into the follower's timeline."""
+    vlogs = Vlogs.objects.filter(user_id=author_id).order_by('-posted_date', '-id').only(
+        'id', 'user_id', 'posted_date'
+    )[:timeline_length()]
+    TimelineEntries.objects.bulk_create([entry(follower_id, vlog) for vlog in vlogs], ignore_conflicts=True)
+    trim([follower_id])
+
+
+def fan_out(vlog_id):
+    """Insert ``vlog_id`` into its author's followers' timelines. Returns the number of followers reached."""
+    vlog = Vlogs.objects.filter(pk=vlog_id).only('id', 'user_id', 'posted_date').first()
+    if vlog is None or fans_out_on_read(vlog.user_id):
+        return 0
+    followers = Follows.objects.filter(author_id=vlog.user_id).order_by('pk').values_list('pk', 'follower_id')
+    reached, last = 0, 0
+    while True:
+        batch = list(followers.filter(pk__gt=last)[:FANOUT_BATCH_SIZE])
+        if not batch:
+            return reached
+        last = batch[-1][0]
+        user_ids = [follower_id for _, follower_id in batch]
+        TimelineEntries.objects.bulk_create([entry(user_id, vlog) for user_id in user_ids], ignore_conflicts=True)
+        trim(user_ids)
+        reached += len(user_ids)
+
+
+def trim(user_ids):
+    """Delete everything past the newest ``VLOG_TIMELINE_LENGTH`` entries of each user's timeline."""
+    # The first entry past the cap, found per user by an OFFSET seek on the timeline index;
+    # users whose timeline is within the cap have none and are left alone.
+    past_cap = TimelineEntries.objects.filter(user_id=OuterRef('pk')).order_by('-posted_date', '-vlog_id')
+    boundary = slice(timeline_length(), timeline_length() + 1)
+    boundaries = User.objects.filter(pk__in=user_ids).annotate(
+        boundary_date=Subquery(past_cap.values('posted_date')[boundary]),
+        boundary_vlog=Subquery(past_cap.values('vlog_id')[boundary]),
+    ).filter(boundary_vlog__isnull=False).values_list('pk', 'boundary_date', 'boundary_vlog')
+    condition = Q()
+    for user_id, posted_date, vlog_id in boundaries:
+        condition |= Q(user_id=user_id) & (Q(posted_date__lt=posted_date) | Q(posted_date=posted_date,
+                                                                            vlog_id__lte=vlog_id))
+    if condition:
+        TimelineEntries.objects.filter(condition).delete()
+
+
+def home_page(user, paginator):
+    """
+    The page of ``user``'s home feed that ``paginator`` (a ``KeysetPagination``) points
+    at, as ``(vlogs, next_url, previous_url)``.
+    """
+    size = paginator.get_page_size()
+    cursor = paginator.get_cursor()
+    keys = list(paginator.after(TimelineEntries.objects.filter(user=user), cursor, id_field='vlog_id').values_list(
+        'posted_date', 'vlog_id'
+    )[:size + 1])
+    pulled = list(Follows.objects.filter(follower=user, fanout_on_read=True).values_list('author_id', flat=True))
+    if pulled:
+        keys = set(keys) | set(paginator.after(Vlogs.objects.filter(user_id__in=pulled), cursor).values_list(
+            'posted_date', 'id'
+        )[:size + 1])
+        keys = sorted(keys, reverse=not (cursor and cursor[2]))[:size + 1]
+    vlogs = Vlogs.objects.for_list().in_bulk([vlog_id for _, vlog_id in keys])
+    return paginator.page([vlogs[vlog_id] for _, vlog_id in keys if vlog_id in vlogs], size, cursor)
@@ -0,0 +1,164 @@
+import logging
+import shutil
+import subprocess
+from pathlib import Path, PurePosixPath
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .cache import invalidate_vlog
+from .models import TranscodeJobs
+from .workers import WorkerPool
+
+logger = logging.getLogger(__name__)
+
+pool = WorkerPool('transcode', 'VLOG_TRANSCODE_WORKERS', 'VLOG_TRANSCODE_ASYNC', default_workers=1)
+
+# (name, height, video bitrate, audio bitrate)
+DEFAULT_LADDER = (
+    ('360p', 360, '800k', '96k'),
+    ('720p', 720, '2800k', '128k'),
+    ('1080p', 1080, '5000k', '192k'),
+)
+
+
+class EncoderError(Exception):
+    pass
+
+
+class FfmpegEncoder:
+    """Encodes each rung of the ladder into its own segmented HLS playlist with a local ffmpeg."""
+    segment_seconds = 6
+
+    def __init__(self, binary=None, probe_binary=None):
+        self.binary = binary or getattr(settings, 'VLOG_FFMPEG_BINARY', 'ffmpeg')
+        self.probe_binary = probe_binary or getattr(settings, 'VLOG_FFPROBE_BINARY', 'ffprobe')
+
+    def probe(self, source):
+        """Return the ``(width, height)`` of the first video stream, or None when ffprobe cannot tell."""
+        if shutil.which(self.probe_binary) is None:
+            return None
+        command = [
+            self.probe_binary, '-v', 'error', '-select_streams', 'v:0',
+            '-show_entries', 'stream=width,height', '-of', 'csv=s=x:p=0', str(source),
+        ]
+        result = subprocess.run(command, capture_output=True, text=True)
+        try:
+            width, height = map(int, result.stdout.strip().split('x')[:2])
+        except ValueError:
+            return None
+        return (width, height) if width > 0 and height > 0 else None
+
+    def encode_rendition(self, source, output_dir, height, video_bitrate, audio_bitrate):
+        if shutil.which(self.binary) is None:
+            raise EncoderError(f"{self.binary} is not installed")
+        command = [
+            self.binary, '-y', '-v', 'error', '-i', str(source),
+            '-vf', f'scale=-2:{height}',
+            '-c:v', 'libx264', '-preset', 'veryfast', '-b:v', video_bitrate,
+            '-maxrate', video_bitrate, '-bufsize', video_bitrate,
+            '-c:a', 'aac', '-b:a', audio_bitrate, '-ac', '2',
+            '-hls_time', str(self.segment_seconds), '-hls_playlist_type', 'vod',
+            '-hls_segment_filename', str(output_dir / 'segment_%04d.ts'),
+            str(output_dir / 'index.m3u8'),
+        ]
+        result = subprocess.run(command, capture_output=True, text=True)
+        if result.returncode != 0:
+            raise EncoderError(result.stderr.strip()[-2000:] or f"ffmpeg exited with {result.returncode}")
+
+
+class StubEncoder:
+    """Writes a syntactically valid single-segment playlist without decoding anything."""
+
+    def probe(self, source):
+        return None
+
+    def encode_rendition(self, source, output_dir, height, video_bitrate, audio_bitrate):
+        (output_dir / 'segment_0000.ts').write_bytes(b'')
+        (output_dir / 'index.m3u8').write_text(
+            "#EXTM3U\n#EXT-X-VERSION:3\n#EXT-X-TARGETDURATION:6\n#EXT-X-PLAYLIST-TYPE:VOD\n"
+            "#EXTINF:6.0,\nsegment_0000.ts\n#EXT-X-ENDLIST\n"
+        )
+
+
+def get_encoder():
+    return import_string(getattr(settings, 'VLOG_TRANSCODE_ENCODER', 'main.transcoding.FfmpegEncoder'))()
+
+
+def bandwidth(bitrate):
+    return int(bitrate.rstrip('k')) * 1000
+
+
+def renditions(ladder, source_size):
+    """
+    Yield ``(rung, width)`` for the rungs worth encoding from a source of ``source_size``:
+    rungs taller than the source are skipped, except the lowest, so there is always one.
+    Widths follow the source's aspect ratio, rounded to even like ffmpeg's ``scale=-2``.
+    """
+    source_width, source_height = source_size or (16, 9)
+    kept = [rung for rung in ladder if source_size is None or rung[1] <= source_height] or list(ladder[:1])
+    for rung in kept:
+        yield rung, max(2, round(rung[1] * source_width / source_height / 2) * 2)
+
+
+def output_name(video):
+    return PurePosixPath('uploads', 'hls', str(video.pk))
+
+
+def transcode(video_id):
+    """Run the pending job for ``video_id``: encode every rung, then write the master playlist."""
+    claimed = TranscodeJobs.objects.filter(video_id=video_id, status=TranscodeJobs.PENDING).update(
+        status=TranscodeJobs.RUNNING, started_at=timezone.now(), finished_at=None, error=''
+    )
+    if not claimed:
+        return
+    job = TranscodeJobs.objects.select_related('video').get(video_id=video_id)
+    video = job.video
+    name = output_name(video)
+    output_dir = Path(settings.MEDIA_ROOT) / name
+    ladder = getattr(settings, 'VLOG_TRANSCODE_LADDER', DEFAULT_LADDER)
+
+    try:
+        encoder = get_encoder()
+        shutil.rmtree(output_dir, ignore_errors=True)
+        playlist = ["#EXTM3U", "#EXT-X-VERSION:3"]
+        rungs = renditions(ladder, encoder.probe(video.video.path))
+        for (rendition, height, video_bitrate, audio_bitrate), width in rungs:
+            rendition_dir = output_dir / rendition
+            rendition_dir.mkdir(parents=True, exist_ok=True)
+            encoder.encode_rendition(video.video.path, rendition_dir, height, video_bitrate, audio_bitrate)
+            playlist.append(
+                f"#EXT-X-STREAM-INF:BANDWIDTH={bandwidth(video_bitrate) + bandwidth(audio_bitrate)},"
+                f"RESOLUTION={width}x{height}"
+            )
+            playlist.append(f"{rendition}/index.m3u8")
+        (output_dir / 'master.m3u8').write_text("\n".join(playlist) + "\n")
+    except Exception as exc:
+        logger.exception("Transcoding video %s failed", video_id)
+        TranscodeJobs.objects.filter(pk=job.pk, source=job.source).update(
+            status=TranscodeJobs.FAILED, error=str(exc), finished_at=timezone.now()
+        )
+        return
+
+    TranscodeJobs.objects.filter(pk=job.pk, source=job.source).update(
+        status=TranscodeJobs.DONE, manifest=str(name / 'master.m3u8'), finished_at=timezone.now()
+    )
+    if video.vlog_id:
+        invalidate_vlog(video.vlog_id)
+
+
+def enqueue(video):
+    """(Re)queue a job when ``video`` has a new source file."""
+    if not video.video:
+        return
+    with transaction.atomic():
+        job, created = TranscodeJobs.objects.get_or_create(video=video, defaults={'source': video.video.name})
+        if not created and job.source == video.video.name:
+            return
+        if not created:
+            TranscodeJobs.objects.filter(pk=job.pk).update(
+                source=video.video.name, status=TranscodeJobs.PENDING, manifest='', error=''
+            )
+    pool.schedule(transcode, video.pk)
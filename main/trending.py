@@ -0,0 +1,86 @@
+"""
+Trending scores.
+
+A vlog's score is its weighted engagement divided by a power of its age, as on
+Hacker News::
+
+    (likes * VLOG_TRENDING_LIKE_WEIGHT + comments * VLOG_TRENDING_COMMENT_WEIGHT)
+        / (age_hours + 2) ** VLOG_TRENDING_GRAVITY
+
+and is kept in the indexed ``Vlogs.trending_score`` column, so the trending feed is a
+plain ``ORDER BY trending_score DESC`` range read. Likes and comments refresh the
+touched vlog's score in the same transaction (the engagement part is read from the
+counters by the UPDATE itself, so concurrent writers cannot lose an increment), and
+``decay_trending`` periodically re-applies the age factor to every scored vlog.
+Vlogs older than ``VLOG_TRENDING_WINDOW_HOURS`` drop to zero.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Case, F, FloatField, Q, Value, When
+from django.db.models.functions import Cast
+from django.utils import timezone
+
+from .models import Vlogs
+
+
+def like_weight():
+    return getattr(settings, 'VLOG_TRENDING_LIKE_WEIGHT', 1.0)
+
+
+def comment_weight():
+    return getattr(settings, 'VLOG_TRENDING_COMMENT_WEIGHT', 2.0)
+
+
+def gravity():
+    return getattr(settings, 'VLOG_TRENDING_GRAVITY', 1.8)
+
+
+def window_hours():
+    return getattr(settings, 'VLOG_TRENDING_WINDOW_HOURS', 72)
+
+
+def age_factor(posted_date, now=None):
+    age_hours = max(0.0, ((now or timezone.now()) - posted_date).total_seconds() / 3600)
+    if age_hours > window_hours():
+        return 0.0
+    return 1.0 / (age_hours + 2) ** gravity()
+
+
+def score(factor):
+    """Expression computing the score from the row's current counters and ``factor``."""
+    likes = Cast(F('likes'), FloatField()) * like_weight()
+    comments = Cast(F('comments_count'), FloatField()) * comment_weight()
+    return (likes + comments) * factor
+
+
+def bump(vlog):
+    """Refresh the score of ``vlog``, whose ``posted_date`` must be loaded. Call after moving its counters."""
+    Vlogs.objects.filter(pk=vlog.pk).update(trending_score=score(Value(age_factor(vlog.posted_date))))
+
+
+def refresh(vlog_ids):
+    """Recompute the scores of ``vlog_ids`` with one UPDATE. Returns the number of vlogs updated."""
+    now = timezone.now()
+    factors = [
+        When(pk=pk, then=Value(age_factor(posted_date, now)))
+        for pk, posted_date in Vlogs.objects.filter(pk__in=vlog_ids).values_list('pk', 'posted_date')
+    ]
+    if not factors:
+        return 0
+    return Vlogs.objects.filter(pk__in=vlog_ids).update(
+        trending_score=score(Case(*factors, default=Value(0.0), output_field=FloatField()))
+    )
+
+
+def decay(batch_size=500):
+    """Re-apply the age factor to every vlog that has or may gain a score. Returns the number refreshed."""
+    since = timezone.now() - timedelta(hours=window_hours())
+    candidates = Vlogs.objects.filter(Q(trending_score__gt=0) | Q(posted_date__gte=since)).order_by('pk')
+    refreshed, last = 0, 0
+    while True:
+        ids = list(candidates.filter(pk__gt=last).values_list('pk', flat=True)[:batch_size])
+        if not ids:
+            return refreshed
+        refreshed += refresh(ids)
+        last = ids[-1]
@@ -0,0 +1,164 @@
+import hashlib
+import os
+import re
+import time
+from datetime import timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.core.files import File
+from django.db import transaction
+from django.db.models import F
+from django.db.models.functions import Greatest
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+
+from . import storage
+from .models import VideoUploads, Videos
+
+CONTENT_RANGE = re.compile(r'^bytes (\d+)-(\d+)/(\d+)$')
+READ_SIZE = 64 * 1024
+
+
+class StagedFile(File):
+    """
+    Lets ``FileSystemStorage`` move the staged file into place instead of copying it,
+    the same way it handles ``TemporaryUploadedFile``.
+    """
+
+    def temporary_file_path(self):
+        return self.file.name
+
+
+def staging_dir():
+    directory = Path(getattr(settings, 'VLOG_UPLOAD_STAGING_DIR', Path(settings.MEDIA_ROOT) / 'partial'))
+    directory.mkdir(parents=True, exist_ok=True)
+    return directory
+
+
+def staging_path(upload):
+    return staging_dir() / str(upload.pk)
+
+
+def expire_after():
+    return getattr(settings, 'VLOG_UPLOAD_EXPIRE_SECONDS', 24 * 3600)
+
+
+def parse_content_range(header, upload):
+    match = CONTENT_RANGE.match(header or '')
+    if not match:
+        raise ValidationError({'Content-Range': 'Expected "bytes <start>-<end>/<size>".'})
+    start, end, total = map(int, match.groups())
+    if total != upload.size or start > end or end >= upload.size:
+        raise ValidationError({'Content-Range': f'Range must fall within the declared size of {upload.size} bytes.'})
+    max_chunk = getattr(settings, 'VLOG_UPLOAD_MAX_CHUNK_SIZE', 64 * 1024 * 1024)
+    if end - start + 1 > max_chunk:
+        raise ValidationError({'Content-Range': f'Chunks may not exceed {max_chunk} bytes.'})
+    return start, end
+
+
+def write_chunk(upload, stream, start, end):
+    """
+    Copy bytes ``start..end`` from ``stream`` into the staged file in fixed-size reads,
+    so memory per request stays bounded whatever the chunk size. Re-sending an already
+    received range is allowed, which makes chunk retries idempotent.
+    """
+    path = staging_path(upload)
+    mode = 'r+b' if path.exists() else 'wb'
+    remaining = end - start + 1
+    with open(path, mode) as f:
+        f.seek(start)
+        while remaining:
+            data = stream.read(min(READ_SIZE, remaining))
+            if not data:
+                break
+            f.write(data)
+            remaining -= len(data)
+    if remaining:
+        raise ValidationError({'detail': 'Request body is shorter than the declared Content-Range.'})
+
+    VideoUploads.objects.filter(pk=upload.pk).update(offset=Greatest(F('offset'), end + 1), updated_at=timezone.now())
+    upload.refresh_from_db(fields=['offset'])
+    return upload
+
+
+def sha256_of(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(READ_SIZE), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def finalize(upload):
+    """
+    Verify the staged file and turn it into a ``Videos`` row on the upload's vlog.
+
+    The upload row stays locked until the video is saved, so concurrent completes of one
+    upload create a single video. Returns ``(video, created)``.
+    """
+    with transaction.atomic():
+        upload = VideoUploads.objects.select_for_update().get(pk=upload.pk)
+        if upload.video_id is not None:
+            return upload.video, False
+        path = staging_path(upload)
+        if upload.offset != upload.size or not path.exists() or path.stat().st_size != upload.size:
+            raise ValidationError({'detail': f'Upload incomplete: {upload.offset} of {upload.size} bytes received.'})
+        checksum_ok = not upload.sha256 or sha256_of(path) == upload.sha256.lower()
+        if checksum_ok:
+            video = Videos(vlog_id=upload.vlog_id)
+            try:
+                with open(path, 'rb') as f:
+                    video.video.save(upload.filename, StagedFile(f, name=upload.filename), save=False)
+                video.save()
+                upload.video = video
+                upload.save(update_fields=['video', 'updated_at'])
+            except BaseException:
+                unstore(video, path)
+                raise
+        else:
+            path.unlink()
+            upload.offset = 0
+            upload.save(update_fields=['offset', 'updated_at'])
+    if not checksum_ok:
+        raise ValidationError({'sha256': 'Checksum mismatch, the upload has been reset.'})
+    if path.exists():
+        os.remove(path)
+    return video, True
+
+
+def unstore(video, path):
+    """Undo the stored copy of a video whose row was not saved, keeping the staged bytes for a retry."""
+    name = video.video.name
+    if not name or storage.is_blob(name):
+        # A blob may already be shared; collect_orphaned_media removes it if nothing uses it.
+        return
+    stored = video.video.storage.path(name)
+    if not os.path.exists(stored):
+        return
+    if path.exists():
+        os.remove(stored)
+    else:
+        # The staged file was moved into place rather than copied.
+        os.replace(stored, path)
+
+
+def expire(max_age=None):
+    """
+    Delete upload sessions left incomplete for ``max_age`` seconds, their staged files, and
+    staged files without a session. Returns ``(sessions, files)`` removed.
+    """
+    max_age = expire_after() if max_age is None else max_age
+    abandoned = VideoUploads.objects.filter(
+        video__isnull=True, updated_at__lt=timezone.now() - timedelta(seconds=max_age),
+    )
+    sessions, _ = abandoned.delete()
+
+    live = {str(pk) for pk in VideoUploads.objects.filter(video__isnull=True).values_list('pk', flat=True)}
+    cutoff = time.time() - max_age
+    files = 0
+    for path in staging_dir().iterdir():
+        if path.is_file() and path.name not in live and path.stat().st_mtime < cutoff:
+            path.unlink(missing_ok=True)
+            files += 1
+    return sessions, files
@@ -1,18 +1,42 @@
 from django.urls import path
+from . import async_views
+from . import models
 from . import views
 
 urlpatterns = [
     path('', views.VlogsGetView.as_view(), name="main"),
+    path('async/', async_views.vlogs_list, name="main-async"),
+    path('async/<int:pk>/', async_views.vlog_detail, name="vlog-view-async"),
+    path('async/<int:vlog_id>/comments/', async_views.comments_list, name="list-comments-async"),
+    path('changes/', views.ChangesView.as_view(), name="vlog-changes"),
+    path('export/', views.VlogsExportView.as_view(), name="export-vlogs"),
+    path('home/', views.HomeTimelineView.as_view(), name="home-timeline"),
+    path('trending/', views.VlogsTrendingView.as_view(), name="trending-vlogs"),
+    path('search/', views.VlogsSearchView.as_view(), name="search-vlogs"),
     path('post/', views.VlogsPostView.as_view(), name="post-vlogs"),
+    path('import/', views.VlogsImportView.as_view(), name="import-vlogs"),
     path('<int:pk>/', views.VlogsView.as_view(), name="vlog-view"),
     path('<int:pk>/update/', views.VlogsUpdateView.as_view(), name="vlog-update"),
     path('<int:pk>/delete/', views.VlogsDeleteView.as_view(), name="vlog-delete"),
     path('<int:vlog_pk>/image/<int:pk>/', views.VlogImageUpdateDeleteView.as_view(), name="vlog-image-update"),
     path('<int:vlog_pk>/video/<int:pk>/', views.VlogVideoUpdateDeleteView.as_view(), name="vlog-image-update"),
+    path('<int:vlog_pk>/image/<int:pk>/file/',
+         views.MediaFileView.as_view(model=models.Images, field_name='image'), name="vlog-image-file"),
+    path('<int:vlog_pk>/video/<int:pk>/file/',
+         views.MediaFileView.as_view(model=models.Videos, field_name='video'), name="vlog-video-file"),
+    path('<int:vlog_pk>/document/<int:pk>/file/',
+         views.MediaFileView.as_view(model=models.Documents, field_name='document'), name="vlog-document-file"),
+    path('<int:vlog_pk>/video/uploads/', views.VideoUploadCreateView.as_view(), name="video-upload"),
+    path('<int:vlog_pk>/video/uploads/<uuid:pk>/', views.VideoUploadChunkView.as_view(), name="video-upload-chunk"),
+    path('<int:vlog_pk>/video/uploads/<uuid:pk>/complete/', views.VideoUploadCompleteView.as_view(),
+         name="video-upload-complete"),
     path('<int:vlog_pk>/document/<int:pk>/', views.VlogDocumentUpdateDeleteView.as_view(), name="vlog-image-update"),
     path('<int:pk>/post-comment/', views.CommentsPostView.as_view(), name='post-comment'),
-    path('<int:vlog_id>/update-comment/', views.CommentsUpdateView.as_view(), name="delete-comment"),
-    path('<int:vlog_id>/delete-comment/', views.CommentsDeleteView.as_view(), name="delete-comment"),
+    path('<int:vlog_id>/comments/', views.CommentsListView.as_view(), name='list-comments'),
+    path('<int:vlog_id>/update-comment/<int:pk>/', views.CommentsUpdateView.as_view(), name="update-comment"),
+    path('<int:vlog_id>/delete-comment/<int:pk>/', views.CommentsDeleteView.as_view(), name="delete-comment"),
+    path('users/<int:user_id>/follow/', views.FollowView.as_view(), name="follow-user"),
+    path('users/<int:user_id>/unfollow/', views.UnfollowView.as_view(), name="unfollow-user"),
     path('<int:vlog_id>/like/', views.LikeVlogView.as_view(), name='like-vlog'),
     path('<int:vlog_id>/drop-like/', views.DropLikeView.as_view(), name="drop-like-vog"),
 ]
@@ -1,44 +1,325 @@
+import hashlib
+import json
+import time
+import zipfile
+from datetime import timedelta
+from itertools import islice
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.http import StreamingHttpResponse
 from django.shortcuts import get_object_or_404
-from drf_spectacular.utils import extend_schema_view
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from django.utils.decorators import method_decorator
+from django.views.decorators.http import condition
+from drf_spectacular.types import OpenApiTypes
+from drf_spectacular.utils import OpenApiParameter, extend_schema_view
 from rest_framework import generics
 from rest_framework.parsers import MultiPartParser, FormParser
 from rest_framework.permissions import IsAdminUser, IsAuthenticated
 from django_filters.rest_framework import DjangoFilterBackend
+from rest_framework.renderers import BrowsableAPIRenderer, JSONRenderer
 from rest_framework.response import Response
+from rest_framework.utils.encoders import JSONEncoder
 from rest_framework import status
+from . import bulk_import
+from . import changes
+from . import cache as response_cache
+from . import media
+from . import search
+from . import uploads
 from . import serializers
 from . import models
+from . import timelines
+from . import trending
+from .likes import add_like, remove_like, buffering_enabled, buffer_like, buffer_unlike, pending_like_deltas
+from .pagination import VlogsCursorPagination, CommentsCursorPagination, KeysetPagination
+from .renderers import EventStreamRenderer
 from drf_spectacular.views import extend_schema
 
 
+def feed_etag(request, *args, **kwargs):
+    digest = hashlib.md5(request.build_absolute_uri().encode()).hexdigest()
+    return f"feed-{response_cache.feed_generation()}-{digest}"
+
+
+def vlog_version(request, pk):
+    """``(updated_date, likes, pending likes)`` of vlog ``pk``, looked up once per request."""
+    if not hasattr(request, '_vlog_version'):
+        row = models.Vlogs.objects.filter(pk=pk).order_by().values_list('updated_date', 'likes').first()
+        request._vlog_version = (*row, pending_like_deltas([pk]).get(pk, 0)) if row else None
+    return request._vlog_version
+
+
+def vlog_etag(request, pk):
+    version = vlog_version(request, pk)
+    if version is None:
+        return None
+    updated_date, likes, pending = version
+    return f"vlog-{pk}-{updated_date.timestamp()}-{likes + pending}"
+
+
+def vlog_last_modified(request, pk):
+    version = vlog_version(request, pk)
+    if version is None:
+        return None
+    updated_date, _, pending = version
+    # Buffered likes only move updated_date when they are flushed; until then only the ETag sees them.
+    return None if pending else updated_date
+
+
+@method_decorator(condition(etag_func=feed_etag), name='get')
 @extend_schema(
     summary="Get a list of vlogs",
-    description="Retrieve a list of vlogs with optional filtering by title and tags.",
+    description="Retrieve a cursor-paginated list of vlogs, newest first, with optional filtering by title. "
+                "Follow the opaque `next`/`previous` links to move between pages.",
     tags=["Vlogs"],
     parameters=[
-        {
-            "name": "title",
-            "in": "query",
-            "required": False,
-            "description": "Filter by title",
-            "schema": {"type": "string"},
-        },
-        {
-            "name": "tags",
-            "in": "query",
-            "required": False,
-            "description": "Filter by tags",
-            "schema": {"type": "string"},
-        },
+        OpenApiParameter("title", str, description="Filter by exact title"),
     ],
     responses={200: serializers.VlogsListSerializer(many=True)},
 )
 class VlogsGetView(generics.ListAPIView):
-    queryset = models.Vlogs.objects.all()
+    queryset = models.Vlogs.objects.for_list()
     serializer_class = serializers.VlogsListSerializer
+    pagination_class = VlogsCursorPagination
+    query_budget = 2
     filter_backends = [DjangoFilterBackend]
     filterset_fields = ['title']
 
+    def list(self, request, *args, **kwargs):
+        key = response_cache.feed_key(request.build_absolute_uri())
+        data = response_cache.get_or_build(key, lambda: super(VlogsGetView, self).list(request, *args, **kwargs).data)
+        return Response(data)
+
+
+@extend_schema(
+    summary="Get the home feed",
+    description="Vlogs by the authors the current user follows, newest first. Follow the opaque "
+                "`next`/`previous` links to move between pages.",
+    tags=["Vlogs"],
+    parameters=[
+        OpenApiParameter("cursor", str, description="Opaque cursor from a previous page"),
+        OpenApiParameter("page_size", int, description="Vlogs per page (default 20, max 100)"),
+    ],
+    responses={200: serializers.VlogsListSerializer(many=True)},
+)
+class HomeTimelineView(generics.GenericAPIView):
+    serializer_class = serializers.VlogsListSerializer
+    permission_classes = [IsAuthenticated]
+    # Including the authenticated user's row.
+    query_budget = 6
+
+    def get(self, request, *args, **kwargs):
+        try:
+            vlogs, next_url, previous_url = timelines.home_page(request.user, KeysetPagination(request))
+        except KeysetPagination.InvalidCursor:
+            return Response({'detail': 'Invalid cursor'}, status=status.HTTP_404_NOT_FOUND)
+        return Response({
+            'next': next_url,
+            'previous': previous_url,
+            'results': self.get_serializer(vlogs, many=True).data,
+        })
+
+
+@extend_schema(
+    summary="Get trending vlogs",
+    description="The highest scoring vlogs by likes and comments, decayed by age. Scores are refreshed on every "
+                "like and comment and aged periodically by `manage.py decay_trending`.",
+    tags=["Vlogs"],
+    parameters=[
+        OpenApiParameter("limit", int, description="Number of vlogs (default 20, max 100)"),
+    ],
+    responses={200: serializers.VlogsListSerializer(many=True)},
+)
+class VlogsTrendingView(generics.ListAPIView):
+    serializer_class = serializers.VlogsListSerializer
+    query_budget = 2
+    default_limit = 20
+    max_limit = 100
+
+    def list(self, request, *args, **kwargs):
+        try:
+            limit = min(int(request.query_params.get('limit', self.default_limit)), self.max_limit)
+        except ValueError:
+            return Response({'detail': 'limit must be an integer.'}, status=status.HTTP_400_BAD_REQUEST)
+        if limit < 1:
+            return Response({'detail': 'limit must be positive.'}, status=status.HTTP_400_BAD_REQUEST)
+        vlogs = models.Vlogs.objects.for_list().filter(trending_score__gt=0).order_by('-trending_score', '-id')
+        return Response({'results': self.get_serializer(vlogs[:limit], many=True).data})
+
+
+@extend_schema(
+    summary="Search vlogs",
+    description="Ranked full-text search over vlog titles, content, descriptions and comments. "
+                "Title matches rank highest, comment matches lowest.",
+    tags=["Vlogs"],
+    parameters=[
+        OpenApiParameter("q", str, required=True, description="Search terms; the last one also matches as a prefix"),
+        OpenApiParameter("limit", int, description="Results per page (default 20, max 100)"),
+        OpenApiParameter("offset", int, description="Number of results to skip"),
+    ],
+    responses={200: serializers.VlogsListSerializer(many=True)},
+)
+class VlogsSearchView(generics.ListAPIView):
+    serializer_class = serializers.VlogsListSerializer
+    query_budget = 3
+    default_limit = 20
+    max_limit = 100
+
+    def list(self, request, *args, **kwargs):
+        text = request.query_params.get('q', '').strip()
+        if not text:
+            return Response({'detail': 'The q parameter is required.'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            limit = min(int(request.query_params.get('limit', self.default_limit)), self.max_limit)
+            offset = int(request.query_params.get('offset', 0))
+        except ValueError:
+            return Response({'detail': 'limit and offset must be integers.'}, status=status.HTTP_400_BAD_REQUEST)
+        if limit < 1 or offset < 0:
+            return Response({'detail': 'limit must be positive and offset not negative.'},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        ids = search.search(text, limit, offset)
+        vlogs = models.Vlogs.objects.for_list().in_bulk(ids)
+        results = [vlogs[pk] for pk in ids if pk in vlogs]
+        return Response({'results': self.get_serializer(results, many=True).data})
+
+
+@extend_schema(
+    summary="Export vlogs as NDJSON",
+    description="Stream every vlog as newline-delimited JSON, oldest change first, in the feed's list format. "
+                "Vlogs changed in the last few seconds are left to the next export. Pass `updated_since` to "
+                "only receive vlogs changed after a previous export; the `X-Export-Watermark` response header "
+                "holds the value to pass next time.",
+    tags=["Vlogs"],
+    parameters=[
+        OpenApiParameter("updated_since", OpenApiTypes.DATETIME,
+                         description="Only export vlogs updated after this ISO 8601 timestamp"),
+    ],
+    responses={(200, 'application/x-ndjson'): serializers.VlogsListSerializer},
+)
+class VlogsExportView(generics.GenericAPIView):
+    serializer_class = serializers.VlogsListSerializer
+
+    def get(self, request, *args, **kwargs):
+        queryset = models.Vlogs.objects.for_list()
+        since = request.query_params.get('updated_since')
+        if since:
+            try:
+                since = parse_datetime(since)
+            except ValueError:
+                since = None
+            if since is None:
+                return Response({'updated_since': ['Expected an ISO 8601 timestamp.']},
+                                status=status.HTTP_400_BAD_REQUEST)
+            if timezone.is_naive(since):
+                since = timezone.make_aware(since)
+            queryset = queryset.filter(updated_date__gt=since)
+
+        # updated_date is taken when a row is written, not when it commits, so a transaction still
+        # in flight can commit a value below anything exported so far. Leave rows younger than the
+        # settle margin to the next sync, which resumes from this bound.
+        watermark = timezone.now() - timedelta(seconds=getattr(settings, 'VLOG_EXPORT_SETTLE_SECONDS', 5))
+        if since and since > watermark:
+            watermark = since
+        queryset = queryset.filter(updated_date__lte=watermark)
+        rows = queryset.order_by('updated_date', 'id').iterator(
+            chunk_size=getattr(settings, 'VLOG_EXPORT_CHUNK_SIZE', 500)
+        )
+        response = StreamingHttpResponse(self.stream(rows), content_type='application/x-ndjson')
+        response['X-Export-Watermark'] = watermark.isoformat()
+        return response
+
+    def stream(self, rows):
+        chunk_size = getattr(settings, 'VLOG_EXPORT_CHUNK_SIZE', 500)
+        encoder = JSONEncoder()
+        while chunk := list(islice(rows, chunk_size)):
+            context = self.get_serializer_context()
+            context['pending_likes'] = pending_like_deltas([vlog.pk for vlog in chunk])
+            serializer = self.get_serializer(chunk, many=True, context=context)
+            yield ''.join(encoder.encode(item) + '\n' for item in serializer.data)
+
+
+@extend_schema(
+    summary="Follow the change feed",
+    description="Changes to vlogs, comments and likes after sequence number `since`, oldest first. Pass `wait` "
+                "to long-poll until something changes. With `Accept: text/event-stream` the changes are streamed "
+                "as server-sent events whose ids are sequence numbers, so reconnecting clients resume from "
+                "`Last-Event-ID`. Waiting requests are capped per server process; over the cap the response "
+                "is 503 with `Retry-After`.",
+    tags=["Vlogs"],
+    parameters=[
+        OpenApiParameter("since", int, description="Last sequence number already processed (default 0)"),
+        OpenApiParameter("limit", int, description="Changes per response (default 100, max 1000)"),
+        OpenApiParameter("wait", int, description="Seconds to wait for new changes when there are none"),
+    ],
+    responses={200: OpenApiTypes.OBJECT},
+)
+class ChangesView(generics.GenericAPIView):
+    permission_classes = [IsAdminUser]
+    renderer_classes = [JSONRenderer, BrowsableAPIRenderer, EventStreamRenderer]
+    default_limit = 100
+    max_limit = 1000
+    heartbeat_seconds = 15
+
+    def get(self, request, *args, **kwargs):
+        try:
+            since = int(request.query_params.get('since', request.headers.get('Last-Event-ID', 0)))
+            limit = min(int(request.query_params.get('limit', self.default_limit)), self.max_limit)
+            wait = min(float(request.query_params.get('wait', 0)), getattr(settings, 'VLOG_CHANGES_MAX_WAIT', 30))
+        except ValueError:
+            return Response({'detail': 'since, limit and wait must be numbers.'}, status=status.HTTP_400_BAD_REQUEST)
+        if since < 0 or limit < 1:
+            return Response({'detail': 'since must not be negative and limit must be positive.'},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        streaming = request.accepted_renderer.format == EventStreamRenderer.format
+        # Both hold this worker thread while they wait, see main/changes.py.
+        if (streaming or wait > 0) and not changes.streams.acquire():
+            return Response({'detail': 'Too many clients are waiting for changes, retry shortly.'},
+                            status=status.HTTP_503_SERVICE_UNAVAILABLE,
+                            headers={'Retry-After': str(max(1, round(changes.poll_interval())))})
+        if streaming:
+            response = StreamingHttpResponse(changes.HeldStream(self.events(since, limit)),
+                                             content_type='text/event-stream')
+            response['Cache-Control'] = 'no-cache'
+            response['X-Accel-Buffering'] = 'no'
+            return response
+        if wait > 0:
+            try:
+                rows = changes.wait(since, limit, wait)
+            finally:
+                changes.streams.release()
+        else:
+            rows = changes.read(since, limit)
+        return Response({
+            'changes': [changes.as_dict(change) for change in rows],
+            'last_seq': rows[-1].id if rows else since,
+        })
+
+    def events(self, since, limit):
+        deadline = time.monotonic() + getattr(settings, 'VLOG_CHANGES_STREAM_SECONDS', 300)
+        last_sent = time.monotonic()
+        yield f'retry: {int(changes.poll_interval() * 1000)}\n\n'
+        while True:
+            rows = changes.read(since, limit)
+            for change in rows:
+                yield f'id: {change.id}\nevent: change\ndata: {json.dumps(changes.as_dict(change))}\n\n'
+                since = change.id
+            now = time.monotonic()
+            if now >= deadline:
+                return
+            if rows:
+                last_sent = now
+                continue
+            if now - last_sent >= self.heartbeat_seconds:
+                yield ': keep-alive\n\n'
+                last_sent = now
+            time.sleep(changes.poll_interval())
+
 
 @extend_schema_view(
     create=extend_schema(summary="Create a vlog", description="Create a new vlog."),
@@ -61,6 +342,34 @@ class VlogsPostView(generics.CreateAPIView):
         serializer.save(user=self.request.user)
 
 
+@extend_schema(
+    summary="Import vlogs in bulk",
+    description="Upload a zip archive holding `manifest.ndjson` (one vlog per line with `title`, `description`, "
+                "`content`, `cover`, `images`, `videos` and `documents`) and the media files it references. "
+                "Lines that fail validation are reported and skipped.",
+    tags=["Vlogs"],
+    request=serializers.VlogsImportSerializer(),
+    responses={201: None}
+)
+class VlogsImportView(generics.GenericAPIView):
+    parser_classes = [MultiPartParser]
+    serializer_class = serializers.VlogsImportSerializer
+    permission_classes = [IsAdminUser]
+
+    def post(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        try:
+            source = bulk_import.ZipSource(serializer.validated_data['archive'])
+            source.archive.getinfo(bulk_import.MANIFEST_NAME)
+        except (zipfile.BadZipFile, KeyError):
+            return Response({'archive': [f'Expected a zip archive containing {bulk_import.MANIFEST_NAME}.']},
+                            status=status.HTTP_400_BAD_REQUEST)
+        importer = bulk_import.Importer(source, request.user).run()
+        return Response({'created': importer.created, 'errors': importer.errors}, status=status.HTTP_201_CREATED)
+
+
+@method_decorator(condition(etag_func=vlog_etag, last_modified_func=vlog_last_modified), name='get')
 @extend_schema(
     summary="Get a vlog",
     description="Retrieve a specific vlog.",
@@ -68,8 +377,16 @@ class VlogsPostView(generics.CreateAPIView):
     responses={200: serializers.VlogsSerializer()}
 )
 class VlogsView(generics.RetrieveAPIView):
-    queryset = models.Vlogs.objects.all()
     serializer_class = serializers.VlogsSerializer
+    query_budget = 8
+
+    def get_queryset(self):
+        return models.Vlogs.objects.for_detail(getattr(settings, 'VLOG_DETAIL_COMMENTS', 10))
+
+    def retrieve(self, request, *args, **kwargs):
+        key = response_cache.detail_key(kwargs['pk'], request.build_absolute_uri('/'))
+        data = response_cache.get_or_build(key, lambda: self.get_serializer(self.get_object()).data)
+        return Response(data)
 
 
 @extend_schema(
@@ -134,6 +451,92 @@ class VlogVideoUpdateDeleteView(generics.RetrieveUpdateDestroyAPIView):
         return models.Videos.objects.filter(vlog=vlog_pk)
 
 
+@extend_schema(
+    summary="Start a resumable video upload",
+    description="Create an upload session for a video of the given size. Send the bytes with PUT requests "
+                "carrying a `Content-Range` header, then complete the session to attach the video to the vlog.",
+    tags=["Vlogs Medias"],
+    responses={201: serializers.VideoUploadsSerializer()}
+)
+class VideoUploadCreateView(generics.CreateAPIView):
+    serializer_class = serializers.VideoUploadsSerializer
+    permission_classes = [IsAdminUser]
+
+    def perform_create(self, serializer):
+        vlog = get_object_or_404(models.Vlogs.objects.only('id'), pk=self.kwargs.get('vlog_pk'))
+        serializer.save(user=self.request.user, vlog=vlog)
+
+
+@extend_schema(
+    summary="Resumable video upload",
+    description="GET reports how many bytes were received so an interrupted upload can resume from `offset`. "
+                "PUT writes the raw request body at the byte range given by "
+                "`Content-Range: bytes <start>-<end>/<size>`.",
+    tags=["Vlogs Medias"],
+    responses={200: serializers.VideoUploadsSerializer()}
+)
+class VideoUploadChunkView(generics.RetrieveUpdateAPIView):
+    serializer_class = serializers.VideoUploadsSerializer
+    permission_classes = [IsAdminUser]
+    allowed_methods = ['GET', 'PUT']
+
+    def get_queryset(self):
+        return models.VideoUploads.objects.filter(user=self.request.user, vlog=self.kwargs.get('vlog_pk'))
+
+    def update(self, request, *args, **kwargs):
+        upload = self.get_object()
+        if upload.video_id is not None:
+            return Response({'detail': 'Upload already completed.'}, status=status.HTTP_409_CONFLICT)
+        start, end = uploads.parse_content_range(request.META.get('HTTP_CONTENT_RANGE'), upload)
+        if start > upload.offset:
+            return Response({'detail': f'Expected a chunk starting at byte {upload.offset}.', 'offset': upload.offset},
+                            status=status.HTTP_409_CONFLICT)
+        # Read the raw stream directly; touching request.data would spool the whole body.
+        upload = uploads.write_chunk(upload, request._request, start, end)
+        return Response(self.get_serializer(upload).data)
+
+
+@extend_schema(
+    summary="Complete a resumable video upload",
+    description="Verify the size and optional SHA-256 of the received bytes and attach them to the vlog as a video.",
+    tags=["Vlogs Medias"],
+    request=None,
+    responses={201: serializers.VideosSerializer()}
+)
+class VideoUploadCompleteView(generics.GenericAPIView):
+    serializer_class = serializers.VideosSerializer
+    permission_classes = [IsAdminUser]
+
+    def get_queryset(self):
+        return models.VideoUploads.objects.filter(user=self.request.user, vlog=self.kwargs.get('vlog_pk'))
+
+    def post(self, request, *args, **kwargs):
+        video, created = uploads.finalize(self.get_object())
+        return Response(self.get_serializer(video).data,
+                        status=status.HTTP_201_CREATED if created else status.HTTP_200_OK)
+
+
+@extend_schema(
+    summary="Download a vlog media file",
+    description="Serve the file with `Range`/`If-Range` support (206 Partial Content) and a strong ETag, so "
+                "players can seek without downloading from byte 0.",
+    tags=["Vlogs Medias"],
+    responses={200: OpenApiTypes.BINARY, 206: OpenApiTypes.BINARY, 304: None, 416: None}
+)
+class MediaFileView(generics.GenericAPIView):
+    model = None
+    field_name = None
+
+    def get_queryset(self):
+        return self.model.objects.filter(vlog=self.kwargs.get('vlog_pk')).only('id', self.field_name)
+
+    def get(self, request, *args, **kwargs):
+        field_file = getattr(self.get_object(), self.field_name)
+        if not field_file:
+            return Response({'detail': 'No file.'}, status=status.HTTP_404_NOT_FOUND)
+        return media.serve(request, field_file)
+
+
 @extend_schema(
     summary="The vlog document Update Delete",
     description="Retrieve a specific vlog.",
@@ -151,6 +554,24 @@ class VlogDocumentUpdateDeleteView(generics.RetrieveUpdateDestroyAPIView):
         return models.Documents.objects.filter(vlog=vlog_pk)
 
 
+@extend_schema(
+    summary="List comments",
+    description="Cursor-paginated comments of a vlog, newest first. Follow the opaque `next`/`previous` links "
+                "to move between pages.",
+    tags=["Comments"],
+    responses={200: serializers.CommentsSerializer(many=True)}
+)
+class CommentsListView(generics.ListAPIView):
+    serializer_class = serializers.CommentsSerializer
+    pagination_class = CommentsCursorPagination
+    query_budget = 2
+
+    def get_queryset(self):
+        vlog_id = self.kwargs['vlog_id']
+        get_object_or_404(models.Vlogs.objects.only('id'), pk=vlog_id)
+        return models.Comments.objects.filter(vlog_id=vlog_id)
+
+
 @extend_schema(
     summary="Create a comment",
     description="Create a new comment on a vlog.",
@@ -164,8 +585,11 @@ class CommentsPostView(generics.CreateAPIView):
     permission_classes = [IsAuthenticated]
 
     def perform_create(self, serializer):
-        vlog = get_object_or_404(models.Vlogs, pk=self.kwargs.get("pk"))
-        serializer.save(user=self.request.user, vlog=vlog)
+        vlog = get_object_or_404(models.Vlogs.objects.only('id', 'posted_date'), pk=self.kwargs.get("pk"))
+        with transaction.atomic():
+            # The post_save receiver moves comments_count.
+            serializer.save(user=self.request.user, vlog=vlog)
+            trending.bump(vlog)
 
 
 @extend_schema(
@@ -177,6 +601,7 @@ class CommentsPostView(generics.CreateAPIView):
 )
 class CommentsUpdateView(generics.RetrieveUpdateAPIView):
     serializer_class = serializers.CommentsSerializer
+    permission_classes = [IsAuthenticated]
     allowed_methods = ['PATCH']
 
     def get_queryset(self):
@@ -194,6 +619,7 @@ class CommentsUpdateView(generics.RetrieveUpdateAPIView):
 )
 class CommentsDeleteView(generics.DestroyAPIView):
     serializer_class = serializers.CommentsSerializer
+    permission_classes = [IsAuthenticated]
 
     def get_queryset(self):
         vlog_id = self.kwargs['vlog_id']
@@ -201,6 +627,11 @@ class CommentsDeleteView(generics.DestroyAPIView):
 
         return queryset
 
+    def perform_destroy(self, instance):
+        with transaction.atomic():
+            instance.delete()
+            trending.refresh([instance.vlog_id])
+
 
 @extend_schema(
     summary="Like a vlog",
@@ -214,15 +645,17 @@ class LikeVlogView(generics.CreateAPIView):
 
     def create(self, request, *args, **kwargs):
         vlog_id = self.kwargs.get('vlog_id')
-        vlog = get_object_or_404(models.Vlogs, pk=vlog_id)
-        existing_like = models.Like.objects.filter(user=self.request.user, vlog=vlog).first()
+        vlog = get_object_or_404(models.Vlogs.objects.only('id', 'posted_date'), pk=vlog_id)
+        if buffering_enabled():
+            if not buffer_like(self.request.user, vlog):
+                return Response({'detail': 'You have already liked this vlog.'}, status=status.HTTP_400_BAD_REQUEST)
+            return Response({'user': self.request.user.pk, 'vlog': vlog.pk}, status=status.HTTP_202_ACCEPTED)
 
-        if existing_like is not None:
+        like = add_like(self.request.user, vlog)
+
+        if like is None:
             return Response({'detail': 'You have already liked this vlog.'}, status=status.HTTP_400_BAD_REQUEST)
 
-        like = models.Like.objects.create(user=self.request.user, vlog=vlog)
-        vlog.likes = models.Like.objects.filter(vlog=vlog).count()
-        vlog.save()
         serializer = self.get_serializer(like)
         headers = self.get_success_headers(serializer.data)
         return Response(serializer.data, status=status.HTTP_201_CREATED, headers=headers)
@@ -240,13 +673,47 @@ class DropLikeView(generics.UpdateAPIView):
 
     def update(self, request, *args, **kwargs):
         vlog_id = kwargs.get('vlog_id')
-        vlog = get_object_or_404(models.Vlogs, pk=vlog_id)
-        likes = models.Like.objects.filter(user=request.user, vlog=vlog)
-        if likes.exists():
-            likes.delete()
-            vlog.likes = models.Like.objects.filter(vlog=vlog).count()
-            vlog.save()
-
+        vlog = get_object_or_404(models.Vlogs.objects.only('id', 'posted_date'), pk=vlog_id)
+        dropped = buffer_unlike(request.user, vlog) if buffering_enabled() else remove_like(request.user, vlog)
+        if dropped:
             return Response({'message': 'Like dropped successfully'}, status=status.HTTP_204_NO_CONTENT)
         else:
             return Response({'message': 'You have not liked this vlog'}, status=status.HTTP_400_BAD_REQUEST)
+
+
+@extend_schema(
+    summary="Follow an author",
+    description="Follow a user so their vlogs appear in your home feed.",
+    tags=["Follows"],
+    request=None,
+    responses={201: serializers.FollowsSerializer()}
+)
+class FollowView(generics.CreateAPIView):
+    serializer_class = serializers.FollowsSerializer
+    permission_classes = [IsAuthenticated]
+
+    def create(self, request, *args, **kwargs):
+        author = get_object_or_404(User.objects.only('id'), pk=self.kwargs['user_id'])
+        if author.pk == request.user.pk:
+            return Response({'detail': 'You cannot follow yourself.'}, status=status.HTTP_400_BAD_REQUEST)
+        edge = timelines.follow(request.user, author)
+        if edge is None:
+            return Response({'detail': 'You already follow this user.'}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(self.get_serializer(edge).data, status=status.HTTP_201_CREATED)
+
+
+@extend_schema(
+    summary="Unfollow an author",
+    description="Stop following a user and remove their vlogs from your home feed.",
+    tags=["Follows"],
+    responses={204: None}
+)
+class UnfollowView(generics.DestroyAPIView):
+    serializer_class = serializers.FollowsSerializer
+    permission_classes = [IsAuthenticated]
+
+    def destroy(self, request, *args, **kwargs):
+        author = get_object_or_404(User.objects.only('id'), pk=self.kwargs['user_id'])
+        if timelines.unfollow(request.user, author):
+            return Response(status=status.HTTP_204_NO_CONTENT)
+        return Response({'detail': 'You do not follow this user.'}, status=status.HTTP_400_BAD_REQUEST)
@@ -0,0 +1,48 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+
+logger = logging.getLogger(__name__)
+
+
+class WorkerPool:
+    """
+    A lazily started thread pool for work that should run outside the request.
+
+    ``workers_setting`` names the setting holding the pool size and ``async_setting``
+    the one that, when false, runs scheduled jobs inline on commit (handy in tests).
+    """
+
+    def __init__(self, name, workers_setting, async_setting, default_workers=2):
+        self.name = name
+        self.workers_setting = workers_setting
+        self.async_setting = async_setting
+        self.default_workers = default_workers
+        self._executor = None
+
+    def get_executor(self):
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=getattr(settings, self.workers_setting, self.default_workers),
+                thread_name_prefix=self.name,
+            )
+        return self._executor
+
+    def schedule(self, func, *args):
+        """Run ``func`` on the pool once the current transaction commits."""
+        if self.async_setting and not getattr(settings, self.async_setting, True):
+            transaction.on_commit(lambda: func(*args))
+            return
+
+        def job():
+            close_old_connections()
+            try:
+                func(*args)
+            except Exception:
+                logger.exception("%s job %s%r failed", self.name, func.__name__, args)
+            finally:
+                close_old_connections()
+
+        transaction.on_commit(lambda: self.get_executor().submit(job))
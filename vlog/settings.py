@@ -60,17 +60,23 @@ SIMPLE_JWT = {
 REST_FRAMEWORK = {
     'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema',
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'auth.authentication.CachedJWTAuthentication',
         'rest_framework.authentication.SessionAuthentication',
         'rest_framework.authentication.TokenAuthentication',
     ],
+    'DEFAULT_RENDERER_CLASSES': [
+        'main.renderers.InstrumentedJSONRenderer',
+        'main.renderers.InstrumentedBrowsableAPIRenderer',
+    ],
 }
 MIDDLEWARE = [
+    'main.instrumentation.InstrumentationMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'main.replicas.ReplicaMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'corsheaders.middleware.CorsMiddleware',
@@ -99,6 +105,9 @@ WSGI_APPLICATION = 'vlog.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/4.2/ref/settings/#databases
 
+# For concurrent load on SQLite use the tuned profile in vlog/settings_sqlite.py; it
+# switches the database file to WAL mode, which persists, so it is opt-in. See
+# vlog/settings_postgres.py for PostgreSQL.
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
@@ -106,6 +115,129 @@ DATABASES = {
     }
 }
 
+# Read replicas (main/replicas.py): aliases in DATABASES that safe-method requests are
+# spread over, round-robin. A user who has just written reads from the primary for
+# VLOG_READ_YOUR_WRITES_SECONDS; VLOG_REPLICA_PIN_CACHE must be shared between
+# processes in production. A replica that cannot be reached is skipped for
+# VLOG_REPLICA_RETRY_SECONDS. To try it locally with a second SQLite file:
+#
+#   DATABASES['replica'] = {**DATABASES['default'], 'NAME': BASE_DIR / 'replica.sqlite3',
+#                           'TEST': {'MIRROR': 'default'}}
+#   VLOG_READ_REPLICAS = ['replica']
+#
+# and run `manage.py sync_sqlite_replicas --loop` to keep copying the primary into it.
+DATABASE_ROUTERS = ['main.replicas.ReplicaRouter']
+VLOG_READ_REPLICAS = []
+VLOG_READ_YOUR_WRITES_SECONDS = 5
+VLOG_REPLICA_RETRY_SECONDS = 30
+VLOG_REPLICA_PIN_CACHE = 'default'
+
+# JWT authentication (auth/authentication.py): users are cached for
+# VLOG_AUTH_USER_LOCAL_SECONDS in a per-process LRU of VLOG_AUTH_USER_LOCAL_SIZE
+# entries and for VLOG_AUTH_USER_CACHE_TIMEOUT in VLOG_AUTH_CACHE, which should be
+# shared between processes in production. Only the fields auth reads are cached, not
+# password hashes. Each process re-reads the token blacklist for newly blacklisted
+# tokens every VLOG_JWT_BLACKLIST_REFRESH_SECONDS.
+VLOG_AUTH_USER_LOCAL_SECONDS = 10
+VLOG_AUTH_USER_LOCAL_SIZE = 1024
+VLOG_AUTH_USER_CACHE_TIMEOUT = 60
+VLOG_AUTH_CACHE = 'default'
+VLOG_JWT_BLACKLIST_REFRESH_SECONDS = 5
+
+# Swap the backend for django.core.cache.backends.filebased.FileBasedCache or
+# django.core.cache.backends.redis.RedisCache (with a LOCATION) in production.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+
+# Serialized feed pages and vlog detail payloads. Entries are dropped by signals in
+# main/signals.py whenever a vlog or anything shown with it changes.
+VLOG_RESPONSE_CACHE = 'default'
+VLOG_RESPONSE_CACHE_TIMEOUT = 60
+
+# Newest comments embedded in the vlog detail payload; the rest are paged through
+# /api/vlogs/<id>/comments/.
+VLOG_DETAIL_COMMENTS = 10
+
+# Rows fetched per database round trip by the streaming NDJSON export, and how old a
+# change must be before an export includes it (longer than any write transaction, so
+# none can still commit below the watermark an export hands out).
+VLOG_EXPORT_CHUNK_SIZE = 500
+VLOG_EXPORT_SETTLE_SECONDS = 5
+
+# Change feed (/api/vlogs/changes/): how often waiting readers poll the log, how long
+# a sequence gap may stay open for a slow transaction to commit, the long-poll cap and
+# how long one event-stream connection lasts before the client reconnects. Waiting
+# readers each hold a worker thread, so serve the feed from threaded workers (gunicorn
+# --threads) and keep VLOG_CHANGES_MAX_STREAMS, the per-process cap, below the thread
+# count. `manage.py prune_changes` drops entries older than VLOG_CHANGES_RETENTION_DAYS.
+VLOG_CHANGES_POLL_INTERVAL = 1.0
+VLOG_CHANGES_SETTLE_SECONDS = 5
+VLOG_CHANGES_MAX_WAIT = 30
+VLOG_CHANGES_STREAM_SECONDS = 300
+VLOG_CHANGES_MAX_STREAMS = 8
+VLOG_CHANGES_RETENTION_DAYS = 30
+
+# Trending feed scoring, see main/trending.py. Run `manage.py decay_trending --loop`
+# (or from cron) to age the scores.
+VLOG_TRENDING_LIKE_WEIGHT = 1.0
+VLOG_TRENDING_COMMENT_WEIGHT = 2.0
+VLOG_TRENDING_GRAVITY = 1.8
+VLOG_TRENDING_WINDOW_HOURS = 72
+
+# Home timelines, see main/timelines.py: the number of entries kept per user and the
+# follower count above which an author's vlogs are merged in on read instead of being
+# fanned out on write.
+VLOG_TIMELINE_LENGTH = 800
+VLOG_FANOUT_MAX_FOLLOWERS = 10000
+VLOG_TIMELINE_ASYNC = True
+VLOG_TIMELINE_WORKERS = 2
+
+# Request instrumentation (main/instrumentation.py): Server-Timing headers, the
+# client addresses allowed to scrape the Prometheus endpoint at /metrics (None allows
+# every client) and whether a view running more queries than its query_budget raises
+# instead of logging a warning.
+# main.test_runner.VlogTestRunner turns strict budgets on for the test suite.
+VLOG_SERVER_TIMING = True
+VLOG_METRICS_ALLOWED_IPS = ['127.0.0.1', '::1']
+VLOG_QUERY_BUDGET_STRICT = False
+TEST_RUNNER = 'main.test_runner.VlogTestRunner'
+
+# Write-behind like buffering: likes are recorded in VLOG_LIKES_CACHE and written
+# to the database in batches by `manage.py flush_likes`. The flusher runs in its own
+# process, so VLOG_LIKES_CACHE must be a shared backend (file, Redis) when enabled.
+VLOG_LIKES_BUFFERED = False
+VLOG_LIKES_CACHE = 'default'
+
+# Resized WebP/JPEG copies of Images.image and Vlogs.cover, built by main/derivatives.py
+# on a thread pool after the upload's transaction commits. `manage.py generate_derivatives`
+# builds any that are missing, e.g. after `import_vlogs --no-media-jobs`.
+VLOG_DERIVATIVES_ASYNC = True
+VLOG_DERIVATIVE_WORKERS = 2
+VLOG_DERIVATIVE_WIDTHS = (320, 640, 1280)
+VLOG_DERIVATIVE_FORMATS = ('webp', 'jpeg')
+
+# HLS transcoding of uploaded videos (main/transcoding.py). Each ladder rung is
+# (name, height, video bitrate, audio bitrate); rungs taller than the source, as
+# probed with ffprobe, are skipped. Use 'main.transcoding.StubEncoder' where ffmpeg
+# is not installed.
+VLOG_TRANSCODE_ASYNC = True
+VLOG_TRANSCODE_WORKERS = 1
+VLOG_TRANSCODE_ENCODER = 'main.transcoding.FfmpegEncoder'
+VLOG_FFMPEG_BINARY = 'ffmpeg'
+VLOG_FFPROBE_BINARY = 'ffprobe'
+VLOG_TRANSCODE_LADDER = (
+    ('360p', 360, '800k', '96k'),
+    ('720p', 720, '2800k', '128k'),
+    ('1080p', 1080, '5000k', '192k'),
+)
+
+# Full-text search (main/search.py): FTS5 on SQLite, tsvector + GIN on PostgreSQL.
+VLOG_SEARCH_INCLUDE_COMMENTS = True
+VLOG_SEARCH_CONFIG = 'english'
+
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
 
@@ -147,5 +279,30 @@ MEDIA_DIR = BASE_DIR / 'media'
 MEDIA_ROOT = MEDIA_DIR
 MEDIA_URL = '/media/'
 
+# Media download views (main/media.py) can leave the transfer to the front server:
+# None streams from Django, 'x-sendfile' (Apache/lighttpd) or 'x-accel-redirect' (nginx,
+# with an internal location mapping VLOG_MEDIA_ACCEL_PREFIX to MEDIA_ROOT).
+VLOG_MEDIA_SENDFILE = None
+VLOG_MEDIA_ACCEL_PREFIX = '/protected-media/'
+
+# Threads writing media files during bulk imports (main/bulk_import.py) and, shared by
+# all requests, for the uploads of a single vlog post (main/storage_writes.py).
+VLOG_IMPORT_WORKERS = 8
+VLOG_STORAGE_WRITE_WORKERS = 8
+
+# Store each distinct media file once under uploads/blobs/<sha256> (main/storage.py).
+# Run `manage.py dedupe_media` after enabling it to move existing files over. A blob
+# that lost its last reference is kept if an upload stored it within the grace period,
+# which must outlast the time between storing a file and saving the row that uses it.
+# Blobs left unreferenced by failed uploads are removed by `manage.py collect_orphaned_media`.
+VLOG_MEDIA_DEDUPLICATE = False
+VLOG_BLOB_REUSE_GRACE_SECONDS = 3600
+
+# Resumable video uploads are assembled here before being moved into MEDIA_ROOT.
+VLOG_UPLOAD_STAGING_DIR = MEDIA_DIR / 'partial'
+VLOG_UPLOAD_MAX_CHUNK_SIZE = 64 * 1024 * 1024
+# Incomplete uploads idle this long are removed by `manage.py expire_uploads`.
+VLOG_UPLOAD_EXPIRE_SECONDS = 24 * 3600
+
 CORS_ALLOW_ALL_ORIGINS = True
 CORS_ALLOW_CREDENTIALS = True
@@ -0,0 +1,34 @@
+"""
+Settings profile for running on PostgreSQL:
+
+    DJANGO_SETTINGS_MODULE=vlog.settings_postgres
+
+Connection parameters left blank here are read by libpq from the usual PGHOST,
+PGPORT, PGUSER and PGPASSWORD environment variables.
+"""
+from .settings import *  # noqa: F401,F403
+
+# Each worker thread keeps its connection for ten minutes instead of opening one per
+# request; CONN_HEALTH_CHECKS pings a reused connection before the request that picks
+# it up, so a server-side disconnect costs one reconnect rather than an error.
+#
+# Behind PgBouncer in transaction pooling mode, set CONN_MAX_AGE to 0 (PgBouncer does
+# the pooling) and DISABLE_SERVER_SIDE_CURSORS to True, since named cursors such as
+# the export's .iterator() do not survive a transaction being moved to another
+# server connection.
+DATABASES = {
+    'default': {
+        'ENGINE': 'django.db.backends.postgresql',
+        'NAME': 'vlog',
+        'USER': '',
+        'PASSWORD': '',
+        'HOST': '',
+        'PORT': '',
+        'CONN_MAX_AGE': 600,
+        'CONN_HEALTH_CHECKS': True,
+        'DISABLE_SERVER_SIDE_CURSORS': False,
+        'OPTIONS': {
+            'connect_timeout': 5,
+        },
+    }
+}
@@ -0,0 +1,35 @@
+"""
+Settings profile for serving concurrent traffic from SQLite:
+
+    DJANGO_SETTINGS_MODULE=vlog.settings_sqlite
+
+Point NAME at the database to tune. WAL mode is a property of the database file, so
+once this profile has opened it the file stays in WAL mode (with -wal and -shm files
+next to it) for every later connection as well.
+"""
+from .settings import *  # noqa: F401,F403
+from .settings import BASE_DIR
+
+# main.backends.sqlite3 runs the PRAGMAs below on every new connection: WAL so
+# readers are not blocked by a like or comment being written, synchronous=NORMAL
+# (durable with WAL except on power loss), a 5s busy timeout and 256 MiB of
+# memory-mapped I/O. IMMEDIATE transactions make concurrent writers wait for the
+# lock instead of failing with "database is locked". Connections are reused for up
+# to CONN_MAX_AGE seconds and checked before reuse.
+DATABASES = {
+    'default': {
+        'ENGINE': 'main.backends.sqlite3',
+        'NAME': BASE_DIR / 'db.sqlite3',
+        'CONN_MAX_AGE': 60,
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            'transaction_mode': 'IMMEDIATE',
+            'pragmas': {
+                'journal_mode': 'WAL',
+                'synchronous': 'NORMAL',
+                'busy_timeout': 5000,
+                'mmap_size': 256 * 1024 * 1024,
+            },
+        },
+    }
+}